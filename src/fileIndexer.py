@@ -108,7 +108,7 @@ if __name__ == '__main__':
     
     logger.debug('Handling files')
 
-    messageDispatcher = MessageDispatcher(applicationConfiguration)
+    messageDispatcher = MessageDispatcher(applicationConfiguration, appConfigLoader=loadApplicationConfiguration)
 
     # threadsafety
 
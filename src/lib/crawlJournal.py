@@ -0,0 +1,166 @@
+from threading import Lock
+import json
+import os
+import logging
+
+logger = logging.getLogger('fileIndexer').getChild('lib.CrawlJournal')
+
+
+class CrawlJournal(object):
+    '''
+        A durable, append-only journal of the work done by the
+        :class:`lib.messageDispatcher.MessageDispatcher`, used to resume an
+        interrupted run.
+
+        Each record is a ``(data source, path, module, status, size, mtime_ns)``
+        JSON line, the file size and modification time telling whether a file
+        completed in a previous run has changed since. Records are written in batches (flushed and synced on disk when the
+        batch is full or when :meth:`CrawlJournal.flush` is called). When the
+        journal is opened, records of a previous (interrupted) run are loaded
+        and the completed work on unchanged files can be skipped.
+
+        Once a run is complete, the journal is cleared (:meth:`CrawlJournal.clear`)
+        so the next run starts over.
+
+        :param journalPath: The journal file path.
+        :type journalPath: str
+        :param batchSize: The number of records kept in memory before being
+                            written.
+        :type batchSize: int
+    '''
+
+    #: Module name used to record that a file went through all its modules
+    ALL_MODULES = '*'
+
+    STATUS_DONE = 'done'
+    STATUS_ERROR = 'error'
+    #: The module run have been interrupted by a stop (redone on the next run)
+    STATUS_INTERRUPTED = 'interrupted'
+
+    def __init__(self, journalPath: str, batchSize: int = 1000):
+        self._journalPath = journalPath
+        self._batchSize = batchSize
+        self._lock = Lock()
+        self._pendingRecords = []
+        # Hashes of the completed (data source, path, module), to keep the memory low,
+        # and the (size, mtime_ns) of the file when completed
+        self._completed = {}
+        lastLine = ''
+
+        if os.path.exists(journalPath):
+            lastLine = self._load()
+            logger.info('Resuming from journal [%s] (%d completed entries)' % (journalPath, len(self._completed)))
+        elif os.path.dirname(journalPath):
+            os.makedirs(os.path.dirname(journalPath), exist_ok=True)
+
+        self._journalIO = open(journalPath, 'a', encoding='utf-8')
+        if lastLine and not lastLine.endswith('\n'):
+            # Ends the line of an interrupted write
+            self._journalIO.write('\n')
+
+    @staticmethod
+    def _key(dataSource: str, path: str, module: str) -> int:
+        return hash((dataSource, path, module))
+
+    def _load(self) -> str:
+        line = ''
+        with open(self._journalPath, 'r', encoding='utf-8') as journalIO:
+            for line in journalIO:
+                try:
+                    dataSource, path, module, status, size, mtimeNs = json.loads(line)
+                except ValueError:
+                    # Last line of an interrupted write, or a record without the file
+                    # size and modification time (redone)
+                    logger.warning('Ignoring invalid journal line [%s]' % line.rstrip('\n'))
+                    continue
+
+                if status == CrawlJournal.STATUS_DONE:
+                    self._completed[CrawlJournal._key(dataSource, path, module)] = (size, mtimeNs)
+
+        return line
+
+    def __len__(self) -> int:
+        '''
+            :returns: The number of completed entries.
+            :rtype: int
+        '''
+        return len(self._completed)
+
+    def isDone(self, dataSource: str, path: str, module: str = ALL_MODULES, size: int = None, mtimeNs: int = None) -> bool:
+        '''
+            Whether the work have been completed in a previous run, on the file
+            unchanged since.
+
+            :param dataSource: The data source path.
+            :type dataSource: str
+            :param path: The file path.
+            :type path: str
+            :param module: The module FQDN name or :attr:`CrawlJournal.ALL_MODULES`.
+            :type module: str
+            :param size: The current file size (None if unknown, never done).
+            :type size: int
+            :param mtimeNs: The current file modification time, in nanoseconds.
+            :type mtimeNs: int
+
+            :returns: Whether the work have been completed.
+            :rtype: bool
+        '''
+        return size is not None and self._completed.get(CrawlJournal._key(dataSource, path, module)) == (size, mtimeNs)
+
+    def record(self, dataSource: str, path: str, module: str, status: str, size: int = None, mtimeNs: int = None) -> None:
+        '''
+            Records the status of a work (written with the next batch).
+
+            :param dataSource: The data source path.
+            :type dataSource: str
+            :param path: The file path.
+            :type path: str
+            :param module: The module FQDN name or :attr:`CrawlJournal.ALL_MODULES`.
+            :type module: str
+            :param status: :attr:`CrawlJournal.STATUS_DONE`, :attr:`CrawlJournal.STATUS_ERROR`
+                            or :attr:`CrawlJournal.STATUS_INTERRUPTED`.
+            :type status: str
+            :param size: The file size when the work started.
+            :type size: int
+            :param mtimeNs: The file modification time when the work started, in nanoseconds.
+            :type mtimeNs: int
+        '''
+        with self._lock:
+            self._pendingRecords.append(json.dumps([dataSource, path, module, status, size, mtimeNs]))
+            if len(self._pendingRecords) >= self._batchSize:
+                self._flush()
+
+    def _flush(self) -> None:
+        if len(self._pendingRecords) > 0 and not self._journalIO.closed:
+            self._journalIO.write('\n'.join(self._pendingRecords) + '\n')
+            self._journalIO.flush()
+            os.fsync(self._journalIO.fileno())
+            self._pendingRecords = []
+
+    def flush(self) -> None:
+        '''
+            Writes the pending records on disk.
+        '''
+        with self._lock:
+            self._flush()
+
+    def close(self) -> None:
+        '''
+            Writes the pending records and closes the journal, which will be
+            used to resume the next run.
+        '''
+        with self._lock:
+            self._flush()
+            self._journalIO.close()
+
+    def clear(self) -> None:
+        '''
+            Closes and removes the journal, the run being complete.
+        '''
+        with self._lock:
+            self._pendingRecords = []
+            self._journalIO.close()
+            self._completed = {}
+            if os.path.exists(self._journalPath):
+                os.remove(self._journalPath)
+        logger.info('Run complete, journal [%s] cleared' % self._journalPath)
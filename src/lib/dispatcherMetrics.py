@@ -0,0 +1,272 @@
+from threading import Lock, local
+from collections import deque
+from typing import Dict, Tuple
+import json
+import os
+import time
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('fileIndexer').getChild('lib.DispatcherMetrics')
+
+_local = local()
+
+
+def _escapeLabel(value) -> str:
+    # https://prometheus.io/docs/instrumenting/exposition_formats/#text-format-details
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def instrumentEngine(dbEngine: Engine) -> None:
+    '''
+        Measures the time spent in the database by the current thread (see
+        :func:`takeDbTime`).
+
+        :param dbEngine: The engine to instrument.
+        :type dbEngine: :class:`sqlalchemy.engine.Engine`
+    '''
+
+    # https://docs.sqlalchemy.org/en/13/faq/performance.html#query-profiling
+    @event.listens_for(dbEngine, 'before_cursor_execute')
+    def _beforeCursorExecute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('fileIndexer_queryStartTime', []).append(time.perf_counter())
+
+    @event.listens_for(dbEngine, 'after_cursor_execute')
+    def _afterCursorExecute(conn, cursor, statement, parameters, context, executemany):
+        _local.dbTime = getattr(_local, 'dbTime', 0.0) + \
+            time.perf_counter() - conn.info['fileIndexer_queryStartTime'].pop(-1)
+
+
+def takeDbTime() -> float:
+    '''
+        Returns the time spent in the database by the current thread since
+        the last call and resets it.
+
+        :returns: A duration, in seconds.
+        :rtype: float
+    '''
+    dbTime = getattr(_local, 'dbTime', 0.0)
+    _local.dbTime = 0.0
+    return dbTime
+
+
+class _ModuleMetrics(object):
+
+    def __init__(self, bucketsCount: int):
+        self.files = 0
+        self.errors = 0
+        self.handledFileBytes = 0
+        self.queueWaitSeconds = 0.0
+        self.handleSeconds = 0.0
+        self.dbSeconds = 0.0
+        # Not cumulative, the last one counts the values above the last bucket
+        self.handleBuckets = [0] * (bucketsCount + 1)
+        # First handle start and last handle end (time.monotonic)
+        self.firstStart = None
+        self.lastEnd = None
+        # (second, files count) of the recent seconds
+        self.recentFiles = deque()
+
+    def activeSeconds(self) -> float:
+        return self.lastEnd - self.firstStart if self.files > 0 else 0.0
+
+    def recentFilesPerSecond(self, now: float) -> float:
+        # Files per second over the last window, or since the first file if more recent
+        windowStart = max(now - DispatcherMetrics.RATE_WINDOW, self.firstStart or now)
+        files = sum(map(lambda item: item[1], filter(lambda item: item[0] >= int(windowStart), self.recentFiles)))
+        return files / (now - windowStart) if now > windowStart else 0.0
+
+
+class DispatcherMetrics(object):
+    '''
+        Runtime metrics of the :class:`lib.messageDispatcher.MessageDispatcher`,
+        recorded per module and per data source :
+            - handled files count and size (``stat`` size of the handled files,
+              not the bytes read by the module)
+            - time spent waiting in the pool queues
+            - :meth:`public.fileHandleModule.FileHandleModule.handle` latency (histogram)
+            - errors count
+            - time spent in the database
+            - files per second, while the module ran (from its first file to
+              its last one) and over the last :attr:`RATE_WINDOW` seconds
+
+        They can be written as a Prometheus text-format file (rewritten
+        periodically) and as a JSON summary.
+    '''
+
+    #: Upper bounds of the handle latency histogram buckets (in seconds)
+    LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+
+    #: Window of the recent files per second (in seconds)
+    RATE_WINDOW = 60
+
+    def __init__(self):
+        self._lock = Lock()
+        self._metrics = {}  # type: Dict[Tuple[str, str], _ModuleMetrics]
+        self._startTime = time.time()
+
+    def recordHandle(self, module: str, dataSource: str, queueWait: float, duration: float, size: int,
+                        dbTime: float = 0.0, error: bool = False) -> None:
+        '''
+            Records a module run on a file.
+
+            :param module: The module name.
+            :type module: str
+            :param dataSource: The data source path.
+            :type dataSource: str
+            :param queueWait: Time spent waiting in the queue (in seconds).
+            :type queueWait: float
+            :param duration: The handle duration (in seconds).
+            :type duration: float
+            :param size: The file size (in bytes, the ``stat`` size).
+            :type size: int
+            :param dbTime: Time spent in the database (in seconds).
+            :type dbTime: float
+            :param error: Whether the module failed.
+            :type error: bool
+        '''
+        bucketId = len(DispatcherMetrics.LATENCY_BUCKETS)
+        for i, bucket in enumerate(DispatcherMetrics.LATENCY_BUCKETS):
+            if duration <= bucket:
+                bucketId = i
+                break
+
+        now = time.monotonic()
+        second = int(now)
+
+        with self._lock:
+            metrics = self._metrics.get((module, dataSource))
+            if not metrics:
+                metrics = _ModuleMetrics(len(DispatcherMetrics.LATENCY_BUCKETS))
+                self._metrics[(module, dataSource)] = metrics
+
+            metrics.files += 1
+            metrics.errors += 1 if error else 0
+            metrics.handledFileBytes += size
+            metrics.queueWaitSeconds += max(queueWait, 0.0)
+            metrics.handleSeconds += duration
+            metrics.dbSeconds += dbTime
+            metrics.handleBuckets[bucketId] += 1
+
+            if metrics.firstStart is None:
+                metrics.firstStart = now - duration
+            metrics.lastEnd = now
+            if metrics.recentFiles and metrics.recentFiles[-1][0] == second:
+                metrics.recentFiles[-1][1] += 1
+            else:
+                metrics.recentFiles.append([second, 1])
+            while metrics.recentFiles[0][0] < second - DispatcherMetrics.RATE_WINDOW:
+                metrics.recentFiles.popleft()
+
+    def toPrometheus(self) -> str:
+        '''
+            :returns: The metrics, in the Prometheus text format.
+            :rtype: str
+        '''
+
+        def _labels(module: str, dataSource: str, **kwargs) -> str:
+            labels = dict(module=module, data_source=dataSource, **kwargs)
+            return ','.join(map(lambda item: '%s="%s"' % (item[0], _escapeLabel(item[1])), labels.items()))
+
+        counters = [
+            ('fileindexer_files_total', 'Files handled by a module.', lambda m: m.files),
+            ('fileindexer_errors_total', 'Files a module failed to handle.', lambda m: m.errors),
+            ('fileindexer_handled_file_bytes_total', 'Size of the files handled by a module (not the bytes read).', lambda m: m.handledFileBytes),
+            ('fileindexer_queue_wait_seconds_total', 'Time spent by the files waiting in the pool queues.', lambda m: m.queueWaitSeconds),
+            ('fileindexer_db_seconds_total', 'Time spent in the database by a module.', lambda m: m.dbSeconds),
+        ]
+
+        now = time.monotonic()
+
+        with self._lock:
+            items = sorted(self._metrics.items())
+            lines = []
+            for name, description, getter in counters:
+                lines.append('# HELP %s %s' % (name, description))
+                lines.append('# TYPE %s counter' % name)
+                for (module, dataSource), metrics in items:
+                    lines.append('%s{%s} %s' % (name, _labels(module, dataSource), getter(metrics)))
+
+            name = 'fileindexer_handle_duration_seconds'
+            lines.append('# HELP %s Duration of the module handle calls.' % name)
+            lines.append('# TYPE %s histogram' % name)
+            for (module, dataSource), metrics in items:
+                cumulativeCount = 0
+                for bucket, count in zip(DispatcherMetrics.LATENCY_BUCKETS + ('+Inf',), metrics.handleBuckets):
+                    cumulativeCount += count
+                    lines.append('%s_bucket{%s} %d' % (name, _labels(module, dataSource, le=bucket), cumulativeCount))
+                lines.append('%s_sum{%s} %s' % (name, _labels(module, dataSource), metrics.handleSeconds))
+                lines.append('%s_count{%s} %d' % (name, _labels(module, dataSource), metrics.files))
+
+            name = 'fileindexer_recent_files_per_second'
+            lines.append('# HELP %s Files handled by a module per second, over the last %d seconds.' % (name, DispatcherMetrics.RATE_WINDOW))
+            lines.append('# TYPE %s gauge' % name)
+            for (module, dataSource), metrics in items:
+                lines.append('%s{%s} %s' % (name, _labels(module, dataSource), metrics.recentFilesPerSecond(now)))
+
+        return '\n'.join(lines) + '\n'
+
+    def toDict(self) -> dict:
+        '''
+            :returns: A summary of the metrics (serializable as JSON).
+            :rtype: dict
+        '''
+        elapsed = time.time() - self._startTime
+        now = time.monotonic()
+
+        with self._lock:
+            return {
+                'elapsedSeconds': elapsed,
+                'modules': list(map(
+                    lambda item: {
+                        'module': item[0][0],
+                        'dataSource': item[0][1],
+                        'files': item[1].files,
+                        'activeSeconds': item[1].activeSeconds(),
+                        'filesPerSecond': item[1].files / item[1].activeSeconds() if item[1].activeSeconds() > 0 else 0.0,
+                        'recentFilesPerSecond': item[1].recentFilesPerSecond(now),
+                        'errors': item[1].errors,
+                        'handledFileBytes': item[1].handledFileBytes,
+                        'queueWaitSeconds': item[1].queueWaitSeconds,
+                        'handleSeconds': item[1].handleSeconds,
+                        'meanHandleSeconds': item[1].handleSeconds / item[1].files if item[1].files > 0 else 0.0,
+                        'dbSeconds': item[1].dbSeconds,
+                        'handleDurationBuckets': dict(zip(
+                            map(str, DispatcherMetrics.LATENCY_BUCKETS + ('+Inf',)),
+                            item[1].handleBuckets
+                        )),
+                    },
+                    sorted(self._metrics.items())
+                )),
+            }
+
+    @staticmethod
+    def _writeAtomically(path: str, content: str) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmpPath = '%s.tmp' % path
+        with open(tmpPath, 'w', encoding='utf-8') as outIO:
+            outIO.write(content)
+        os.replace(tmpPath, path)
+
+    def writePrometheus(self, path: str) -> None:
+        '''
+            (Re)writes the metrics as a Prometheus text-format file (the file is
+            replaced atomically, to be read by the node exporter textfile collector
+            for example).
+
+            :param path: The file path.
+            :type path: str
+        '''
+        DispatcherMetrics._writeAtomically(path, self.toPrometheus())
+
+    def writeSummary(self, path: str) -> None:
+        '''
+            Writes the metrics summary as a JSON file.
+
+            :param path: The file path.
+            :type path: str
+        '''
+        DispatcherMetrics._writeAtomically(path, json.dumps(self.toDict(), indent=4))
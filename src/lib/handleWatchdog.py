@@ -0,0 +1,207 @@
+from threading import Condition, Thread, get_ident, local
+from contextlib import contextmanager
+import ctypes
+import time
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from public import HandleTimeoutError
+
+logger = logging.getLogger('fileIndexer').getChild('lib.HandleWatchdog')
+
+# Time (in seconds) the exception is delayed after a critical section, so it is
+# not raised in the code ending it (e.g. the pool code returning a connection)
+_criticalGrace = 0.5
+
+# The watch of the current thread
+_local = local()
+
+
+def _setAsyncExc(threadId: int, exc: type) -> None:
+    # Raised in the thread as soon as it runs Python code, ``None`` clears it
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(threadId), ctypes.py_object(exc) if exc else None)
+
+
+class _Watch(object):
+
+    def __init__(self, watchdog: 'HandleWatchdog', timeout: float):
+        self._watchdog = watchdog
+        self.timeout = timeout
+        self.deadline = None
+        self.threadId = None
+        self.fired = False
+        self.deferred = False
+        self.criticalDepth = 0
+        self.criticalEnd = None
+
+    def __enter__(self) -> '_Watch':
+        self.threadId = get_ident()
+        self.deadline = time.monotonic() + self.timeout
+        self._watchdog._add(self)
+        _local.watch = self
+        return self
+
+    def __exit__(self, excType, excValue, traceback) -> bool:
+        _local.watch = None
+        self._watchdog._remove(self)
+        if excType is None and (self.fired or self.deferred):
+            # The code swallowed the timeout exception, or the timeout has been deferred
+            raise HandleTimeoutError('Timed out after %.1fs' % self.timeout)
+        return False
+
+    def expired(self, now: float) -> bool:
+        return not self.fired and self.deadline <= now and self.criticalDepth == 0 and \
+            (self.criticalEnd is None or self.criticalEnd + _criticalGrace <= now)
+
+
+@contextmanager
+def criticalSection():
+    '''
+        A block the handle timeout is never raised in (as a database
+        transaction), the exception being raised at its end if the time budget
+        elapsed meanwhile. Sections can be nested, and have no effect outside
+        of a :meth:`HandleWatchdog.watch` block.
+
+        The database connections of the engines given to :func:`guardEngine`
+        are critical sections from their checkout to their checkin.
+
+        Usage :
+            >>> with criticalSection():
+            ...     writeIndex(fileDescriptor)
+    '''
+    watch = getattr(_local, 'watch', None)
+    if watch is None:
+        yield
+        return
+
+    watch._watchdog._enterCritical(watch)
+    try:
+        yield
+    finally:
+        watch._watchdog._exitCritical(watch)
+    if watch.criticalDepth == 0 and watch.deferred:
+        raise HandleTimeoutError('Timed out after %.1fs' % watch.timeout)
+
+
+def _checkout(dbapiConnection, connectionRecord, connectionProxy):
+    watch = getattr(_local, 'watch', None)
+    if watch is not None:
+        watch._watchdog._enterCritical(watch)
+        connectionRecord.info['fileIndexer_watch'] = watch
+
+
+def _checkin(dbapiConnection, connectionRecord):
+    watch = connectionRecord.info.pop('fileIndexer_watch', None)
+    if watch is not None:
+        watch._watchdog._exitCritical(watch)
+
+
+def guardEngine(dbEngine: Engine) -> None:
+    '''
+        Defers the handle timeout while the current thread holds a connection
+        of the engine, so it never interrupts a query or a transaction (see
+        :func:`criticalSection`).
+
+        A connection checked out once the time budget elapsed raises the
+        :class:`public.exceptions.HandleTimeoutError`, before any query. Once
+        the connection is checked in, the exception is raised asynchronously
+        after a short delay, or when the watched block ends.
+
+        :param dbEngine: The engine to guard.
+        :type dbEngine: :class:`sqlalchemy.engine.Engine`
+    '''
+    if not event.contains(dbEngine, 'checkout', _checkout):
+        event.listen(dbEngine, 'checkout', _checkout)
+        event.listen(dbEngine, 'checkin', _checkin)
+
+
+class HandleWatchdog(object):
+    '''
+        Enforces a time budget on code run by the worker threads, raising a
+        :class:`public.exceptions.HandleTimeoutError` in the thread once the
+        budget is elapsed.
+
+        The exception is raised asynchronously (see
+        :c:func:`PyThreadState_SetAsyncExc`), when the thread next runs Python
+        code: a call blocked in a C extension is interrupted once it returns.
+        It is never raised in a critical section (see :func:`criticalSection`
+        and :func:`guardEngine`, the database connections being guarded), but
+        at its end : a module blocked in a query runs until the query returns.
+
+        A single watchdog thread, started on the first watch, checks the
+        deadlines of all the threads.
+
+        Usage :
+            >>> with watchdog.watch(60):
+            ...     module.handle(fileDescriptor, dbEngine, appConfig)
+    '''
+
+    def __init__(self):
+        self._condition = Condition()
+        self._watches = set()
+        self._thread = None
+
+    def watch(self, timeout: float) -> _Watch:
+        '''
+            Get a context manager watching the current thread for the given time.
+
+            :param timeout: The time budget (in seconds).
+            :type timeout: float
+
+            :returns: A context manager, raising a :class:`public.exceptions.HandleTimeoutError`
+                        in its block once the time budget is elapsed.
+        '''
+        return _Watch(self, timeout)
+
+    def _add(self, watch: _Watch) -> None:
+        with self._condition:
+            if not self._thread:
+                self._thread = Thread(target=self._run, name='HandleWatchdog', daemon=True)
+                self._thread.start()
+            self._watches.add(watch)
+            self._condition.notify()
+
+    def _remove(self, watch: _Watch) -> None:
+        with self._condition:
+            self._watches.discard(watch)
+            if watch.fired:
+                # The exception may not have been raised yet
+                _setAsyncExc(watch.threadId, None)
+
+    def _enterCritical(self, watch: _Watch) -> None:
+        with self._condition:
+            if watch.fired or (watch.criticalDepth == 0 and watch.deadline <= time.monotonic()):
+                # Raised before the section, rather than in it
+                if watch.fired:
+                    _setAsyncExc(watch.threadId, None)
+                watch.deferred = True
+                raise HandleTimeoutError('Timed out after %.1fs' % watch.timeout)
+            watch.criticalDepth += 1
+
+    def _exitCritical(self, watch: _Watch) -> None:
+        with self._condition:
+            watch.criticalDepth -= 1
+            if watch.criticalDepth == 0:
+                watch.criticalEnd = time.monotonic()
+                watch.deferred = watch.deadline <= watch.criticalEnd
+                self._condition.notify()
+
+    def _run(self) -> None:
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                for watch in filter(lambda w: w.expired(now), self._watches):
+                    watch.fired = True
+                    logger.debug('Thread [%d] timed out after %.1fs' % (watch.threadId, watch.timeout))
+                    _setAsyncExc(watch.threadId, HandleTimeoutError)
+
+                nextDeadline = min(
+                    map(
+                        lambda w: max(w.deadline, w.criticalEnd + _criticalGrace if w.criticalEnd is not None else w.deadline),
+                        filter(lambda w: not w.fired and w.criticalDepth == 0, self._watches)
+                    ),
+                    default=None
+                )
+                self._condition.wait(timeout=max(nextDeadline - now, 0) if nextDeadline is not None else None)
@@ -0,0 +1,322 @@
+from threading import Lock
+from array import array
+from typing import Iterator, List, Tuple
+import functools
+import tempfile
+import mmap
+import os
+import logging
+
+from public import FileSystemModule, FileDescriptor, DirectoryStates
+
+logger = logging.getLogger('fileIndexer').getChild('lib.ListingCache')
+
+# Column name -> array type code (all 4 or 8 bytes wide, kept aligned when spilled)
+_COLUMNS = (
+    ('directory', 'I'),
+    ('nameEnd', 'Q'),
+    ('size', 'q'),
+    ('mtime', 'q'),
+    ('ctime', 'q'),
+    # Times as returned by os.stat, not always equal to the nanoseconds ones divided
+    ('mtimeFloat', 'd'),
+    ('ctimeFloat', 'd'),
+    ('inode', 'Q'),
+    ('device', 'Q'),
+    ('mode', 'q'),      # -1 when not stat
+    ('magic', 'i'),     # -1 when not detected
+)
+
+
+class _MemoryChunk(object):
+
+    def __init__(self):
+        self.columns = dict(map(lambda column: (column[0], array(column[1])), _COLUMNS))
+        self.names = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.columns['directory'])
+
+    def append(self, values: dict, name: bytes) -> None:
+        self.names += name
+        values['nameEnd'] = len(self.names)
+        for column, _ in _COLUMNS:
+            self.columns[column].append(values[column])
+
+    def getName(self, index: int) -> bytes:
+        nameEnd = self.columns['nameEnd']
+        return bytes(self.names[nameEnd[index-1] if index > 0 else 0:nameEnd[index]])
+
+    def close(self) -> None:
+        pass
+
+
+class _MappedChunk(object):
+
+    def __init__(self, spillFile, memoryChunk: _MemoryChunk):
+        # Chunks are mapped separately, their offset aligned on the allocation granularity
+        spillFile.seek(0, os.SEEK_END)
+        offset = spillFile.tell()
+        blocks = []
+        for column, _ in _COLUMNS:
+            blocks.append(memoryChunk.columns[column].tobytes())
+        blocks.append(bytes(memoryChunk.names))
+        length = sum(map(len, blocks))
+        padding = -length % mmap.ALLOCATIONGRANULARITY
+        spillFile.write(b''.join(blocks) + b'\0' * padding)
+        spillFile.flush()
+
+        self._length = len(memoryChunk)
+        self._map = mmap.mmap(spillFile.fileno(), length + padding, offset=offset)
+        view = memoryview(self._map)
+        self.columns = {}
+        position = 0
+        for (column, typeCode), block in zip(_COLUMNS, blocks):
+            self.columns[column] = view[position:position+len(block)].cast(typeCode)
+            position += len(block)
+        self.names = view[position:position+len(blocks[-1])]
+        view.release()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def getName(self, index: int) -> bytes:
+        nameEnd = self.columns['nameEnd']
+        return self.names[nameEnd[index-1] if index > 0 else 0:nameEnd[index]].tobytes()
+
+    def close(self) -> None:
+        for column in self.columns.values():
+            column.release()
+        self.names.release()
+        self._map.close()
+
+
+class ListingCache(object):
+    '''
+        A compact cache of the files listed by a
+        :class:`public.fileSystemModule.FileSystemModule`, so a data source
+        processed step by step is listed only once.
+
+        Files are stored by columns (directory, name, size, times, inode, ...)
+        in chunks of arrays instead of keeping their descriptors : directories
+        are interned, names stored in a single buffer per chunk and the magic
+        results (mime, encoding and description) interned. Once more than
+        ``memoryRows`` files are listed, full chunks are written to a temporary
+        file and memory mapped.
+
+        Descriptors are created again on each iteration (see
+        :meth:`public.fileSystemModule.FileSystemModule.getFileDescriptor`), with
+        the cached stat and magic results. File system modules not supporting it
+        have their descriptors kept in memory.
+
+        Each call to ``iter()`` returns a new iterator : several consumers can
+        iterate at once, the listing being continued by the first one needing
+        more files.
+
+        :param fileSystemModule: The module listing the files.
+        :type fileSystemModule: :class:`public.fileSystemModule.FileSystemModule`
+        :param ignorePatterns: Patterns to ignore (see :meth:`public.fileSystemModule.FileSystemModule.listFiles`).
+        :type ignorePatterns: List[str]
+        :param followSymlinks: Does the listing follow links.
+        :type followSymlinks: bool
+        :param memoryRows: The number of files kept in memory before spilling
+                            to disk.
+        :type memoryRows: int
+        :param spillDirectory: The directory of the temporary file (the system
+                                default if not set).
+        :type spillDirectory: str
+        :param chunkRows: The number of files of a chunk.
+        :type chunkRows: int
+        :param directoryStates: The directories states, for an incremental
+                                listing (see :meth:`public.fileSystemModule.FileSystemModule.listFiles`).
+        :type directoryStates: :class:`public.directoryStates.DirectoryStates`
+    '''
+
+    def __init__(self, fileSystemModule: FileSystemModule, ignorePatterns: List[str], followSymlinks: bool,
+                    memoryRows: int = 1000000, spillDirectory: str = None, chunkRows: int = 65536,
+                    directoryStates: DirectoryStates = None):
+        self._fileSystemModule = fileSystemModule
+        self._ignorePatterns = ignorePatterns
+        self._followSymlinks = followSymlinks
+        self._directoryStates = directoryStates
+        self._memoryRows = memoryRows
+        self._spillDirectory = spillDirectory
+        self._chunkRows = chunkRows
+
+        self._lock = Lock()
+        self._listing = None
+        self._listingDone = False
+        self._length = 0
+        self._chunks = []
+        self._memoryChunks = 0
+        self._spillFile = None
+        # Interned values
+        self._directories = []
+        self._directoryIds = {}
+        self._magicInfos = []
+        self._magicInfosIds = {}
+        # Descriptors of the modules not able to create them again
+        self._keepDescriptors = None
+        self._descriptors = []
+
+    def __len__(self) -> int:
+        '''
+            :returns: The number of files listed so far.
+            :rtype: int
+        '''
+        return self._length
+
+    def __iter__(self) -> Iterator[FileDescriptor]:
+        position = 0
+        while True:
+            fileDescriptor = self._get(position)
+            if fileDescriptor is None:
+                return
+            yield fileDescriptor
+            position += 1
+
+    def _get(self, position: int) -> FileDescriptor or None:
+        with self._lock:
+            if position < self._length:
+                return self._getRow(position)
+
+            if self._listingDone:
+                return None
+
+            # Listing continued by this consumer
+            if self._listing is None:
+                self._listing = iter(self._fileSystemModule.listFiles(
+                    ignorePatterns=self._ignorePatterns,
+                    followSymlinks=self._followSymlinks,
+                    directoryStates=self._directoryStates
+                ))
+            try:
+                fileDescriptor = next(self._listing)
+            except StopIteration:
+                self._listingDone = True
+                self._listing = None
+                logger.debug('%d files listed (%d chunks spilled)' % (self._length, len(self._chunks) - self._memoryChunks))
+                return None
+
+            self._append(fileDescriptor)
+            if not self._keepDescriptors:
+                fileDescriptor.setCachedInfos(magicInfosCallback=functools.partial(self._setMagicInfos, self._length - 1))
+            return fileDescriptor
+
+    def _append(self, fileDescriptor: FileDescriptor) -> None:
+        if self._keepDescriptors is None:
+            try:
+                self._fileSystemModule.getFileDescriptor(fileDescriptor.fullPath)
+                self._keepDescriptors = False
+            except NotImplementedError:
+                logger.debug('%s can not get a single file, descriptors kept in memory' % self._fileSystemModule.__class__.__name__)
+                self._keepDescriptors = True
+
+        if self._keepDescriptors:
+            self._descriptors.append(fileDescriptor)
+            self._length += 1
+            return
+
+        directory = fileDescriptor.path
+        directoryId = self._directoryIds.get(directory)
+        if directoryId is None:
+            directoryId = self._directoryIds[directory] = len(self._directories)
+            self._directories.append(directory)
+
+        values = {
+            'directory': directoryId,
+            'magic': -1,
+        }
+        try:
+            stat = fileDescriptor.stat
+            values.update({
+                'size': stat.st_size,
+                'mtime': getattr(stat, 'st_mtime_ns', None) or int(stat.st_mtime * 1e9),
+                'ctime': getattr(stat, 'st_ctime_ns', None) or int(stat.st_ctime * 1e9),
+                'mtimeFloat': stat.st_mtime,
+                'ctimeFloat': stat.st_ctime,
+                'inode': stat.st_ino or 0,
+                'device': stat.st_dev or 0,
+                'mode': stat.st_mode,
+            })
+        except OSError:
+            # Raised again when used
+            values.update({'size': 0, 'mtime': 0, 'ctime': 0, 'mtimeFloat': 0.0, 'ctimeFloat': 0.0, 'inode': 0, 'device': 0, 'mode': -1})
+
+        if len(self._chunks) == 0 or len(self._chunks[-1]) >= self._chunkRows:
+            self._chunks.append(_MemoryChunk())
+            self._memoryChunks += 1
+            self._spill()
+        self._chunks[-1].append(values, os.fsencode(fileDescriptor.name))
+        self._length += 1
+
+    def _spill(self) -> None:
+        # Full chunks over the memory limit are mapped, the last one being filled
+        firstMemoryChunk = len(self._chunks) - self._memoryChunks
+        while self._memoryChunks > 1 and self._memoryChunks * self._chunkRows > self._memoryRows:
+            if self._spillFile is None:
+                self._spillFile = tempfile.TemporaryFile(prefix='fileIndexer-listing-', dir=self._spillDirectory)
+                logger.debug('Spilling the listing to a temporary file')
+            self._chunks[firstMemoryChunk] = _MappedChunk(self._spillFile, self._chunks[firstMemoryChunk])
+            firstMemoryChunk += 1
+            self._memoryChunks -= 1
+
+    def _getRow(self, position: int) -> FileDescriptor:
+        if self._keepDescriptors:
+            return self._descriptors[position]
+
+        chunk = self._chunks[position // self._chunkRows]
+        index = position % self._chunkRows
+        columns = chunk.columns
+
+        fileDescriptor = self._fileSystemModule.getFileDescriptor(
+            os.path.join(self._directories[columns['directory'][index]], os.fsdecode(chunk.getName(index)))
+        )
+
+        stat = None
+        if columns['mode'][index] != -1:
+            mtime = columns['mtime'][index]
+            ctime = columns['ctime'][index]
+            stat = os.stat_result(
+                (columns['mode'][index], columns['inode'][index], columns['device'][index], 0, 0, 0,
+                    columns['size'][index], 0, mtime // 1000000000, ctime // 1000000000),
+                {'st_mtime': columns['mtimeFloat'][index], 'st_ctime': columns['ctimeFloat'][index], 'st_mtime_ns': mtime, 'st_ctime_ns': ctime}
+            )
+        magicId = columns['magic'][index]
+
+        fileDescriptor.setCachedInfos(
+            stat=stat,
+            magicInfos=self._magicInfos[magicId] if magicId != -1 else None,
+            magicInfosCallback=functools.partial(self._setMagicInfos, position) if magicId == -1 else None
+        )
+        return fileDescriptor
+
+    def _setMagicInfos(self, position: int, magicInfos: Tuple[str, str, str]) -> None:
+        with self._lock:
+            if position >= self._length:
+                # Closed
+                return
+            magicId = self._magicInfosIds.get(magicInfos)
+            if magicId is None:
+                magicId = self._magicInfosIds[magicInfos] = len(self._magicInfos)
+                self._magicInfos.append(magicInfos)
+            self._chunks[position // self._chunkRows].columns['magic'][position % self._chunkRows] = magicId
+
+    def close(self) -> None:
+        '''
+            Drops the cache and its temporary file.
+        '''
+        with self._lock:
+            for chunk in self._chunks:
+                try:
+                    chunk.close()
+                except BufferError:
+                    logger.debug('Listing chunk still in use, not closed')
+            self._chunks = []
+            self._descriptors = []
+            self._length = 0
+            self._listing = None
+            self._listingDone = True
+            if self._spillFile is not None:
+                self._spillFile.close()
+                self._spillFile = None
@@ -0,0 +1,231 @@
+from threading import Lock, local
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+import sqlite3
+import time
+import os
+import logging
+
+from public import FileDescriptor
+
+logger = logging.getLogger('fileIndexer').getChild('lib.MagicCache')
+
+
+class MagicCache(object):
+    '''
+        A persistent cache of the files magic results (mime, encoding and
+        description), so unchanged files are not opened again to detect them.
+
+        Results are keyed by file identity : scheme and host, path, size,
+        modification time and inode (when available). A file whose identity
+        changed is detected again.
+
+        The cache is stored in a local SQLite file and loaded in bulk, one
+        directory at a time (the files of a directory being listed together),
+        keeping the last loaded directories in memory. New results are written
+        in batches, when enough results are pending or after some time.
+
+        The file is in WAL mode : directories are loaded with one connection
+        per thread, concurrently and while a batch is being written, the
+        results not written yet being merged in the loaded directories.
+
+        :param cachePath: The cache file path.
+        :type cachePath: str
+        :param batchSize: The number of results kept in memory before being
+                            written.
+        :type batchSize: int
+        :param cachedDirectories: The number of directories kept in memory.
+        :type cachedDirectories: int
+        :param flushInterval: The maximum time (in seconds) results are kept in
+                                memory before being written.
+        :type flushInterval: float
+    '''
+
+    def __init__(self, cachePath: str, batchSize: int = 1000, cachedDirectories: int = 64, flushInterval: float = 10.0):
+        if os.path.dirname(cachePath):
+            os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+
+        self._cachePath = cachePath
+        self._batchSize = batchSize
+        self._cachedDirectories = cachedDirectories
+        self._flushInterval = flushInterval
+        # Guards the in-memory state, never held during a query
+        self._lock = Lock()
+        # Guards the write connection, taken before the state lock
+        self._writeLock = Lock()
+        # (scheme and host, path) -> {name: (size, mtime, inode, mime, encoding, description)}
+        self._pendingResults = {}
+        self._pendingCount = 0
+        # The pending results being written
+        self._writingResults = {}
+        self._lastFlush = time.monotonic()
+        self._directories = OrderedDict()
+        self._readConnections = local()
+        self._openedConnections = []
+        self._closed = False
+        self.hits = 0
+        self.misses = 0
+
+        self._connection = sqlite3.connect(cachePath, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('''
+            CREATE TABLE IF NOT EXISTS magic (
+                scheme_host TEXT NOT NULL,
+                path TEXT NOT NULL,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                mime TEXT NOT NULL,
+                encoding TEXT NOT NULL,
+                description TEXT NOT NULL,
+                PRIMARY KEY (scheme_host, path, name)
+            )
+        ''')
+        self._connection.commit()
+
+    @staticmethod
+    def _identity(fileDescriptor: FileDescriptor) -> Tuple[int, int, int]:
+        stat = fileDescriptor.stat
+        mtime = getattr(stat, 'st_mtime_ns', None) or int(stat.st_mtime * 1e9)
+        return stat.st_size, mtime, stat.st_ino or 0
+
+    def _readConnection(self) -> sqlite3.Connection:
+        connection = getattr(self._readConnections, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self._cachePath, check_same_thread=False)
+            self._readConnections.connection = connection
+            with self._lock:
+                self._openedConnections.append(connection)
+        return connection
+
+    def _getDirectory(self, schemeAndHost: str, path: str) -> Dict[str, tuple] or None:
+        key = (schemeAndHost, path)
+
+        with self._lock:
+            if self._closed:
+                return None
+            directory = self._directories.get(key)
+            if directory is not None:
+                self._directories.move_to_end(key)
+                return directory
+
+        # Loaded without the lock, other threads getting and putting results meanwhile
+        rows = self._readConnection().execute(
+            'SELECT name, size, mtime, inode, mime, encoding, description FROM magic WHERE scheme_host = ? AND path = ?',
+            key
+        ).fetchall()
+
+        with self._lock:
+            if self._closed:
+                return None
+            directory = self._directories.get(key)
+            if directory is None:
+                directory = dict(map(lambda row: (row[0], tuple(row[1:])), rows))
+                # The results not written yet (or being written) are the most recent ones
+                directory.update(self._writingResults.get(key, {}))
+                directory.update(self._pendingResults.get(key, {}))
+                self._directories[key] = directory
+                if len(self._directories) > self._cachedDirectories:
+                    self._directories.popitem(last=False)
+            return directory
+
+    def get(self, fileDescriptor: FileDescriptor) -> Tuple[str, str, str] or None:
+        '''
+            Get the cached magic results of a file.
+
+            :param fileDescriptor: The file.
+            :type fileDescriptor: :class:`public.fileDescriptor.FileDescriptor`
+
+            :returns: The file mime, encoding and description, ``None`` if not
+                        cached or if the file changed.
+            :rtype: Tuple[str, str, str] or None
+        '''
+        identity = MagicCache._identity(fileDescriptor)
+        directory = self._getDirectory(fileDescriptor.schemeAndHost, fileDescriptor.path)
+        if directory is None:
+            return None
+
+        with self._lock:
+            entry = directory.get(fileDescriptor.name)
+            if entry and entry[0:3] == identity:
+                self.hits += 1
+                return entry[3:]
+            self.misses += 1
+            return None
+
+    def put(self, fileDescriptor: FileDescriptor, magicInfos: Tuple[str, str, str]) -> None:
+        '''
+            Caches the magic results of a file (written with the next batch).
+
+            :param fileDescriptor: The file.
+            :type fileDescriptor: :class:`public.fileDescriptor.FileDescriptor`
+            :param magicInfos: The file mime, encoding and description.
+            :type magicInfos: Tuple[str, str, str]
+        '''
+        key = (fileDescriptor.schemeAndHost, fileDescriptor.path)
+        entry = MagicCache._identity(fileDescriptor) + tuple(magicInfos)
+
+        with self._lock:
+            if self._closed:
+                return
+            directory = self._directories.get(key)
+            if directory is not None:
+                directory[fileDescriptor.name] = entry
+            self._pendingResults.setdefault(key, {})[fileDescriptor.name] = entry
+            self._pendingCount += 1
+            flush = self._pendingCount >= self._batchSize or time.monotonic() - self._lastFlush >= self._flushInterval
+
+        if flush:
+            self._flush()
+
+    def _flush(self) -> None:
+        # Writes the pending results in one transaction, the state lock being
+        # released during the write
+        with self._writeLock:
+            with self._lock:
+                if self._closed or not self._pendingResults:
+                    return
+                self._writingResults = self._pendingResults
+                self._pendingResults = {}
+                self._pendingCount = 0
+                self._lastFlush = time.monotonic()
+                rows = MagicCache._rows(self._writingResults)
+
+            self._connection.executemany('INSERT OR REPLACE INTO magic VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self._connection.commit()
+
+            with self._lock:
+                self._writingResults = {}
+
+    @staticmethod
+    def _rows(results: Dict[Tuple[str, str], Dict[str, tuple]]) -> List[tuple]:
+        return [
+            key + (name,) + entry
+            for key, entries in results.items()
+            for name, entry in entries.items()
+        ]
+
+    def flush(self) -> None:
+        '''
+            Writes the pending results.
+        '''
+        self._flush()
+
+    def close(self) -> None:
+        '''
+            Writes the pending results and closes the cache.
+        '''
+        self._flush()
+        with self._writeLock:
+            with self._lock:
+                if self._closed:
+                    return
+                self._closed = True
+                connections = self._openedConnections
+                self._openedConnections = []
+            for connection in connections:
+                connection.close()
+            self._connection.close()
+        logger.info('Magic cache closed (%d hits, %d misses)' % (self.hits, self.misses))
@@ -1,110 +1,193 @@
 import os
 from threading import Thread, Timer
-from fnmatch import fnmatch
-from typing import List, Iterable
-from threading import Lock
+from typing import List, Iterable, Iterator, Callable, Tuple
+from queue import Queue, Empty, Full
+from threading import Lock, Event
 import itertools
+import functools
+import hashlib
+import json
+import time
 import logging
-import traceback
 
 from lib.database import canDatabaseHandleParallelConnections
+from lib.workQueue import WorkQueue
+from lib.crawlJournal import CrawlJournal
+from lib.dispatcherMetrics import DispatcherMetrics, instrumentEngine, takeDbTime
+from lib.handleWatchdog import HandleWatchdog, guardEngine
+from lib.quarantine import Quarantine
+from lib.magicCache import MagicCache
+from lib.listingCache import ListingCache
+import lib.processWorker as processWorker
 
-from public import FileHandleModule, FileSystemModule
+from public import FileHandleModule, FileSystemModule, ConfiguratonError, HandleTimeoutError, MimeRouter, IgnoreMatcher, DirectoryStates
 from public.fileDescriptor import FileDescriptor
+import public.magicTools as magicTools
+import public.mappedFile as mappedFile
 from public.configHandler import ConfigHandler
 from public.configuration import moduleConfiguration
 
-from multiprocessing.pool import ThreadPool
-import multiprocessing.dummy
-from multiprocessing.pool import ThreadPool
+from multiprocessing.pool import ThreadPool, Pool
 
 from sqlalchemy.engine import Engine
 
 logger = logging.getLogger('fileIndexer').getChild('lib.MessageDispatcher')
 
 
-class CachedFileDescriptorsIterator(object):
+class MessageDispatcher(object):
     '''
-        A simple :class:`public.FileSystemModule` iterator that keep in cache
-        the first returned values.
+        Runs the file handle modules on the files of all the configured data
+        sources.
 
-        Used instead of keeping values in a simple list, blocking the program
-        while all files have not been listed by the module.
-    '''
-    
-    def __init__(self, fileSystemModule: FileSystemModule, ignorePatterns: List[str], followSymlinks: bool):
-        '''
-        ..note::
-
-            These parameters will be given to the
-            :meth:`public.fileSystemModule.FileSystemModule.listFiles` method.
-
-            
-            :param fileSystemModule: The module which is listing files.
-            :type fileSystemModule: public.fileSystemModule.FileSystemModule
-            :param ignorePatterns: Patterns to ignore.
-            :type ignorePatterns: List[str]
-            :param followSymlinks: Does the listing follow links.
-            :type followSymlinks: bool
-        '''
-        self._fileSystemModule = fileSystemModule
-        self._ignorePatterns = ignorePatterns
-        self._followSymlinks = followSymlinks
-        self._cache = None
-        self._iter = None
-        self._iterPos = 0
-
-    def __iter__(self):
-        if not self._cache:
-            self._iter = self._fileSystemModule.listFiles(ignorePatterns=self._ignorePatterns, followSymlinks=self._followSymlinks)
-            self._cache = []
-        else:
-            self._iter = None
-            self._iterPos = 0
-        return self
-
-    def __next__(self):
-        if self._iter:
-            v = next(self._iter)
-            self._cache.append(v)
-            return v
-        else:
-            self._iterPos += 1
-            if self._iterPos == len(self._cache):
-                raise StopIteration
-            else:
-                return self._cache[self._iterPos-1]
+        Modules are run in a thread pool, except the ones asking for a process
+        pool (see :meth:`public.fileHandleModule.FileHandleModule.runInProcessPool`).
+        The process pool is only available when the function used to load the
+        application configuration is given, each worker process having to load
+        its own configuration, modules and database engine.
 
-class MessageDispatcher(object):
+        :param appConfig: The application configuration.
+        :type appConfig: :class:`public.configHandler.ConfigHandler`
+        :param appConfigLoader: The function loading the application configuration
+                                and its modules from a configuration path (used by
+                                process pool workers).
+        :type appConfigLoader: Callable[[str], :class:`public.configHandler.ConfigHandler`]
+    '''
 
-    def __init__(self, appConfig: ConfigHandler):
+    def __init__(self, appConfig: ConfigHandler, appConfigLoader: Callable[[str], ConfigHandler] = None):
 
         self.appConfig = appConfig
 
+        FileDescriptor.magicHeaderSize = appConfig.get(moduleConfiguration['magicHeaderSize'])
+        FileDescriptor.magicFallbackSize = appConfig.get(moduleConfiguration['magicFallbackSize'])
+        magicTools.setFastPathMode(appConfig.get(moduleConfiguration['magicFastPath']))
+        FileDescriptor.contentBufferMaxSize = appConfig.get(moduleConfiguration['contentBufferMaxSize'])
+        FileDescriptor.contentBufferTotalSize = appConfig.get(moduleConfiguration['contentBufferTotalSize'])
+        mappedFile.setMapPolicy(appConfig.get(moduleConfiguration['mapMinSize']), appConfig.get(moduleConfiguration['mapMinAge']))
+        self.listingCacheMemoryRows = appConfig.get(moduleConfiguration['listingCacheMemoryRows'])
+        self.listingCacheDirectory = appConfig.get(moduleConfiguration['listingCacheDirectory'])
+        magicCacheFile = appConfig.get(moduleConfiguration['magicCacheFile'])
+        if magicCacheFile:
+            if not os.path.isabs(magicCacheFile):
+                magicCacheFile = os.path.join(appConfig.getAppPath() or '.', magicCacheFile)
+            self.magicCache = MagicCache(magicCacheFile)
+        else:
+            self.magicCache = None
+        FileDescriptor.magicCache = self.magicCache
+
+        # Stages, each with its own pool : files metadata prefetch (stat, mime),
+        # parsing (thread and process pools) and database bound modules
         self.threadPool = ThreadPool(appConfig.get(
             moduleConfiguration['moduleWorkersCount']))
+        prefetchWorkersCount = appConfig.get(moduleConfiguration['prefetchWorkersCount'])
+        self.prefetchPool = ThreadPool(prefetchWorkersCount) if prefetchWorkersCount else None
+        self.databasePool = ThreadPool(appConfig.get(
+            moduleConfiguration['databaseWorkersCount']))
+        self.databasePoolModules = list(filter(
+            lambda m: m.runInDatabasePool(),
+            appConfig.getFileHandleModules()
+        ))
+        self.workQueue = WorkQueue(appConfig.get(
+            moduleConfiguration['maxPendingJobs']))
+
+        self.processPoolModules = list(filter(
+            lambda m: m.runInProcessPool(),
+            appConfig.getFileHandleModules()
+        ))
+        self.processPool = None
+
+        if len(self.processPoolModules) > 0:
+            if appConfigLoader:
+                self.processPool = Pool(
+                    appConfig.get(moduleConfiguration['processWorkersCount']),
+                    initializer=processWorker.initializeWorker,
+                    initargs=(appConfigLoader, appConfig.getConfigPath())
+                )
+            else:
+                logger.warning('No configuration loader given, modules [%s] will be run in the thread pool' %
+                    ','.join(map(lambda m: m.__class__.__name__, self.processPoolModules)))
+                self.processPoolModules = []
+
+        journalDirectory = appConfig.get(moduleConfiguration['journalDirectory'])
+        if journalDirectory:
+            if not os.path.isabs(journalDirectory):
+                journalDirectory = os.path.join(appConfig.getAppPath() or '.', journalDirectory)
+            self.journal = CrawlJournal(
+                os.path.join(journalDirectory, 'crawl.journal'),
+                appConfig.get(moduleConfiguration['journalBatchSize'])
+            )
+        else:
+            self.journal = None
+
+        self.metricsPrometheusFile = appConfig.get(moduleConfiguration['metricsPrometheusFile'])
+        self.metricsSummaryFile = appConfig.get(moduleConfiguration['metricsSummaryFile'])
+        self.metricsInterval = appConfig.get(moduleConfiguration['metricsInterval'])
+        if self.metricsPrometheusFile or self.metricsSummaryFile:
+            self.metrics = DispatcherMetrics()
+        else:
+            self.metrics = None
+
+        self.shutdownTimeout = appConfig.get(moduleConfiguration['shutdownTimeout'])
+
+        self.handleTimeout = appConfig.get(moduleConfiguration['handleTimeout'])
+        self.watchdog = HandleWatchdog()
+        quarantineFile = appConfig.get(moduleConfiguration['quarantineFile'])
+        if quarantineFile:
+            if not os.path.isabs(quarantineFile):
+                quarantineFile = os.path.join(appConfig.getAppPath() or '.', quarantineFile)
+            self.quarantine = Quarantine(quarantineFile)
+        else:
+            self.quarantine = None
 
         self._done = False
+        self._doneTime = None
+        self._forceStop = False
+        self._terminateLock = Lock()
         self._showThreadLength = True
 
     def __del__(self):
         '''
-            Closes the thread pool on close.
+            Closes the pools on close.
         '''
-        self.threadPool.terminate()
         try:
-            self.threadPool.join()
+            self._terminatePools()
         except Exception as ex:
             logger.exception(ex)
 
+    def _terminatePools(self, waitThreads: bool = True) -> None:
+        '''
+            Terminates the stage pools (prefetch, threads, database and processes)
+            and waits for them to be closed.
+
+            :param waitThreads: Whether to wait for the threads running a job,
+                                which can not be stopped (the processes are
+                                killed and always waited for).
+            :type waitThreads: bool
+        '''
+        with self._terminateLock:
+            pools = list(filter(None, (self.prefetchPool, self.threadPool, self.databasePool, self.processPool)))
+            for pool in pools:
+                pool.terminate()
+            for pool in pools:
+                if waitThreads or pool is self.processPool:
+                    pool.join()
+
     def setDone(self) -> None:
         '''
-            Set the job done to ends file handling (this will wait for current
-            jobs to have runned).
+            Set the job done to ends file handling.
+
+            No new work is produced and the files in flight are given
+            ``/global/shutdownTimeout`` seconds to complete (drain) before the
+            pools are terminated. Calling this method a second time terminates
+            the pools without waiting.
 
             This will stop the :meth:`public.messageDispatcher.MessageDispatcher.dispatch` method.
         '''
-        self._done = True
+        if self._done:
+            logger.info('Stopping now')
+            self._forceStop = True
+        else:
+            self._doneTime = time.time()
+            self._done = True
 
     def dispatch(self, dbEngine: Engine, appConfig: ConfigHandler) -> None:
         '''
@@ -112,6 +195,38 @@ class MessageDispatcher(object):
 
             It handles parallel processing if available (depends on the data source type, if it handles parallel
             connections).
+
+            Data sources are processed concurrently (at most ``/global/dataSourcesWorkersCount`` at the same
+            time, all of them by default), sharing the worker pools and the ``/global/maxPendingJobs`` limit. A
+            data source can also limit its own files in flight with its ``maxPendingJobs`` key.
+
+            Work is split in stages, each with its own pool : listing (one thread per data source), metadata
+            prefetch (``/global/prefetchWorkersCount``, pipeline mode), parsing (``/global/workersCount`` threads
+            and ``/global/processWorkersCount`` processes) and database bound modules
+            (``/global/databaseWorkersCount``). The files in flight (and therefore the stages queues) are
+            bounded by ``/global/maxPendingJobs``.
+
+            Two dispatch modes are available (configured at ``/global/dispatchMode``) :
+                - ``pipeline`` (default): each data source is listed once and each file goes through the
+                  dependency steps on its own, its next step being queued as soon as the previous one is
+                  done. The file content read by a module is shared with the next ones (see
+                  :meth:`public.fileDescriptor.FileDescriptor.getContent`).
+                - ``steps``: each module is run on the whole data source, step by step, waiting for all
+                  the files to be processed before running the next module. Only the files stat and magic
+                  results are kept between the steps, each module reading the files content again.
+
+            Data sources with the ``incremental`` key set only have the files of the directories changed since
+            the last run listed (see :class:`public.directoryStates.DirectoryStates`), the directories states
+            being saved once the data source has been processed.
+
+            With ``/global/dryRun``, the data sources are only listed : no module is run and the number of
+            files listed and of entries removed by each ignore pattern are logged.
+
+            With ``/global/watch/enabled``, the data sources are watched once processed (only the local ones,
+            see :meth:`public.fileSystemModule.FileSystemModule.watchFiles`), each batch of changed files going
+            through all the steps (as in the ``pipeline`` mode), until stopped. Watches are set before the data
+            sources are listed, no change being missed.
+
             :param dbEngine: A database connection.
             :type dbEngine: :class:`sqlalchemy.engine.Engine`
             :param dbEngine: The application configuration.
@@ -120,118 +235,826 @@ class MessageDispatcher(object):
 
         # import $(dbEngine.driver).threadsafety
         steps = appConfig.getDependencyTree()
-        workResults = []
+        workQueue = self.workQueue
         ex = None
-        actualModuleCallCount = 1
         totalModuleCallCount = len(list(itertools.chain(*steps)))
         allowParallelExecution = canDatabaseHandleParallelConnections(dbEngine)
+        dispatchMode = appConfig.get(moduleConfiguration['dispatchMode'])
+        dryRun = appConfig.get(moduleConfiguration['dryRun'])
+        watch = appConfig.get(moduleConfiguration['watchEnabled']) and not dryRun
+        dataSources = self.appConfig.getDataSources()
+        dataSourcesWorkersCount = appConfig.get(moduleConfiguration['dataSourcesWorkersCount']) or len(dataSources)
+        # Handled mimes of all the modules, compiled once
+        mimeRouter = MimeRouter(
+            (mime, currentModule) for currentModule in itertools.chain(*steps) for mime in self._module_mimes(currentModule)
+        )
+
+        if dispatchMode not in ('steps', 'pipeline'):
+            raise ConfiguratonError('Unknown dispatch mode [%s] (expected [steps] or [pipeline])' % dispatchMode)
 
         if not allowParallelExecution:
             logger.info(
                 'Parallel execution will be disabled because the database API does not allow parallel connections')
+            dataSourcesWorkersCount = 1
+
+        if self.metrics:
+            instrumentEngine(dbEngine)
+        guardEngine(dbEngine)
 
         def _errCallback(err):
             # logger.error("An error occured :\n%s" % repr(err))
             logger.error("An error occured :\n%s" % repr(err))
 
-        def waitAll():
-            while len(workResults) > 0:
-                if not self._done:
-                    workResults.pop(0).wait()
-                else:
-                    #self.threadPool.close()
-                    self.threadPool.terminate()
-                    #self.threadPool._inqueue._queue.clear()
-                    self.threadPool.join()
+        # Module runs in progress, reported when the drain is interrupted
+        inFlight = set()
+        # Directories states of the incremental listings, by data source path
+        directoryStatesByDataSource = {}
+        inFlightLock = Lock()
+
+        def waitAll(queue: WorkQueue):
+            '''
+                Waits for all the queue jobs to complete, or returns as soon as
+                the dispatch is stopped (the jobs are drained by :func:`drain`).
+            '''
+            while not queue.wait(timeout=1.0):
+                if self._done:
                     return
 
-        def runHandle(currentModule: FileHandleModule, fileDescriptor: FileDescriptor):
+        def drain(queue: WorkQueue) -> bool:
+            '''
+                Lets the jobs in flight complete, within ``/global/shutdownTimeout``
+                seconds from the stop, then terminates the pools and records the
+                module runs left.
+
+                :returns: Whether all the jobs completed.
+                :rtype: bool
+            '''
+            if len(queue) > 0:
+                logger.info('Draining %d jobs (%s)' % (
+                    len(queue),
+                    'no timeout' if self.shutdownTimeout is None else '%ds timeout' % self.shutdownTimeout
+                ))
+
+            while not queue.wait(timeout=0.5):
+                if self._forceStop or (
+                    self.shutdownTimeout is not None and time.time() - self._doneTime >= self.shutdownTimeout
+                ):
+                    with inFlightLock:
+                        leftWork = list(inFlight)
+                    logger.warning('Drain interrupted, %d jobs left (%d module runs in progress)' % (len(queue), len(leftWork)))
+                    for fileDescriptor, currentModule in leftWork:
+                        logger.warning('Module [%s] interrupted on file [%s]' % (self._module_name(currentModule), fileDescriptor.fullPath))
+                        recordStatus(fileDescriptor, currentModule, CrawlJournal.STATUS_INTERRUPTED)
+                    # The threads still running a module are left behind
+                    self._terminatePools(waitThreads=False)
+                    return False
+
+            logger.info('All jobs drained')
+            return True
+
+        def acquireSlot(queue: WorkQueue) -> bool:
+            '''
+                Blocks while too many jobs are in flight (backpressure on the
+                listing).
+
+                :returns: ``False`` if the dispatch have been stopped while waiting.
+                :rtype: bool
+            '''
+            while not queue.acquireSlot(timeout=1.0):
+                if self._done:
+                    return False
+            return True
+
+        def moduleHandlesMime(currentModule: FileHandleModule, fileDescriptor: FileDescriptor) -> bool:
+            return mimeRouter.isCatchAll(currentModule) or currentModule in mimeRouter.route(fileDescriptor.mime)
+
+        def isFileRouted(fileDescriptor: FileDescriptor, currentModule: FileHandleModule = None) -> bool:
+            '''
+                Whether the file is handled by the given module (or by any module),
+                used to avoid queuing files no module wants.
+            '''
             try:
-                if any(map(
-                    lambda _mime: fnmatch(fileDescriptor.mime, _mime),
-                    self._module_mimes(currentModule)
-                )):
+                if currentModule:
+                    return moduleHandlesMime(currentModule, fileDescriptor)
+                else:
+                    return mimeRouter.routesAll or len(mimeRouter.route(fileDescriptor.mime)) > 0
+            except Exception as ex:
+                logger.exception("Unable to get the mime of file [%s]" % fileDescriptor.fullPath)
+                return False
+
+        def fileVersion(fileDescriptor: FileDescriptor) -> Tuple[int, int]:
+            # (size, mtime_ns) of the file, the journal skipping only unchanged files
+            try:
+                stat = fileDescriptor.stat
+            except OSError:
+                return None, None
+            return stat.st_size, getattr(stat, 'st_mtime_ns', int(stat.st_mtime * 1e9))
+
+        def isDone(fileDescriptor: FileDescriptor, currentModule: FileHandleModule = None) -> bool:
+            '''
+                Whether the work have been completed in a previous (interrupted)
+                run, for the given module or for all the modules, on the file
+                unchanged since.
+            '''
+            return self.journal is not None and self.journal.isDone(
+                fileDescriptor.dataSource,
+                fileDescriptor.fullPath,
+                self._module_name(currentModule) if currentModule else CrawlJournal.ALL_MODULES,
+                *fileVersion(fileDescriptor)
+            )
+
+        def recordStatus(fileDescriptor: FileDescriptor, currentModule: FileHandleModule, status: str) -> None:
+            if self.journal is not None:
+                self.journal.record(
+                    fileDescriptor.dataSource,
+                    fileDescriptor.fullPath,
+                    self._module_name(currentModule) if currentModule else CrawlJournal.ALL_MODULES,
+                    status,
+                    *fileVersion(fileDescriptor)
+                )
+
+        def recordFailure(fileDescriptor: FileDescriptor, currentModule: FileHandleModule) -> None:
+            recordStatus(fileDescriptor, currentModule, CrawlJournal.STATUS_ERROR)
+            directoryStates = directoryStatesByDataSource.get(fileDescriptor.dataSource)
+            if directoryStates is not None:
+                # Listed again on the next run
+                directoryStates.failed(fileDescriptor.path)
+
+        def getHandleTimeout(currentModule: FileHandleModule) -> float:
+            return currentModule.handleTimeout() or self.handleTimeout
+
+        def isQuarantined(fileDescriptor: FileDescriptor, currentModule: FileHandleModule) -> bool:
+            '''
+                Whether the module failed on this file in a previous run (and
+                the file did not change since).
+            '''
+            return self.quarantine is not None and self.quarantine.isQuarantined(
+                self._module_name(currentModule),
+                fileDescriptor.fullPath,
+                fileDescriptor.stat.st_size,
+                fileDescriptor.stat.st_mtime
+            )
+
+        def quarantineFile(fileDescriptor: FileDescriptor, currentModule: FileHandleModule, err: BaseException) -> None:
+            '''
+                Quarantines a file the module failed on, unless the error is not
+                related to the file (system, configuration or database errors,
+                the file being processed again on the next run).
+            '''
+            if self.quarantine is not None and Quarantine.isFileError(err):
+                try:
+                    self.quarantine.add(
+                        self._module_name(currentModule),
+                        fileDescriptor.fullPath,
+                        fileDescriptor.stat.st_size,
+                        fileDescriptor.stat.st_mtime,
+                        'timed out' if isinstance(err, HandleTimeoutError) else repr(err)
+                    )
+                except Exception:
+                    logger.exception('Unable to quarantine file [%s]' % fileDescriptor.fullPath)
+
+        def recordMetrics(currentModule: FileHandleModule, fileDescriptor: FileDescriptor, queueWait: float, duration: float,
+                            dbTime: float, error: bool) -> None:
+            if self.metrics:
+                try:
+                    size = fileDescriptor.stat.st_size
+                except Exception:
+                    size = 0
+                self.metrics.recordHandle(self._module_name(currentModule), fileDescriptor.dataSource, queueWait, duration, size,
+                    dbTime=dbTime, error=error)
+
+        def runHandle(currentModule: FileHandleModule, fileDescriptor: FileDescriptor, queuedAt: float = None):
+            startTime = None
+            error = False
+            try:
+                if moduleHandlesMime(currentModule, fileDescriptor) and not isQuarantined(fileDescriptor, currentModule):
                     if not self._done:
-                        if currentModule.canHandle(fileDescriptor):
-                            currentModule.handle(fileDescriptor, dbEngine, appConfig)
+                        with inFlightLock:
+                            inFlight.add((fileDescriptor, currentModule))
+                        startTime = time.perf_counter()
+                        takeDbTime()
+                        processWorker.runModule(currentModule, fileDescriptor, dbEngine, appConfig, self.watchdog,
+                            timeout=getHandleTimeout(currentModule))
+                        recordStatus(fileDescriptor, currentModule, CrawlJournal.STATUS_DONE)
+            except HandleTimeoutError as ex:
+                error = True
+                logger.error("Module [%s] timed out on file [%s]" % (currentModule.__class__, fileDescriptor.fullPath))
+                recordFailure(fileDescriptor, currentModule)
+                quarantineFile(fileDescriptor, currentModule, ex)
             except Exception as ex:
+                error = True
                 logger.exception("An error occured while running module [%s] on file [%s]" % (currentModule.__class__, fileDescriptor.fullPath))
+                recordFailure(fileDescriptor, currentModule)
+                quarantineFile(fileDescriptor, currentModule, ex)
+            finally:
+                if startTime is not None:
+                    with inFlightLock:
+                        inFlight.discard((fileDescriptor, currentModule))
+                    recordMetrics(currentModule, fileDescriptor,
+                        queueWait=startTime - queuedAt if queuedAt else 0.0,
+                        duration=time.perf_counter() - startTime,
+                        dbTime=takeDbTime(),
+                        error=error
+                    )
+
+        def handleFile(queue: WorkQueue, currentModule: FileHandleModule, fileDescriptor: FileDescriptor, onDone: Callable[[], None],
+                        queuedAt: float = None):
+            '''
+                Runs a module on a file, in the current thread or in the process
+                pool or the database pool if the module asks for it.
+
+                ``onDone`` is called exactly once, when the module is done with
+                the file. ``queuedAt`` is the time the job have been queued at
+                (:func:`time.perf_counter`), used by the metrics.
+            '''
+            if currentModule in self.processPoolModules:
+                try:
+                    submitToProcessPool = not self._done and moduleHandlesMime(currentModule, fileDescriptor) and \
+                        not isQuarantined(fileDescriptor, currentModule)
+                except Exception as ex:
+                    logger.exception("An error occured while running module [%s] on file [%s]" % (currentModule.__class__, fileDescriptor.fullPath))
+                    submitToProcessPool = False
+
+                if submitToProcessPool:
+                    submittedAt = time.perf_counter()
+                    with inFlightLock:
+                        inFlight.add((fileDescriptor, currentModule))
+
+                    def _processCallback(result):
+                        duration, dbTime = result
+                        with inFlightLock:
+                            inFlight.discard((fileDescriptor, currentModule))
+                        recordStatus(fileDescriptor, currentModule, CrawlJournal.STATUS_DONE)
+                        recordMetrics(currentModule, fileDescriptor,
+                            queueWait=time.perf_counter() - submittedAt - duration,
+                            duration=duration,
+                            dbTime=dbTime,
+                            error=False
+                        )
+
+                    def _processErrCallback(err):
+                        if isinstance(err, HandleTimeoutError):
+                            logger.error("Module [%s] timed out on file [%s]" % (currentModule.__class__, fileDescriptor.fullPath))
+                        else:
+                            logger.error("An error occured while running module [%s] on file [%s]" % (currentModule.__class__, fileDescriptor.fullPath),
+                                exc_info=err)
+                        with inFlightLock:
+                            inFlight.discard((fileDescriptor, currentModule))
+                        recordFailure(fileDescriptor, currentModule)
+                        quarantineFile(fileDescriptor, currentModule, err)
+                        recordMetrics(currentModule, fileDescriptor,
+                            queueWait=0.0,
+                            duration=time.perf_counter() - submittedAt,
+                            dbTime=0.0,
+                            error=True
+                        )
+
+                    # onDone is called by the work queue, even if the submission fails
+                    queue.submit(
+                        self.processPool,
+                        processWorker.runHandle,
+                        args=(self._module_name(currentModule), fileDescriptor, getHandleTimeout(currentModule)),
+                        onDone=onDone,
+                        callback=_processCallback,
+                        errorCallback=_processErrCallback
+                    )
+                    return
+
+                onDone()
+                return
+
+            if currentModule in self.databasePoolModules:
+                # Metadata read by this thread (the database pool only waiting on the database)
+                prefetchMetadata(fileDescriptor)
+                # onDone is called by the work queue, even if the submission fails
+                queue.submit(
+                    self.databasePool,
+                    runHandle,
+                    args=(currentModule, fileDescriptor, queuedAt),
+                    onDone=onDone,
+                    errorCallback=_errCallback
+                )
+                return
+
+            try:
+                runHandle(currentModule, fileDescriptor, queuedAt=queuedAt)
+            finally:
+                onDone()
+
+        lastMetricsWriteTime = time.time()
+
+        def writeMetrics():
+            try:
+                if self.metricsPrometheusFile:
+                    self.metrics.writePrometheus(self.metricsPrometheusFile)
+            except Exception as ex:
+                logger.exception('Unable to write the metrics')
 
         def printJobStatus():
+            nonlocal lastMetricsWriteTime
             if self._showThreadLength:
                 Timer(5.0, printJobStatus).start()
-                if len(workResults) > 0:
-                    logger.info('%d files to process' % len(workResults))
+                if len(workQueue) > 0:
+                    logger.info('%d files to process' % len(workQueue))
+                if self.journal is not None:
+                    self.journal.flush()
+                if self.magicCache is not None:
+                    self.magicCache.flush()
+                if self.metrics and time.time() - lastMetricsWriteTime >= self.metricsInterval:
+                    lastMetricsWriteTime = time.time()
+                    writeMetrics()
 
-        try:
-            printJobStatus()
-            for dataSource in self.appConfig.getDataSources():
-                fileSystemModule = self.appConfig.getFileSystemModuleForDataSource(dataSource['path'])
-                logger.info('Processing [%s]' % dataSource['path'])
-                # Cache for file descriptors to avoid excessive calls to get mimes etc
-                fileDescriptorIterator = CachedFileDescriptorsIterator(
-                    fileSystemModule=fileSystemModule,
-                    ignorePatterns=dataSource['ignorePatterns'],
-                    followSymlinks=dataSource['followSymlinks']
-                )
-                actualModuleCallCount = 1
+        def prefetchMetadata(fileDescriptor: FileDescriptor):
+            '''
+                Reads the file metadata (stat and mime, reading the file header),
+                cached by the file descriptor.
+            '''
+            try:
+                fileDescriptor.stat
+                fileDescriptor.mime
+            except Exception as ex:
+                # Raised again by the modules
+                logger.debug('Unable to prefetch file [%s] (%s)' % (fileDescriptor.fullPath, ex))
 
-                for stepId in range(0, len(steps)):
-                    logger.info('Processing step %(stepId)02d of %(stepLength)02d' % {
-                                'stepId': stepId+1, 'stepLength': len(steps)})
-                    step = steps[stepId]
+        def prefetchFile(queue: WorkQueue, fileDescriptor: FileDescriptor):
+            '''
+                Reads the file metadata in the prefetch pool, so the parsing pools
+                do not wait on the disk, then queues the first step of the file.
+            '''
+            try:
+                prefetchMetadata(fileDescriptor)
+            finally:
+                try:
+                    submitFileStep(queue, fileDescriptor, 0)
+                except Exception:
+                    queue.releaseSlot()
+                    raise
 
-                    for currentModule in step:
-                        logger.info('[%(actualModuleCallCount)02d of %(totalModuleCallCount)02d] Running module %(moduleName)s' % {
-                            'actualModuleCallCount':    actualModuleCallCount,
-                            'totalModuleCallCount':     totalModuleCallCount,
-                            'moduleName':               currentModule.__class__.__name__,
-                        })
+        def submitFileStep(queue: WorkQueue, fileDescriptor: FileDescriptor, stepId: int):
+            queue.submit(
+                self.threadPool,
+                runFileStep,
+                args=(queue, fileDescriptor, stepId, time.perf_counter()),
+                errorCallback=_errCallback
+            )
 
-                        for fileDescriptor in fileDescriptorIterator:
-                            if not self._done:
-                                if allowParallelExecution:
-                                    workResults.append(
-                                        self.threadPool.apply_async(
-                                            runHandle,
-                                            args=(currentModule, fileDescriptor),
-                                            error_callback=_errCallback
-                                        )
+        def runFileStep(queue: WorkQueue, fileDescriptor: FileDescriptor, stepId: int, queuedAt: float = None):
+            '''
+                Runs all the modules of a step on a single file, then queues the
+                next step for this file (pipelined dispatch).
+
+                The continuation is queued before the last module job of the
+                step returns so :func:`waitAll` will always find it. The file slot
+                is kept by the continuation and released once the last step is done.
+            '''
+            step = list(filter(
+                lambda currentModule: not isDone(fileDescriptor, currentModule) and isFileRouted(fileDescriptor, currentModule),
+                steps[stepId]
+            ))
+            remainingModules = len(step)
+            remainingModulesLock = Lock()
+
+            if remainingModules == 0:
+                continueFile(queue, fileDescriptor, stepId)
+                return
+
+            def moduleDone():
+                nonlocal remainingModules
+                with remainingModulesLock:
+                    remainingModules -= 1
+                    stepDone = remainingModules == 0
+                if stepDone:
+                    continueFile(queue, fileDescriptor, stepId)
+
+            for currentModule in step:
+                handleFile(queue, currentModule, fileDescriptor, moduleDone, queuedAt=queuedAt)
+
+        def continueFile(queue: WorkQueue, fileDescriptor: FileDescriptor, stepId: int):
+            slotHandedOver = False
+            try:
+                if stepId + 1 < len(steps) and not self._done:
+                    submitFileStep(queue, fileDescriptor, stepId + 1)
+                    slotHandedOver = True
+                elif not self._done:
+                    recordStatus(fileDescriptor, None, CrawlJournal.STATUS_DONE)
+            finally:
+                if not slotHandedOver:
+                    fileDescriptor.releaseContent()
+                    queue.releaseSlot()
+
+        def releaseFile(queue: WorkQueue, fileDescriptor: FileDescriptor):
+            '''
+                Drops the file shared content once a module is done with it (in
+                the step by step dispatch, the next module will run on all the
+                files first) and releases the file slot.
+            '''
+            fileDescriptor.releaseContent()
+            queue.releaseSlot()
+
+        def dispatchSteps(dataSource: dict, fileSystemModule: FileSystemModule, queue: WorkQueue, directoryStates: DirectoryStates) -> bool:
+            '''
+                Runs each module on the whole data source, step by step.
+
+                :returns: Whether the dispatch has been stopped.
+                :rtype: bool
+            '''
+            # Listed once, with the files stat and mimes
+            listingCache = ListingCache(
+                fileSystemModule=fileSystemModule,
+                ignorePatterns=dataSource['ignorePatterns'],
+                followSymlinks=dataSource['followSymlinks'],
+                memoryRows=self.listingCacheMemoryRows,
+                spillDirectory=self.listingCacheDirectory,
+                directoryStates=directoryStates
+            )
+            try:
+                return dispatchStepsFromCache(dataSource, listingCache, queue)
+            finally:
+                listingCache.close()
+
+        def dispatchStepsFromCache(dataSource: dict, listingCache: ListingCache, queue: WorkQueue) -> bool:
+            '''
+                Runs each module on the files of the listing cache (see
+                :func:`dispatchSteps`).
+            '''
+            actualModuleCallCount = 1
+
+            for stepId in range(0, len(steps)):
+                logger.info('[%(dataSource)s] Processing step %(stepId)02d of %(stepLength)02d' % {
+                            'dataSource': dataSource['path'], 'stepId': stepId+1, 'stepLength': len(steps)})
+                step = steps[stepId]
+
+                for currentModule in step:
+                    logger.info('[%(dataSource)s] [%(actualModuleCallCount)02d of %(totalModuleCallCount)02d] Running module %(moduleName)s' % {
+                        'dataSource':               dataSource['path'],
+                        'actualModuleCallCount':    actualModuleCallCount,
+                        'totalModuleCallCount':     totalModuleCallCount,
+                        'moduleName':               currentModule.__class__.__name__,
+                    })
+
+                    for fileDescriptor in listingCache:
+                        if not self._done:
+                            fileDescriptor.dataSource = dataSource['path']
+                            if isDone(fileDescriptor, currentModule) or not isFileRouted(fileDescriptor, currentModule):
+                                continue
+                            elif allowParallelExecution:
+                                if acquireSlot(queue):
+                                    # Database pool modules handed over once the file metadata is read
+                                    queue.submit(
+                                        self.threadPool,
+                                        handleFile,
+                                        args=(queue, currentModule, fileDescriptor, functools.partial(releaseFile, queue, fileDescriptor), time.perf_counter()),
+                                        errorCallback=_errCallback
                                     )
-                                else:
-                                    # Synchronous call
-                                    try:
-                                        runHandle(currentModule, fileDescriptor)
-                                    except Exception as ex:
-                                        _errCallback(ex)
                             else:
-                                logger.info('Closing working threads')
-                                #self.threadPool.close()
-                                self.threadPool.terminate()
-                                self.threadPool.join()
-                                return
-
-                        logger.info('Jobs prepared, waiting for all to complete ...')
-                        # We wait for all jobs to process before the next step
-                        waitAll()
-                        logger.info('Done')
+                                # Synchronous call
+                                try:
+                                    runHandle(currentModule, fileDescriptor)
+                                except Exception as ex:
+                                    _errCallback(ex)
+                                finally:
+                                    fileDescriptor.releaseContent()
+                        else:
+                            logger.info('[%s] Stopped, no more files will be queued' % dataSource['path'])
+                            return True
+
+                    logger.info('[%s] Jobs prepared, waiting for all to complete ...' % dataSource['path'])
+                    # We wait for all jobs to process before the next step
+                    waitAll(queue)
+                    logger.info('[%s] Done' % dataSource['path'])
+                    if self._done:
+                        return True
+
+                    actualModuleCallCount += 1
+
+            return False
+
+        def dispatchPipeline(dataSource: dict, fileSystemModule: FileSystemModule, queue: WorkQueue, directoryStates: DirectoryStates) -> bool:
+            '''
+                Lists the data source once and sends each file through all the
+                steps, a step being queued as soon as the previous one is done
+                for this file.
+
+                :returns: Whether the dispatch has been stopped.
+                :rtype: bool
+            '''
+            if dispatchFiles(dataSource, fileSystemModule.listFiles(
+                ignorePatterns=dataSource['ignorePatterns'],
+                followSymlinks=dataSource['followSymlinks'],
+                directoryStates=directoryStates
+            ), queue):
+                return True
+
+            logger.info('[%s] All files listed, waiting for all to complete ...' % dataSource['path'])
+            waitAll(queue)
+            return self._done
+
+        def dispatchFiles(dataSource: dict, fileDescriptors: Iterable[FileDescriptor], queue: WorkQueue) -> bool:
+            '''
+                Sends each file through all the steps (see :func:`dispatchPipeline`),
+                without waiting for them to complete.
+
+                :returns: Whether the dispatch has been stopped.
+                :rtype: bool
+            '''
+            for fileDescriptor in fileDescriptors:
+                if not self._done:
+                    fileDescriptor.dataSource = dataSource['path']
+                    if isDone(fileDescriptor) or not isFileRouted(fileDescriptor):
+                        continue
+                    elif allowParallelExecution:
+                        if acquireSlot(queue):
+                            if self.prefetchPool:
+                                queue.submit(
+                                    self.prefetchPool,
+                                    prefetchFile,
+                                    args=(queue, fileDescriptor),
+                                    errorCallback=_errCallback
+                                )
+                            else:
+                                submitFileStep(queue, fileDescriptor, 0)
+                    else:
+                        # Synchronous call
+                        try:
+                            for step in steps:
+                                for currentModule in step:
+                                    if not isDone(fileDescriptor, currentModule):
+                                        runHandle(currentModule, fileDescriptor)
+                            if not self._done:
+                                recordStatus(fileDescriptor, None, CrawlJournal.STATUS_DONE)
+                        except Exception as ex:
+                            _errCallback(ex)
+                        finally:
+                            fileDescriptor.releaseContent()
+                else:
+                    logger.info('[%s] Stopped, no more files will be queued' % dataSource['path'])
+                    return True
+
+            return False
+
+        def dryRunDataSource(dataSource: dict, fileSystemModule: FileSystemModule) -> bool:
+            '''
+                Lists a data source without processing its files, reporting the
+                entries removed by each ignore pattern.
+
+                :returns: Whether the dispatch has been stopped.
+                :rtype: bool
+            '''
+            ignoreMatcher = IgnoreMatcher(dataSource['ignorePatterns'])
+            listedFiles = 0
+            for _ in fileSystemModule.listFiles(
+                ignorePatterns=ignoreMatcher,
+                followSymlinks=dataSource['followSymlinks'],
+                withStat=False
+            ):
+                if self._done:
+                    logger.info('[%s] Stopped' % dataSource['path'])
+                    return True
+                listedFiles += 1
+
+            logger.info('[%s] Dry run, %d files would be processed' % (dataSource['path'], listedFiles))
+            for pattern, removedEntries in ignoreMatcher.report():
+                logger.info('[%s]     %d entries ignored by [%s]' % (dataSource['path'], removedEntries, pattern))
+            return False
+
+        # Stops the watches only (set when the watch loop ends, stopped or failing)
+        watchesStopped = Event()
+
+        def startWatches() -> List[Tuple[dict, Iterator[List[FileDescriptor]]]]:
+            '''
+                Watches the data sources supporting it.
+
+                :returns: The data sources and their changed files.
+                :rtype: List[Tuple[dict, Iterator[List[FileDescriptor]]]]
+            '''
+            watches = []
+            for dataSource in dataSources:
+                try:
+                    fileSystemModule = self.appConfig.getFileSystemModuleForDataSource(dataSource['path'])
+                    watches.append((dataSource, fileSystemModule.watchFiles(
+                        ignorePatterns=dataSource['ignorePatterns'],
+                        followSymlinks=dataSource['followSymlinks'],
+                        isStopped=lambda: self._done or watchesStopped.is_set(),
+                        debounceDelay=appConfig.get(moduleConfiguration['watchDebounceDelay']),
+                        maxDelay=appConfig.get(moduleConfiguration['watchMaxDelay'])
+                    )))
+                except NotImplementedError as ex:
+                    logger.warning('[%s] Not watched (%s)' % (dataSource['path'], ex))
+                except Exception:
+                    logger.exception('Unable to watch [%s]' % dataSource['path'])
+            return watches
+
+        def watchDataSources(watches: List[Tuple[dict, Iterator[List[FileDescriptor]]]]) -> bool:
+            '''
+                Processes the changed files of the watched data sources, each
+                batch going through all the steps. The modules ``afterDispatch``
+                are run once changes have been processed, at most once every
+                ``/global/watch/afterDispatchDelay`` seconds.
+
+                :returns: Whether the dispatch has been stopped.
+                :rtype: bool
+            '''
+            changedFilesBatches = Queue(maxsize=len(watches) * 4)
+            afterDispatchDelay = appConfig.get(moduleConfiguration['watchAfterDispatchDelay'])
+            afterDispatchPending = False
+            lastAfterDispatch = time.monotonic()
+
+            def watchDataSource(dataSource: dict, changes: Iterator[List[FileDescriptor]]) -> None:
+                try:
+                    for fileDescriptors in changes:
+                        while not self._done and not watchesStopped.is_set():
+                            try:
+                                changedFilesBatches.put((dataSource, fileDescriptors), timeout=1.0)
+                                break
+                            except Full:
+                                pass
+                except Exception:
+                    logger.exception('[%s] Watch stopped' % dataSource['path'])
+
+            watchThreads = list(map(
+                lambda watchId: Thread(target=watchDataSource, args=watches[watchId], name='Watch-%d' % watchId, daemon=True),
+                range(len(watches))
+            ))
+            for watchThread in watchThreads:
+                watchThread.start()
+            logger.info('Watching %d data sources for changes' % len(watches))
+
+            try:
+                while not self._done and any(map(lambda watchThread: watchThread.is_alive(), watchThreads)):
+                    try:
+                        dataSource, fileDescriptors = changedFilesBatches.get(timeout=1.0)
+                        logger.info('[%s] %d files changed' % (dataSource['path'], len(fileDescriptors)))
+                        queue = WorkQueue(dataSource['maxPendingJobs'], parent=workQueue)
+                        if dispatchFiles(dataSource, fileDescriptors, queue):
+                            return True
+                        waitAll(queue)
                         if self._done:
-                            return
+                            return True
+                        afterDispatchPending = True
+                    except Empty:
+                        pass
+
+                    # Throttled, the modules processing all the files (e.g. the duplicates search)
+                    if afterDispatchPending and time.monotonic() - lastAfterDispatch >= afterDispatchDelay:
+                        runAfterDispatch()
+                        afterDispatchPending = False
+                        lastAfterDispatch = time.monotonic()
+
+                if afterDispatchPending and not self._done:
+                    runAfterDispatch()
+            finally:
+                # Watch threads waiting for the changes
+                watchesStopped.set()
+                for watchThread in watchThreads:
+                    watchThread.join()
+            return self._done
+
+        def runAfterDispatch() -> None:
+            for step in steps:
+                for currentModule in step:
+                    try:
+                        currentModule.afterDispatch(dbEngine, appConfig)
+                    except Exception:
+                        logger.exception('An error occured while running module [%s] after the dispatch' % currentModule.__class__)
+
+        def getListingKey(dataSource: dict) -> str:
+            '''
+                The key of the listing options and of the modules run, the
+                directories states of an incremental listing being only valid
+                for them.
+            '''
+            return hashlib.sha1(json.dumps([
+                dataSource['ignorePatterns'],
+                dataSource['followSymlinks'],
+                sorted(map(lambda currentModule: currentModule.__class__.__name__, itertools.chain(*steps))),
+            ]).encode('utf-8')).hexdigest()
+
+        def dispatchDataSource(dataSource: dict) -> bool:
+            '''
+                Lists and processes a data source, with its own work queue (limited
+                by the ``maxPendingJobs`` data source key) sharing the global one.
 
-                        actualModuleCallCount += 1
+                :returns: Whether the dispatch has been stopped.
+                :rtype: bool
+            '''
+            fileSystemModule = self.appConfig.getFileSystemModuleForDataSource(dataSource['path'])
+            queue = WorkQueue(dataSource['maxPendingJobs'], parent=workQueue)
+            logger.info('Processing [%s]' % dataSource['path'])
+
+            directoryStates = None
+            if dataSource['incremental'] and not dryRun:
+                coreModuleQuerier = appConfig.getFileHandleModuleByName('CoreModule').getDBQuerier(dbEngine, appConfig)
+                listingKey = getListingKey(dataSource)
+                directoryStates = DirectoryStates(coreModuleQuerier.getDirectoryStates(dataSource['path'], listingKey))
+                directoryStatesByDataSource[dataSource['path']] = directoryStates
+
+            if dryRun:
+                stopped = dryRunDataSource(dataSource, fileSystemModule)
+            elif dispatchMode == 'pipeline':
+                stopped = dispatchPipeline(dataSource, fileSystemModule, queue, directoryStates)
+            else:
+                stopped = dispatchSteps(dataSource, fileSystemModule, queue, directoryStates)
+
+            if not stopped:
+                if directoryStates is not None:
+                    # Listed files processed, unchanged directories skipped on the next run
+                    updatedStates, removedPaths = directoryStates.changes()
+                    coreModuleQuerier.saveDirectoryStates(dataSource['path'], listingKey, updatedStates, removedPaths)
+                    logger.info('[%s] %d unchanged directories skipped (%d files), %d directories states updated' % (
+                        dataSource['path'], directoryStates.skippedDirectories, directoryStates.skippedFiles, len(updatedStates) + len(removedPaths)))
+                logger.info('[%s] Done' % dataSource['path'])
+            return stopped
+
+        if dataSourcesWorkersCount > 1 and len(dataSources) > 1:
+            dataSourcesPool = ThreadPool(min(dataSourcesWorkersCount, len(dataSources)))
+        else:
+            # Sequential processing, in this thread
+            dataSourcesPool = None
+
+        # Before the listing, changes made while processing being kept
+        watches = startWatches() if watch else []
+
+        stopped = False
+        try:
+            printJobStatus()
+            if dataSourcesPool:
+                dataSourcesResults = list(map(
+                    lambda dataSource: (dataSource, dataSourcesPool.apply_async(dispatchDataSource, args=(dataSource,)).get),
+                    dataSources
+                ))
+            else:
+                dataSourcesResults = list(map(
+                    lambda dataSource: (dataSource, functools.partial(dispatchDataSource, dataSource)),
+                    dataSources
+                ))
+
+            for dataSource, getDataSourceResult in dataSourcesResults:
+                try:
+                    # A failing data source does not stop the other ones
+                    if getDataSourceResult():
+                        stopped = True
+                        # Files in flight of all the data sources
+                        drain(workQueue)
+                        return
+                except Exception as _ex:
+                    logger.exception('An error occured while processing [%s]' % dataSource['path'])
+                    ex = ex or _ex
+
+            if ex:
+                logger.info("Waiting for all to close (%d elements)" %
+                            len(workQueue))
+                waitAll(workQueue)
+                if self._done:
+                    drain(workQueue)
+                # Terminating pool avoid being hung when shutdown
+                self._terminatePools()
+            elif not self._done and not dryRun:
+                runAfterDispatch()
+                if watches:
+                    if self.journal is not None:
+                        # Initial run complete, changed files are not journaled
+                        self.journal.clear()
+                        self.journal = None
+                    if watchDataSources(watches):
+                        stopped = True
+                        drain(workQueue)
 
-        except Exception as _ex:
-            ex = _ex
-            logger.info("Waiting for all to close (%d elements)" %
-                        len(workResults))
-            waitAll()
-            # Terminating pool avoid being hung when shutdown
-            self.threadPool.terminate()
         finally:
             self._showThreadLength = False
+            if dataSourcesPool:
+                dataSourcesPool.terminate()
+            for _, changes in watches:
+                changes.close()
+            if self.journal is not None:
+                if stopped or ex or self._done or dryRun:
+                    # Kept to resume the next run
+                    self.journal.close()
+                else:
+                    self.journal.clear()
+            if self.quarantine is not None:
+                self.quarantine.close()
+            if self.magicCache is not None:
+                self.magicCache.close()
+            if magicTools.getFastPathMode() != magicTools.FAST_PATH_OFF:
+                logger.info('Magic fast path : %(hits)d hits, %(misses)d misses, %(agreements)d agreements, %(disagreements)d disagreements' %
+                    magicTools.getFastPathStats())
+            if self.metrics:
+                writeMetrics()
+                if self.metricsSummaryFile:
+                    try:
+                        self.metrics.writeSummary(self.metricsSummaryFile)
+                    except Exception:
+                        logger.exception('Unable to write the metrics summary')
             if ex:
                 raise ex
 
+    def _module_name(self, module: FileHandleModule) -> str:
+        '''
+            :returns: The FQDN name of a module.
+            :rtype: str
+        '''
+        return '%s.%s' % (module.__class__.__module__, module.__class__.__name__)
+
     def _module_mimes(self, module: FileHandleModule) -> List[str]:
         '''
             Ensure to get a list of handled mimes from a module.
@@ -0,0 +1,127 @@
+'''
+    Functions run inside the process pool workers of
+    :class:`lib.messageDispatcher.MessageDispatcher`.
+
+    Each worker process loads its own application configuration, modules,
+    database engine and libmagic handle (nothing is shared with the parent
+    process). Files are given as pickled :class:`public.fileDescriptor.FileDescriptor`.
+'''
+
+from typing import Callable, Tuple
+import time
+import logging
+
+import sqlalchemy
+
+from lib.database import getInitializedDb
+from lib.dispatcherMetrics import instrumentEngine, takeDbTime
+from lib.handleWatchdog import HandleWatchdog, guardEngine
+from public import ConfigHandler, FileDescriptor, FileHandleModule
+from public.configuration import moduleConfiguration
+import public.magicTools as magicTools
+import public.mappedFile as mappedFile
+
+logger = logging.getLogger('fileIndexer').getChild('lib.processWorker')
+
+_appConfig = None
+_dbEngine = None
+_watchdog = None
+
+
+def initializeWorker(appConfigLoader: Callable[[str], ConfigHandler], configPath: str) -> None:
+    '''
+        Process pool initializer. Loads the application configuration, the
+        database engine and connects the file system modules (some of them
+        register connections, as the SMB one).
+
+        :param appConfigLoader: The function used by the main program to load
+                                the application configuration and its modules.
+        :type appConfigLoader: Callable[[str], :class:`public.configHandler.ConfigHandler`]
+        :param configPath: The configuration path to load.
+        :type configPath: str
+    '''
+    global _appConfig
+    global _dbEngine
+    global _watchdog
+
+    logger.debug('Initializing process worker')
+    _appConfig = appConfigLoader(configPath)
+    _dbEngine = getInitializedDb(_appConfig)
+    instrumentEngine(_dbEngine)
+    guardEngine(_dbEngine)
+    _watchdog = HandleWatchdog()
+
+    FileDescriptor.magicHeaderSize = _appConfig.get(moduleConfiguration['magicHeaderSize'])
+    FileDescriptor.magicFallbackSize = _appConfig.get(moduleConfiguration['magicFallbackSize'])
+    magicTools.setFastPathMode(_appConfig.get(moduleConfiguration['magicFastPath']))
+    FileDescriptor.contentBufferMaxSize = _appConfig.get(moduleConfiguration['contentBufferMaxSize'])
+    FileDescriptor.contentBufferTotalSize = _appConfig.get(moduleConfiguration['contentBufferTotalSize'])
+    mappedFile.setMapPolicy(_appConfig.get(moduleConfiguration['mapMinSize']), _appConfig.get(moduleConfiguration['mapMinAge']))
+    # Forked workers inherit the parent cache and its sqlite connection, which can not be used across processes.
+    # Files are sent with their magic results, detected by the parent process.
+    FileDescriptor.magicCache = None
+
+    for dataSource in _appConfig.getDataSources():
+        _appConfig.getFileSystemModuleForDataSource(dataSource['path'])
+
+
+def runModule(currentModule: FileHandleModule, fileDescriptor: FileDescriptor, dbEngine: sqlalchemy.engine.Engine,
+                appConfig: ConfigHandler, watchdog: HandleWatchdog, timeout: float = None) -> None:
+    '''
+        Runs a module on a file, within its time budget (the engine being
+        guarded, see :func:`lib.handleWatchdog.guardEngine`).
+
+        :param currentModule: The module to run.
+        :type currentModule: :class:`public.fileHandleModule.FileHandleModule`
+        :param fileDescriptor: The file to handle.
+        :type fileDescriptor: :class:`public.fileDescriptor.FileDescriptor`
+        :param dbEngine: The database engine.
+        :type dbEngine: sqlalchemy.engine.Engine
+        :param appConfig: The application configuration.
+        :type appConfig: :class:`public.configHandler.ConfigHandler`
+        :param watchdog: The watchdog enforcing the time budget.
+        :type watchdog: :class:`lib.handleWatchdog.HandleWatchdog`
+        :param timeout: The time budget (in seconds), ``None`` to disable it.
+        :type timeout: float
+    '''
+    if timeout:
+        with watchdog.watch(timeout):
+            if currentModule.canHandle(fileDescriptor):
+                currentModule.handle(fileDescriptor, dbEngine, appConfig)
+    elif currentModule.canHandle(fileDescriptor):
+        currentModule.handle(fileDescriptor, dbEngine, appConfig)
+
+
+def runHandle(moduleName: str, fileDescriptor: FileDescriptor, timeout: float = None) -> Tuple[float, float]:
+    '''
+        Runs the given module on a file. Raised exceptions are sent back to the
+        parent process.
+
+        The file is a copy of the parent one, its shared content (see
+        :meth:`public.fileDescriptor.FileDescriptor.getContent`) is released
+        once the module is done, so it does not count against the worker
+        content buffers anymore.
+
+        :param moduleName: The FQDN name of the module to run.
+        :type moduleName: str
+        :param fileDescriptor: The file to handle.
+        :type fileDescriptor: :class:`public.fileDescriptor.FileDescriptor`
+        :param timeout: The time budget of the module (in seconds), a
+                        :class:`public.exceptions.HandleTimeoutError` is raised
+                        once elapsed. ``None`` to disable it.
+        :type timeout: float
+
+        :returns: The time spent running the module and the time spent in the
+                    database (in seconds), used for the dispatcher metrics.
+        :rtype: Tuple[float, float]
+    '''
+    currentModule = _appConfig.getFileHandleModuleByName(moduleName)
+    startTime = time.perf_counter()
+    takeDbTime()
+
+    try:
+        runModule(currentModule, fileDescriptor, _dbEngine, _appConfig, _watchdog, timeout=timeout)
+    finally:
+        fileDescriptor.releaseContent()
+
+    return time.perf_counter() - startTime, takeDbTime()
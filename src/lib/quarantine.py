@@ -0,0 +1,151 @@
+from threading import Lock
+import json
+import os
+import logging
+
+from public import ConfiguratonError, HandleTimeoutError
+
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger('fileIndexer').getChild('lib.Quarantine')
+
+
+class Quarantine(object):
+    '''
+        A persistent list of the files a module failed on (raised an error or
+        timed out), skipped by the :class:`lib.messageDispatcher.MessageDispatcher`
+        on the next runs until they change.
+
+        Entries are keyed by module and file path, and hold the file size and
+        modification time at the time of the failure : a file modified since
+        (different size or modification time) is released from the quarantine.
+
+        Entries are appended to the quarantine file as JSON lines when added,
+        the file being compacted (released entries removed) when closed.
+
+        :param quarantinePath: The quarantine file path.
+        :type quarantinePath: str
+    '''
+
+    def __init__(self, quarantinePath: str):
+        self._quarantinePath = quarantinePath
+        self._lock = Lock()
+        # (module, path) -> (size, mtime, reason)
+        self._entries = {}
+        self._released = 0
+
+        if os.path.exists(quarantinePath):
+            self._load()
+            logger.info('%d files quarantined in [%s]' % (len(self._entries), quarantinePath))
+        elif os.path.dirname(quarantinePath):
+            os.makedirs(os.path.dirname(quarantinePath), exist_ok=True)
+
+        self._quarantineIO = open(quarantinePath, 'a', encoding='utf-8')
+
+    def _load(self) -> None:
+        with open(self._quarantinePath, 'r', encoding='utf-8') as quarantineIO:
+            for line in quarantineIO:
+                try:
+                    module, path, size, mtime, reason = json.loads(line)
+                except ValueError:
+                    logger.warning('Ignoring invalid quarantine line [%s]' % line.rstrip('\n'))
+                    continue
+                self._entries[(module, path)] = (size, mtime, reason)
+
+    @staticmethod
+    def isFileError(err: BaseException) -> bool:
+        '''
+            Whether an error raised by a module comes from the file itself (a
+            timeout, or a parsing or decoding error) and the file is to be
+            quarantined.
+
+            System errors (:class:`OSError` with an ``errno``, as I/O, network
+            or open files limit errors), configuration and database errors are
+            not related to the file : it is processed again on the next run.
+
+            :param err: The error raised by the module.
+            :type err: BaseException
+
+            :returns: Whether to quarantine the file.
+            :rtype: bool
+        '''
+        if isinstance(err, HandleTimeoutError):
+            return True
+        if isinstance(err, OSError) and err.errno is not None:
+            # OSError without errno are raised by parsers on invalid content (e.g. PIL)
+            return False
+        return not isinstance(err, (ConfiguratonError, SQLAlchemyError, MemoryError, ImportError))
+
+    def __len__(self) -> int:
+        '''
+            :returns: The number of quarantined entries.
+            :rtype: int
+        '''
+        return len(self._entries)
+
+    def isQuarantined(self, module: str, path: str, size: int, mtime: float) -> bool:
+        '''
+            Whether the file is quarantined for the given module. An entry of a
+            file modified since is released.
+
+            :param module: The module FQDN name.
+            :type module: str
+            :param path: The file path.
+            :type path: str
+            :param size: The current file size.
+            :type size: int
+            :param mtime: The current file modification time.
+            :type mtime: float
+
+            :returns: Whether the file should be skipped.
+            :rtype: bool
+        '''
+        entry = self._entries.get((module, path))
+        if entry is None:
+            return False
+
+        if entry[0:2] == (size, mtime):
+            return True
+
+        with self._lock:
+            if self._entries.pop((module, path), None):
+                self._released += 1
+        logger.info('[%s] File [%s] changed, released from quarantine' % (module, path))
+        return False
+
+    def add(self, module: str, path: str, size: int, mtime: float, reason: str) -> None:
+        '''
+            Quarantines a file for the given module (written immediately).
+
+            :param module: The module FQDN name.
+            :type module: str
+            :param path: The file path.
+            :type path: str
+            :param size: The file size.
+            :type size: int
+            :param mtime: The file modification time.
+            :type mtime: float
+            :param reason: Why the file is quarantined (logged and stored).
+            :type reason: str
+        '''
+        logger.warning('[%s] File [%s] quarantined (%s)' % (module, path, reason))
+        with self._lock:
+            self._entries[(module, path)] = (size, mtime, reason)
+            if not self._quarantineIO.closed:
+                self._quarantineIO.write(json.dumps([module, path, size, mtime, reason]) + '\n')
+                self._quarantineIO.flush()
+
+    def close(self) -> None:
+        '''
+            Closes the quarantine file, compacting it if entries have been
+            released.
+        '''
+        with self._lock:
+            self._quarantineIO.close()
+            if self._released > 0:
+                tmpPath = '%s.tmp' % self._quarantinePath
+                with open(tmpPath, 'w', encoding='utf-8') as quarantineIO:
+                    for (module, path), (size, mtime, reason) in self._entries.items():
+                        quarantineIO.write(json.dumps([module, path, size, mtime, reason]) + '\n')
+                os.replace(tmpPath, self._quarantinePath)
+                self._released = 0
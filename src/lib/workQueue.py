@@ -0,0 +1,157 @@
+from threading import BoundedSemaphore, Condition
+from typing import Callable, Any
+from multiprocessing.pool import Pool
+import logging
+
+logger = logging.getLogger('fileIndexer').getChild('lib.WorkQueue')
+
+
+class WorkQueue(object):
+    '''
+        Keeps track of the jobs sent to a pool and bounds the work in flight.
+
+        Producers have to acquire a slot (:meth:`WorkQueue.acquireSlot`) before
+        submitting new work, blocking when too many slots are taken, and slots
+        are released when the work is done (:meth:`WorkQueue.releaseSlot`). A slot
+        can cover a single job or a chain of jobs (a file going through all the
+        dependency steps).
+
+        Jobs are counted and forgotten as soon as they complete (no result is
+        kept), so the memory used does not depend on the number of processed
+        files.
+
+        A work queue can have a parent (the global queue of a data source
+        queue for example). Slots and jobs are then also taken and counted in
+        the parent, the parent limit being shared by all its children.
+
+        :param maxPendingJobs: The maximum number of slots which can be taken at
+                                the same time, ``None`` or ``0`` to disable the
+                                limit.
+        :type maxPendingJobs: int
+        :param parent: A parent queue.
+        :type parent: :class:`lib.workQueue.WorkQueue`
+    '''
+
+    def __init__(self, maxPendingJobs: int = None, parent: 'WorkQueue' = None):
+        self._slots = BoundedSemaphore(maxPendingJobs) if maxPendingJobs else None
+        self._parent = parent
+        self._pendingJobs = 0
+        self._condition = Condition()
+
+    def __len__(self) -> int:
+        '''
+            :returns: The number of submitted jobs which are not completed yet.
+            :rtype: int
+        '''
+        return self._pendingJobs
+
+    def acquireSlot(self, timeout: float = None) -> bool:
+        '''
+            Take a slot, blocking while all the slots are taken.
+
+            :param timeout: The maximum time to wait for a slot (in seconds),
+                            ``None`` to wait forever.
+            :type timeout: float
+
+            :returns: Whether a slot have been acquired.
+            :rtype: bool
+        '''
+        if self._slots and not self._slots.acquire(blocking=True, timeout=timeout):
+            return False
+
+        if self._parent is not None and not self._parent.acquireSlot(timeout=timeout):
+            if self._slots:
+                self._slots.release()
+            return False
+
+        return True
+
+    def releaseSlot(self) -> None:
+        '''
+            Releases a slot taken with :meth:`WorkQueue.acquireSlot`.
+        '''
+        if self._parent is not None:
+            self._parent.releaseSlot()
+        if self._slots:
+            self._slots.release()
+
+    def _jobStarted(self) -> None:
+        with self._condition:
+            self._pendingJobs += 1
+        if self._parent is not None:
+            self._parent._jobStarted()
+
+    def _jobDone(self) -> None:
+        with self._condition:
+            self._pendingJobs -= 1
+            if self._pendingJobs == 0:
+                self._condition.notify_all()
+        if self._parent is not None:
+            self._parent._jobDone()
+
+    def submit(self, pool: Pool, func: Callable, args: tuple = (), onDone: Callable[[], None] = None,
+                callback: Callable[[Any], None] = None, errorCallback: Callable[[BaseException], None] = None) -> None:
+        '''
+            Submit a job to the given pool. This method does not block, slots
+            have to be handled by the caller.
+
+            :param pool: The pool running the job.
+            :type pool: :class:`multiprocessing.pool.Pool`
+            :param func: The function to run.
+            :type func: Callable
+            :param args: The function arguments.
+            :type args: tuple
+            :param onDone: A function called once the job is completed (with or
+                            without error), used to release the job slot.
+            :type onDone: Callable[[], None]
+            :param callback: A function called with the job result if the job
+                                succeeded.
+            :type callback: Callable[[Any], None]
+            :param errorCallback: A function called with the raised exception
+                                    if the job failed.
+            :type errorCallback: Callable[[BaseException], None]
+        '''
+
+        def _jobDone():
+            try:
+                if onDone:
+                    onDone()
+            finally:
+                self._jobDone()
+
+        def _callback(result: Any):
+            try:
+                if callback:
+                    callback(result)
+            finally:
+                _jobDone()
+
+        def _errorCallback(err: BaseException):
+            try:
+                if errorCallback:
+                    errorCallback(err)
+            finally:
+                _jobDone()
+
+        self._jobStarted()
+
+        try:
+            pool.apply_async(func, args=args, callback=_callback, error_callback=_errorCallback)
+        except Exception:
+            # The pool did not take the job (closed pool for example)
+            _jobDone()
+            raise
+
+    def wait(self, timeout: float = None) -> bool:
+        '''
+            Wait for all the submitted jobs to complete.
+
+            :param timeout: The maximum time to wait (in seconds), ``None`` to
+                            wait forever.
+            :type timeout: float
+
+            :returns: Whether all the jobs are completed.
+            :rtype: bool
+        '''
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pendingJobs == 0, timeout=timeout)
@@ -2,6 +2,7 @@ from typing import Iterable, Dict
 import logging
 
 from public import FileHandleModule, ConfigHandler, FileDescriptor
+from public.mappedFile import ACCESS_RANDOM
 
 import sqlalchemy
 
@@ -43,7 +44,8 @@ class AudioFileModule(FileHandleModule):
 
     def handle(self, fileDescriptor: FileDescriptor, dbEngine: sqlalchemy.engine.Engine, appConfig: ConfigHandler) -> None:
         
-        with fileDescriptor.open() as _file:
+        # Tags may be at the start and at the end of the file
+        with fileDescriptor.openContent(access=ACCESS_RANDOM) as _file:
             mutagenFile = mutagen.File(_file)
             try:
                 pass
@@ -1,9 +1,8 @@
 
 from typing import Iterable, Dict
-from fnmatch import fnmatch
 import logging
 
-from public import FileHandleModule, ConfigHandler, FileDescriptor
+from public import FileHandleModule, ConfigHandler, FileDescriptor, MimeRouter
 
 import sqlalchemy
 from .processors import PdfProcessor, EpubProcessor
@@ -16,6 +15,7 @@ _processors = {
     'application/pdf': PdfProcessor(),
     'application/epub*': EpubProcessor(),
 }
+_processorsRouter = MimeRouter(_processors.items())
 
 class DocumentFileModule(FileHandleModule):
     
@@ -85,12 +85,15 @@ class DocumentFileModule(FileHandleModule):
         return DbQuerier(dbEngine, appConfig, self)
 
     # Processing
+    def runInProcessPool(self) -> bool:
+        # Text extraction is CPU-bound
+        return True
+
     def canHandle(self, fileDescriptor: FileDescriptor) -> bool:
         return True
 
 
     def handle(self, fileDescriptor: FileDescriptor, dbEngine: sqlalchemy.engine.Engine, appConfig: ConfigHandler) -> None:
-        for pattern, processor in _processors.items():
-            if fnmatch(name=fileDescriptor.mime, pat=pattern):
-                processor.process(self, fileDescriptor, appConfig, dbEngine)
-                return
\ No newline at end of file
+        for processor in _processorsRouter.route(fileDescriptor.mime):
+            processor.process(self, fileDescriptor, appConfig, dbEngine)
+            return
\ No newline at end of file
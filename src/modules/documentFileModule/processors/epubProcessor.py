@@ -1,6 +1,7 @@
 import logging
 
 from public import FileDescriptor, ConfigHandler
+from public.mappedFile import ACCESS_RANDOM
 from modules.documentFileModule import DocumentFileProcessor, dbQuerier
 
 import sqlalchemy
@@ -11,7 +12,8 @@ logger = logging.getLogger('fileIndexer').getChild('modules.documentFileModule.p
 class EpubProcessor(DocumentFileProcessor):
     
     def process(self, documentFileModule: 'DocumentFileModule', fileDescriptor: FileDescriptor, appConfig: ConfigHandler, dbEngine: sqlalchemy.engine.Engine):
-        with fileDescriptor.open() as _file:
+        # The zip central directory is at the end of the file
+        with fileDescriptor.openContent(access=ACCESS_RANDOM) as _file:
             #pdfDocument = PdfFileReader(stream=_file)
             # TODO: insert values
             pass
\ No newline at end of file
@@ -4,6 +4,7 @@ import re
 from typing import List, Tuple, Callable, Any
 
 from public import FileDescriptor, ConfigHandler
+from public.mappedFile import ACCESS_RANDOM
 from modules.documentFileModule import DocumentFileProcessor, DbQuerier
 
 from PyPDF2 import PdfFileReader
@@ -113,7 +114,8 @@ class PdfProcessor(DocumentFileProcessor):
 
         querier = documentFileModule.getDBQuerier(dbEngine, appConfig)
 
-        with fileDescriptor.open() as _file:
+        # The cross-reference table is at the end of the file
+        with fileDescriptor.openContent(access=ACCESS_RANDOM) as _file:
             pdfDocument = PdfFileReader(stream=_file)
             try: 
                 # Trying to decrypt with an empty password
@@ -0,0 +1,2 @@
+from .dbQuerier import DbQuerier
+from .module import DuplicateFileModule
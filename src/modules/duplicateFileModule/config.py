@@ -0,0 +1,7 @@
+from public import ConfigDef
+
+configuration = {
+    'algorithm': ConfigDef(shortName="algorithm", required=False, yamlPath="/duplicate/algorithm", defaultValue='sha256'),
+    'blockSize': ConfigDef(shortName="blockSize", required=False, yamlPath="/duplicate/blockSize", defaultValue=64 * 1024),
+    'minSize': ConfigDef(shortName="minSize", required=False, yamlPath="/duplicate/minSize", defaultValue=1),
+}
@@ -0,0 +1,188 @@
+from public import FileDescriptor, ConfigHandler
+from typing import Iterator, List, Tuple
+import logging
+
+import sqlalchemy
+from sqlalchemy.sql import select, func, and_
+
+logger = logging.getLogger('fileIndexer').getChild('modules.duplicateFileModule.DbQuerier')
+
+
+class DbQuerier(object):
+    '''
+        A helper to query and insert entities for the DuplicateFileModule.
+
+        :param dbEngine: A SQLAlchemy DBEngine.
+        :type dbEngine: sqlalchemy.engine.Engine
+        :param appConfig: The application configuration.
+        :type appConfig: :class:`public.configHandler.ConfigHandler`
+        :param moduleRef: A reference to the calling module (self).
+        :type moduleRef: class:`modules.duplicateFileModule.module.DuplicateFileModule`
+    '''
+
+    def __init__(self, dbEngine: sqlalchemy.engine.Engine, appConfig: ConfigHandler, moduleRef: 'DuplicateFileModule'):
+        self.dbEngine = dbEngine
+        self.moduleRef = moduleRef
+        self.table = moduleRef.getSharedTables()
+        self.appConfig = appConfig
+        coreModule = appConfig.getFileHandleModuleByName('CoreModule')
+        self.coreModuleTables = coreModule.getSharedTables()
+        self.coreModuleQuerier = coreModule.getDBQuerier(dbEngine, appConfig)
+        try:
+            hashModule = appConfig.getFileHandleModuleByName('HashFileModule')
+        except ValueError:
+            # Full hashes not kept without the hash module
+            hashModule = None
+        self.hashModuleTables = hashModule.getSharedTables() if hashModule else None
+        self.hashModuleQuerier = hashModule.getDBQuerier(dbEngine, appConfig) if hashModule else None
+
+
+    def setFileSize(self, fileId: int, fileDescriptor: FileDescriptor) -> None:
+        '''
+            Saves the exact size of a file, its partial hash being reset when
+            the file changed.
+
+            :param fileId: The core file entity id.
+            :type fileId: int
+            :param fileDescriptor: The file.
+            :type fileDescriptor: :class:`public.fileDescriptor.FileDescriptor`
+        '''
+        table = self.table
+
+        s = select([
+                table['file_size']
+            ]).\
+            where(table['file_size'].c.id_file == fileId)
+
+        values = {
+            'data_source': fileDescriptor.dataSource,
+            'size': fileDescriptor.stat.st_size,
+            'last_update': fileDescriptor.modificationDateTime,
+        }
+
+        with self.dbEngine.connect() as dbConnection:
+            entity = dbConnection.execute(s).first()
+            if not entity:
+                dbConnection.execute(table['file_size'].insert().values(id_file=fileId, **values))
+            elif any(map(lambda item: entity[item[0]] != item[1], values.items())):
+                dbConnection.execute(
+                    table['file_size'].update().\
+                        where(table['file_size'].c.id == entity['id']).\
+                        values(partial_hash=None, **values)
+                )
+
+
+    def getCandidateFiles(self, minSize: int, sizesPerPage: int = 1000) -> Iterator[dict]:
+        '''
+            Get the files sharing their size with other files, ordered by size.
+
+            Files are queried by pages of sizes (the files of ``sizesPerPage``
+            sizes at once), no cursor being kept open while they are compared
+            (and their hashes written).
+
+            :param minSize: The minimum size of the files.
+            :type minSize: int
+            :param sizesPerPage: The number of sizes of a page.
+            :type sizesPerPage: int
+
+            :return: The files ``id_file``, ``data_source``, ``size``,
+                        ``last_update``, ``partial_hash``, ``path``,
+                        ``filename``, with the core ``hash`` and its
+                        ``hash_last_update`` and ``hash_size`` (``None``
+                        without the hash module).
+            :rtype: Iterator[dict]
+        '''
+        table = self.table
+        coreTable = self.coreModuleTables
+
+        fromClause = table['file_size'].\
+            join(coreTable['file'], table['file_size'].c.id_file == coreTable['file'].c.id).\
+            join(coreTable['file_path'])
+        if self.hashModuleTables:
+            hashTable = self.hashModuleTables
+            fromClause = fromClause.outerjoin(hashTable['file_hash'], hashTable['file_hash'].c.id_file == coreTable['file'].c.id)
+            hashColumns = [
+                hashTable['file_hash'].c.last_update.label('hash_last_update'),
+                hashTable['file_hash'].c.size.label('hash_size'),
+            ]
+        else:
+            hashColumns = [
+                sqlalchemy.null().label('hash_last_update'),
+                sqlalchemy.null().label('hash_size'),
+            ]
+
+        def sharedSizes(fromSize: int):
+            return select([
+                    table['file_size'].c.size
+                ]).\
+                where(table['file_size'].c.size >= fromSize).\
+                group_by(table['file_size'].c.size).\
+                having(func.count(table['file_size'].c.id) > 1).\
+                order_by(table['file_size'].c.size).\
+                limit(sizesPerPage)
+
+        s = select([
+                table['file_size'].c.id_file,
+                table['file_size'].c.data_source,
+                table['file_size'].c.size,
+                table['file_size'].c.last_update,
+                table['file_size'].c.partial_hash,
+                coreTable['file_path'].c.path,
+                coreTable['file'].c.filename,
+                coreTable['file'].c.hash,
+            ] + hashColumns).\
+            select_from(fromClause).\
+            order_by(table['file_size'].c.size)
+
+        fromSize = minSize
+        while True:
+            with self.dbEngine.connect() as dbConnection:
+                sizes = list(map(lambda row: row[0], dbConnection.execute(sharedSizes(fromSize))))
+                if not sizes:
+                    return
+                candidates = list(map(dict, dbConnection.execute(s.where(table['file_size'].c.size.in_(sizes)))))
+
+            yield from candidates
+            fromSize = sizes[-1] + 1
+
+
+    def setPartialHash(self, fileId: int, partialHash: str) -> None:
+        '''
+            Saves the partial hash of a file.
+
+            :param fileId: The core file entity id.
+            :type fileId: int
+            :param partialHash: The hash of the first and last blocks of the file.
+            :type partialHash: str
+        '''
+        table = self.table
+
+        u = table['file_size'].update().\
+            where(table['file_size'].c.id_file == fileId).\
+            values(partial_hash=partialHash)
+
+        with self.dbEngine.connect() as dbConnection:
+            dbConnection.execute(u)
+
+
+    def replaceDuplicateGroups(self, duplicateGroups: List[Tuple[int, str, List[int]]]) -> None:
+        '''
+            Replaces the duplicate groups found by the previous run.
+
+            :param duplicateGroups: The groups size, hash and core file entity ids.
+            :type duplicateGroups: List[Tuple[int, str, List[int]]]
+        '''
+        table = self.table
+
+        with self.dbEngine.begin() as dbConnection:
+            dbConnection.execute(table['duplicate_file'].delete())
+            dbConnection.execute(table['duplicate_group'].delete())
+
+            for size, fileHash, fileIds in duplicateGroups:
+                groupId = dbConnection.execute(
+                    table['duplicate_group'].insert().values(size=size, hash=fileHash, files=len(fileIds))
+                ).inserted_primary_key[0]
+                dbConnection.execute(
+                    table['duplicate_file'].insert(),
+                    list(map(lambda fileId: {'id_duplicate_group': groupId, 'id_file': fileId}, fileIds))
+                )
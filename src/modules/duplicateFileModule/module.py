@@ -0,0 +1,205 @@
+from typing import Iterable, Dict
+from collections import defaultdict
+import itertools
+import hashlib
+import os
+import logging
+
+from public import FileHandleModule, ConfigHandler, FileDescriptor
+
+import sqlalchemy
+
+from .config import configuration
+from .dbQuerier import DbQuerier
+
+logger = logging.getLogger('fileIndexer').getChild('modules.DuplicateFileModule')
+
+
+class DuplicateFileModule(FileHandleModule):
+    '''
+        Finds the duplicate files of all the data sources, once they have been
+        processed.
+
+        Files are compared in cascade, each step only reading the files left by
+        the previous one :
+            - the exact size (saved for each file, files with a unique size are
+              never read)
+            - the hash of the first and last blocks of the files
+              (``/duplicate/blockSize``)
+            - the hash of the whole files (the hash of the core module is used
+              and kept when the hash module is loaded and the hash is up to
+              date, see :class:`modules.hashFileModule.HashFileModule`)
+
+        Duplicate files are saved in the ``duplicate_group`` and
+        ``duplicate_file`` tables, replaced on each run.
+    '''
+
+    def __init__(self):
+        self.tables = {}
+
+    @staticmethod
+    def handledFileMimes() -> str or Iterable[str]:
+        return '*'
+
+    def requiredModules(self) -> Iterable[str] or None:
+        return [
+            'CoreModule'
+        ]
+
+    # Database
+    def getDatabaseSchema(self) -> str:
+        return 'duplicate'
+
+    def defineTables(self, metadata: sqlalchemy.MetaData, configuration: ConfigHandler) -> None:
+
+        coreModuleTables = configuration.getFileHandleModuleByName('CoreModule').getSharedTables()
+
+        self.tables['file_size'] = sqlalchemy.Table('file_size', metadata,
+            sqlalchemy.Column('id', sqlalchemy.Integer, sqlalchemy.Sequence('file_size_id_seq'), primary_key=True),
+            sqlalchemy.Column('id_file', sqlalchemy.Integer, sqlalchemy.ForeignKey(coreModuleTables['file'].c.id, ondelete='CASCADE'), unique=True, nullable=False),
+            sqlalchemy.Column('data_source', sqlalchemy.String(4096), nullable=False),
+            sqlalchemy.Column('size', sqlalchemy.BigInteger, index=True, nullable=False),
+            sqlalchemy.Column('last_update', sqlalchemy.DateTime, nullable=False),
+            sqlalchemy.Column('partial_hash', sqlalchemy.String(256), nullable=True)      # First and last blocks
+        )
+
+        self.tables['duplicate_group'] = sqlalchemy.Table('duplicate_group', metadata,
+            sqlalchemy.Column('id', sqlalchemy.Integer, sqlalchemy.Sequence('duplicate_group_id_seq'), primary_key=True),
+            sqlalchemy.Column('size', sqlalchemy.BigInteger, index=True, nullable=False),
+            sqlalchemy.Column('hash', sqlalchemy.String(256), index=True, nullable=False),
+            sqlalchemy.Column('files', sqlalchemy.Integer, nullable=False)
+        )
+
+        self.tables['duplicate_file'] = sqlalchemy.Table('duplicate_file', metadata,
+            sqlalchemy.Column('id', sqlalchemy.Integer, sqlalchemy.Sequence('duplicate_file_id_seq'), primary_key=True),
+            sqlalchemy.Column('id_duplicate_group', sqlalchemy.Integer, sqlalchemy.ForeignKey(self.tables['duplicate_group'].c.id, ondelete='CASCADE'), nullable=False),
+            sqlalchemy.Column('id_file', sqlalchemy.Integer, sqlalchemy.ForeignKey(coreModuleTables['file'].c.id, ondelete='CASCADE'), index=True, nullable=False)
+        )
+
+    def getSharedTables(self) -> Dict[str, sqlalchemy.Table]:
+        return self.tables.copy()
+
+    def getDBQuerier(self, dbEngine: sqlalchemy.engine.Engine, appConfig: ConfigHandler) -> object:
+        return DbQuerier(dbEngine, appConfig, self)
+
+    # Processing
+    def runInDatabasePool(self) -> bool:
+        # Only saves the file size
+        return True
+
+    def canHandle(self, fileDescriptor: FileDescriptor) -> bool:
+        return True
+
+    def handle(self, fileDescriptor: FileDescriptor, dbEngine: sqlalchemy.engine.Engine, appConfig: ConfigHandler) -> None:
+        dbQuerier = self.getDBQuerier(dbEngine, appConfig)
+        fileEntity = dbQuerier.coreModuleQuerier.getFileHash(fileDescriptor)
+        if not fileEntity:
+            logger.warning('File [%s] not in database, not compared' % fileDescriptor.fullPath)
+            return
+        dbQuerier.setFileSize(fileEntity['id'], fileDescriptor)
+
+    @staticmethod
+    def hashFile(fileDescriptor: FileDescriptor, algorithm: str, blockSize: int = None, chunkSize: int = 1024 * 1024) -> str:
+        '''
+            Hashes a file, or only its first and last blocks.
+
+            :param fileDescriptor: The file to hash.
+            :type fileDescriptor: :class:`public.fileDescriptor.FileDescriptor`
+            :param algorithm: The hashlib algorithm name.
+            :type algorithm: str
+            :param blockSize: The size of the first and last blocks, ``None``
+                                to hash the whole file.
+            :type blockSize: int
+            :param chunkSize: The size of the chunks read.
+            :type chunkSize: int
+
+            :returns: The hash, as ``<algorithm>:<hex digest>``.
+            :rtype: str
+        '''
+        hasher = hashlib.new(algorithm)
+
+        with fileDescriptor.open(mode='rb') as fileIO:
+            if blockSize and fileDescriptor.stat.st_size > 2 * blockSize:
+                hasher.update(fileIO.read(blockSize))
+                fileIO.seek(-blockSize, os.SEEK_END)
+                hasher.update(fileIO.read(blockSize))
+            else:
+                for chunk in iter(lambda: fileIO.read(chunkSize), b''):
+                    hasher.update(chunk)
+
+        return '%s:%s' % (algorithm, hasher.hexdigest())
+
+    def afterDispatch(self, dbEngine: sqlalchemy.engine.Engine, appConfig: ConfigHandler) -> None:
+        algorithm = appConfig.get(configuration['algorithm'])
+        blockSize = appConfig.get(configuration['blockSize'])
+        dbQuerier = self.getDBQuerier(dbEngine, appConfig)
+        fileSystemModules = {}
+        readFiles = 0
+
+        def getFileDescriptor(candidate: dict) -> FileDescriptor or None:
+            dataSource = candidate['data_source']
+            if dataSource not in fileSystemModules:
+                try:
+                    fileSystemModules[dataSource] = appConfig.getFileSystemModuleForDataSource(dataSource)
+                except Exception as ex:
+                    logger.warning('Unable to connect to [%s], files not compared (%s)' % (dataSource, ex))
+                    fileSystemModules[dataSource] = None
+
+            fileSystemModule = fileSystemModules[dataSource]
+            if fileSystemModule is None:
+                return None
+            try:
+                fileDescriptor = fileSystemModule.getFileDescriptor(os.path.join(candidate['path'], candidate['filename']))
+                # Changed since listed, saved again by the next run
+                if fileDescriptor.stat.st_size != candidate['size'] or fileDescriptor.modificationDateTime != candidate['last_update']:
+                    logger.debug('File [%s] changed, not compared' % fileDescriptor.fullPath)
+                    return None
+                return fileDescriptor
+            except NotImplementedError:
+                logger.warning('Files of [%s] can not be compared' % dataSource)
+                fileSystemModules[dataSource] = None
+            except OSError as ex:
+                logger.debug('File [%s] not available, not compared (%s)' % (candidate['filename'], ex))
+            return None
+
+        duplicateGroups = []
+        for size, sameSizeCandidates in itertools.groupby(dbQuerier.getCandidateFiles(appConfig.get(configuration['minSize'])), key=lambda c: c['size']):
+            # Partial hash
+            samePartialHash = defaultdict(list)
+            for candidate in sameSizeCandidates:
+                fileDescriptor = getFileDescriptor(candidate)
+                if fileDescriptor is None:
+                    continue
+                partialHash = candidate['partial_hash']
+                if not partialHash or not partialHash.startswith('%s:' % algorithm):
+                    partialHash = DuplicateFileModule.hashFile(fileDescriptor, algorithm, blockSize=blockSize)
+                    dbQuerier.setPartialHash(candidate['id_file'], partialHash)
+                    readFiles += 1
+                samePartialHash[partialHash].append((candidate, fileDescriptor))
+
+            # Full hash
+            for partialHash, samePartialHashCandidates in samePartialHash.items():
+                if len(samePartialHashCandidates) < 2:
+                    continue
+                if size <= 2 * blockSize:
+                    # Whole files already hashed
+                    duplicateGroups.append((size, partialHash, list(map(lambda c: c[0]['id_file'], samePartialHashCandidates))))
+                    continue
+
+                sameHash = defaultdict(list)
+                for candidate, fileDescriptor in samePartialHashCandidates:
+                    fileHash = candidate['hash']
+                    if not fileHash or not fileHash.startswith('%s:' % algorithm) or \
+                            candidate['hash_last_update'] != candidate['last_update'] or candidate['hash_size'] != size:
+                        fileHash = DuplicateFileModule.hashFile(fileDescriptor, algorithm)
+                        if dbQuerier.hashModuleQuerier:
+                            dbQuerier.hashModuleQuerier.setFileHash(candidate['id_file'], fileDescriptor, fileHash)
+                    sameHash[fileHash].append(candidate['id_file'])
+
+                for fileHash, fileIds in sameHash.items():
+                    if len(fileIds) > 1:
+                        duplicateGroups.append((size, fileHash, fileIds))
+
+        dbQuerier.replaceDuplicateGroups(duplicateGroups)
+        logger.info('%d duplicate groups found (%d files, %d files read)' % (
+            len(duplicateGroups), sum(map(lambda group: len(group[2]), duplicateGroups)), readFiles))
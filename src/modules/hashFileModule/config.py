@@ -0,0 +1,6 @@
+from public import ConfigDef
+
+configuration = {
+    'algorithm': ConfigDef(shortName="algorithm", required=False, yamlPath="/hash/algorithm", defaultValue='sha256'),
+    'chunkSize': ConfigDef(shortName="chunkSize", required=False, yamlPath="/hash/chunkSize", defaultValue=1024 * 1024),
+}
@@ -0,0 +1,96 @@
+from public import FileDescriptor, ConfigHandler
+import logging
+
+import sqlalchemy
+from sqlalchemy.sql import select, and_
+
+logger = logging.getLogger('fileIndexer').getChild('modules.hashFileModule.DbQuerier')
+
+
+class DbQuerier(object):
+    '''
+        A helper to query and insert entities for the HashFileModule.
+
+        :param dbEngine: A SQLAlchemy DBEngine.
+        :type dbEngine: sqlalchemy.engine.Engine
+        :param appConfig: The application configuration.
+        :type appConfig: :class:`public.configHandler.ConfigHandler`
+        :param moduleRef: A reference to the calling module (self).
+        :type moduleRef: class:`modules.hashFileModule.module.HashFileModule`
+    '''
+
+    def __init__(self, dbEngine: sqlalchemy.engine.Engine, appConfig: ConfigHandler, moduleRef: 'HashFileModule'):
+        self.dbEngine = dbEngine
+        self.moduleRef = moduleRef
+        self.table = moduleRef.getSharedTables()
+        self.appConfig = appConfig
+        coreModule = appConfig.getFileHandleModuleByName('CoreModule')
+        self.coreModuleTables = coreModule.getSharedTables()
+        self.coreModuleQuerier = coreModule.getDBQuerier(dbEngine, appConfig)
+
+
+    def getFileHashState(self, fileDescriptor: FileDescriptor):
+        '''
+            Get the hash of a file, with the size and modification time it has
+            been computed for.
+
+            :param fileDescriptor: A file descriptor to search in the database.
+            :type fileDescriptor: :class:`public.fileDescriptor.FileDescriptor`
+
+            :return: The core file ``id`` and ``hash``, with the ``hash_last_update``
+                        and ``hash_size`` of the hashed content (``None`` if
+                        never hashed), or ``None`` if not in the database.
+            :rtype: dict
+        '''
+        table = self.table
+        coreTable = self.coreModuleTables
+
+        s = select([
+                coreTable['file'].c.id,
+                coreTable['file'].c.hash,
+                table['file_hash'].c.last_update.label('hash_last_update'),
+                table['file_hash'].c.size.label('hash_size'),
+            ]).\
+            select_from(
+                coreTable['file'].\
+                    join(coreTable['file_path']).\
+                    outerjoin(table['file_hash'], table['file_hash'].c.id_file == coreTable['file'].c.id)
+            ).\
+            where(and_(
+                coreTable['file'].c.filename == fileDescriptor.name,
+                coreTable['file_path'].c.path == fileDescriptor.path,
+                coreTable['file_path'].c.scheme_host == fileDescriptor.schemeAndHost,
+            ))
+
+        with self.dbEngine.connect() as dbConnection:
+            return dbConnection.execute(s).first()
+
+
+    def setFileHash(self, fileId: int, fileDescriptor: FileDescriptor, fileHash: str) -> None:
+        '''
+            Updates the hash of a file (``core.file.hash``), with the size and
+            modification time it has been computed for.
+
+            :param fileId: The core file entity id.
+            :type fileId: int
+            :param fileDescriptor: The hashed file.
+            :type fileDescriptor: :class:`public.fileDescriptor.FileDescriptor`
+            :param fileHash: The file hash.
+            :type fileHash: str
+        '''
+        table = self.table
+
+        values = {
+            'last_update': fileDescriptor.modificationDateTime,
+            'size': fileDescriptor.stat.st_size,
+        }
+
+        with self.dbEngine.begin() as dbConnection:
+            self.coreModuleQuerier.setFileHash(fileId, fileHash, dbConnection=dbConnection)
+            updated = dbConnection.execute(
+                table['file_hash'].update().\
+                    where(table['file_hash'].c.id_file == fileId).\
+                    values(**values)
+            ).rowcount
+            if not updated:
+                dbConnection.execute(table['file_hash'].insert().values(id_file=fileId, **values))
@@ -0,0 +1,157 @@
+from typing import Iterable, Dict
+from threading import Lock
+import hashlib
+import logging
+
+from public import FileHandleModule, ConfigHandler, FileDescriptor, ConfiguratonError
+from public.mappedFile import MappedFile, ACCESS_SEQUENTIAL
+
+import sqlalchemy
+
+from .config import configuration
+from .dbQuerier import DbQuerier
+from .rateLimiter import RateLimiter
+
+logger = logging.getLogger('fileIndexer').getChild('modules.HashFileModule')
+
+_supportedAlgorithms = ('sha256', 'blake2b')
+
+
+class HashFileModule(FileHandleModule):
+    '''
+        Fills the hash of the files (``core.file.hash``, stored as
+        ``<algorithm>:<hex digest>``).
+
+        Files are read in large chunks (``/hash/chunkSize``), hashlib releasing
+        the GIL while hashing them. A file is hashed again only when its size
+        or modification time changed since it was hashed (kept in the
+        ``file_hash`` table), or when the algorithm (``/hash/algorithm``)
+        changed.
+
+        Data sources can limit the bytes read per second with ``hashRateLimit``.
+    '''
+
+    def __init__(self):
+        self.tables = {}
+        self._rateLimiters = {}
+        self._rateLimitersLock = Lock()
+
+    @staticmethod
+    def handledFileMimes() -> str or Iterable[str]:
+        return '*'
+
+    def requiredModules(self) -> Iterable[str] or None:
+        return [
+            'CoreModule'
+        ]
+
+    # Database
+    def getDatabaseSchema(self) -> str:
+        return 'hash'
+
+    def defineTables(self, metadata: sqlalchemy.MetaData, configuration: ConfigHandler) -> None:
+
+        coreModuleTables = configuration.getFileHandleModuleByName('CoreModule').getSharedTables()
+
+        # The hash itself is core.file.hash
+        self.tables['file_hash'] = sqlalchemy.Table('file_hash', metadata,
+            sqlalchemy.Column('id', sqlalchemy.Integer, sqlalchemy.Sequence('file_hash_id_seq'), primary_key=True),
+            sqlalchemy.Column('id_file', sqlalchemy.Integer, sqlalchemy.ForeignKey(coreModuleTables['file'].c.id, ondelete='CASCADE'), unique=True, nullable=False),
+            sqlalchemy.Column('last_update', sqlalchemy.DateTime, nullable=False),     # Modification time of the hashed content
+            sqlalchemy.Column('size', sqlalchemy.BigInteger, nullable=False)           # Size of the hashed content
+        )
+
+    def getSharedTables(self) -> Dict[str, sqlalchemy.Table]:
+        return self.tables.copy()
+
+    def getDBQuerier(self, dbEngine: sqlalchemy.engine.Engine, appConfig: ConfigHandler) -> DbQuerier:
+        return DbQuerier(dbEngine, appConfig, self)
+
+    # Processing
+    def canHandle(self, fileDescriptor: FileDescriptor) -> bool:
+        return True
+
+    def _getRateLimiter(self, fileDescriptor: FileDescriptor, appConfig: ConfigHandler) -> RateLimiter or None:
+        with self._rateLimitersLock:
+            if fileDescriptor.dataSource not in self._rateLimiters:
+                rateLimit = next(map(
+                    lambda dataSource: dataSource['hashRateLimit'],
+                    filter(lambda dataSource: dataSource['path'] == fileDescriptor.dataSource, appConfig.getDataSources())
+                ), None)
+                self._rateLimiters[fileDescriptor.dataSource] = RateLimiter(rateLimit) if rateLimit else None
+            return self._rateLimiters[fileDescriptor.dataSource]
+
+    def hashFile(self, fileDescriptor: FileDescriptor, algorithm: str, chunkSize: int, rateLimiter: RateLimiter = None) -> str:
+        '''
+            Hashes a file.
+
+            The shared content of the file is used when available (see
+            :meth:`public.fileDescriptor.FileDescriptor.openContent`), else the
+            file is streamed, starting after the bytes already read to detect
+            its type.
+
+            :param fileDescriptor: The file to hash.
+            :type fileDescriptor: :class:`public.fileDescriptor.FileDescriptor`
+            :param algorithm: The hashlib algorithm name.
+            :type algorithm: str
+            :param chunkSize: The size of the chunks read.
+            :type chunkSize: int
+            :param rateLimiter: Limits the bytes read per second, ``None`` for
+                                no limit.
+            :type rateLimiter: :class:`modules.hashFileModule.rateLimiter.RateLimiter`
+
+            :returns: The file hash, as ``<algorithm>:<hex digest>``.
+            :rtype: str
+        '''
+        hasher = hashlib.new(algorithm)
+
+        with fileDescriptor.openContent(access=ACCESS_SEQUENTIAL) as fileIO:
+            if isinstance(fileIO, MappedFile):
+                content = fileIO.getbuffer()
+                for offset in range(0, len(content), chunkSize):
+                    with content[offset:offset+chunkSize] as chunk:
+                        if rateLimiter:
+                            rateLimiter.consume(len(chunk))
+                        hasher.update(chunk)
+            else:
+                header = fileDescriptor.getHeader()
+                if header and len(header) <= fileDescriptor.stat.st_size and fileIO.seekable():
+                    hasher.update(header)
+                    fileIO.seek(len(header))
+
+                buffer = bytearray(chunkSize)
+                with memoryview(buffer) as bufferView:
+                    while True:
+                        readSize = fileIO.readinto(buffer)
+                        if not readSize:
+                            break
+                        if rateLimiter:
+                            rateLimiter.consume(readSize)
+                        hasher.update(bufferView[:readSize])
+
+        return '%s:%s' % (algorithm, hasher.hexdigest())
+
+    def handle(self, fileDescriptor: FileDescriptor, dbEngine: sqlalchemy.engine.Engine, appConfig: ConfigHandler) -> None:
+        algorithm = appConfig.get(configuration['algorithm'])
+        if algorithm not in _supportedAlgorithms:
+            raise ConfiguratonError('Unsupported hash algorithm [%s] (supported : %s)' % (algorithm, ', '.join(_supportedAlgorithms)))
+
+        dbQuerier = self.getDBQuerier(dbEngine, appConfig)
+        fileEntity = dbQuerier.getFileHashState(fileDescriptor)
+        if not fileEntity:
+            logger.warning('File [%s] not in database, not hashed' % fileDescriptor.fullPath)
+            return
+
+        if fileEntity['hash'] and fileEntity['hash'].startswith('%s:' % algorithm) and \
+                fileEntity['hash_last_update'] == fileDescriptor.modificationDateTime and \
+                fileEntity['hash_size'] == fileDescriptor.stat.st_size:
+            logger.debug('File [%s] unchanged, not hashed' % fileDescriptor.fullPath)
+            return
+
+        fileHash = self.hashFile(
+            fileDescriptor,
+            algorithm,
+            appConfig.get(configuration['chunkSize']),
+            self._getRateLimiter(fileDescriptor, appConfig)
+        )
+        dbQuerier.setFileHash(fileEntity['id'], fileDescriptor, fileHash)
@@ -0,0 +1,40 @@
+from threading import Lock
+import time
+
+
+class RateLimiter(object):
+    '''
+        Limits the throughput of the threads sharing it (e.g. the bytes read
+        from a data source per second).
+
+        :param rate: The maximum throughput (units per second).
+        :type rate: float
+        :param burst: The units allowed at once (one second of throughput if
+                        not set).
+        :type burst: float
+    '''
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst or rate
+        self._lock = Lock()
+        self._available = self.burst
+        self._lastUpdate = time.monotonic()
+
+    def consume(self, units: float) -> None:
+        '''
+            Waits until the given units can be consumed.
+
+            :param units: The units to consume (may be larger than the burst).
+            :type units: float
+        '''
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(self.burst, self._available + (now - self._lastUpdate) * self.rate)
+            self._lastUpdate = now
+            # Borrowed from the next refills, other threads wait for them
+            self._available -= units
+            wait = -self._available / self.rate if self._available < 0 else 0
+
+        if wait > 0:
+            time.sleep(wait)
@@ -1,8 +1,11 @@
-from .exceptions import ConfiguratonError, DependencyException
+from .exceptions import ConfiguratonError, DependencyException, HandleTimeoutError
 from .configDef import ConfigDef
+from .mimeRouter import MimeRouter
+from .ignoreMatcher import IgnoreMatcher
 
 from .fileDescriptor import FileDescriptor
 from .configHandler import ConfigHandler
+from .directoryStates import DirectoryStates
 
 
 ## Module desc
@@ -39,6 +39,7 @@ class ConfigHandler(object):
 
         logger.info('Configuration loaded')
 
+        self._configPath = configPath
         self._appPath = appPath
         self._appDataSourcesCfg = None
         self._threadSafety = None
@@ -142,11 +143,22 @@ class ConfigHandler(object):
         parsedResult = urlparse(dataSource)
         for fileSystemModule in self.getFileSystemModules():
             if fileSystemModuleHandleScheme(fileSystemModule, parsedResult.scheme or 'file'):
-                fileSystemModule.connect(parsedResult, self)
-                return fileSystemModule
+                # A new instance for each data source, data sources being listed concurrently
+                dataSourceFileSystemModule = fileSystemModule.__class__()
+                dataSourceFileSystemModule.connect(parsedResult, self)
+                return dataSourceFileSystemModule
 
         raise RuntimeError('No moduke found for data source [%s]' % dataSource)
 
+    def getConfigPath(self) -> str:
+        '''
+            Return the loaded configuration path.
+
+            :returns: The configuration path.
+            :rtype: str
+        '''
+        return self._configPath
+
     def getAppPath(self) -> str:
         '''
             Return the application path.
@@ -163,7 +175,9 @@ class ConfigHandler(object):
 
             The dict keys are :
                 - path
-                - ignorePaths
+                - ignorePatterns
+                - followSymlinks
+                - maxPendingJobs (files of this data source in flight, ``None`` for no limit)
 
             :returns: Configured data sources.
             :rtype: List[dict]
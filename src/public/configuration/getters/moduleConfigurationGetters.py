@@ -12,12 +12,18 @@ def getAppDataSources(configuration: ConfigDef, config: dict) -> List[dict]:
                 'path': value,
                 'ignorePatterns': [],
                 'followSymlinks': False,
+                'maxPendingJobs': None,
+                'hashRateLimit': None,
+                'incremental': False,
             }
         elif isinstance(value, dict):
             base = {
                 'path': '',
                 'ignorePatterns': [],
                 'followSymlinks': False,
+                'maxPendingJobs': None,
+                'hashRateLimit': None,
+                'incremental': False,
             }
             if 'ignorePatterns' in value and isinstance(value['ignorePatterns'], str):
                 value['ignorePatterns'] = [ value['ignorePatterns'] ]
@@ -11,5 +11,38 @@ configuration = {
     'moduleWorkersCount': ConfigDef(shortName="moduleWorkersCount", yamlPath="/global/workersCount", required=False, defaultValue=os.cpu_count()),
     'appDataSources': ConfigDef(shortName="appDataSources", yamlPath="/global/dataSources", required=True, getter=moduleConfigurationGetters.getAppDataSources,
                                 onMissing="No configured data sources at path [`/global/dataSources`]. This value must be configured."),
-    'relativePath': ConfigDef(shortName="relativePath", yamlPath="/global/relativePath", required=False, defaultValue=None)
+    'relativePath': ConfigDef(shortName="relativePath", yamlPath="/global/relativePath", required=False, defaultValue=None),
+    'dispatchMode': ConfigDef(shortName="dispatchMode", yamlPath="/global/dispatchMode", required=False, defaultValue='pipeline'),
+    'dryRun': ConfigDef(shortName="dryRun", yamlPath="/global/dryRun", required=False, defaultValue=False),
+    'watchEnabled': ConfigDef(shortName="watchEnabled", yamlPath="/global/watch/enabled", required=False, defaultValue=False),
+    'watchDebounceDelay': ConfigDef(shortName="watchDebounceDelay", yamlPath="/global/watch/debounceDelay", required=False, defaultValue=2.0),
+    'watchMaxDelay': ConfigDef(shortName="watchMaxDelay", yamlPath="/global/watch/maxDelay", required=False, defaultValue=30.0),
+    'watchAfterDispatchDelay': ConfigDef(shortName="watchAfterDispatchDelay", yamlPath="/global/watch/afterDispatchDelay", required=False, defaultValue=300.0),
+    'processWorkersCount': ConfigDef(shortName="processWorkersCount", yamlPath="/global/processWorkersCount", required=False, defaultValue=os.cpu_count()),
+    'dataSourcesWorkersCount': ConfigDef(shortName="dataSourcesWorkersCount", yamlPath="/global/dataSourcesWorkersCount", required=False, defaultValue=None),
+    'journalDirectory': ConfigDef(shortName="journalDirectory", yamlPath="/global/journalDir", required=False, defaultValue=None),
+    'journalBatchSize': ConfigDef(shortName="journalBatchSize", yamlPath="/global/journalBatchSize", required=False, defaultValue=1000),
+    'metricsPrometheusFile': ConfigDef(shortName="metricsPrometheusFile", yamlPath="/global/metrics/prometheusFile", required=False, defaultValue=None),
+    'metricsSummaryFile': ConfigDef(shortName="metricsSummaryFile", yamlPath="/global/metrics/summaryFile", required=False, defaultValue=None),
+    'metricsInterval': ConfigDef(shortName="metricsInterval", yamlPath="/global/metrics/interval", required=False, defaultValue=15),
+    'shutdownTimeout': ConfigDef(shortName="shutdownTimeout", yamlPath="/global/shutdownTimeout", required=False, defaultValue=30),
+    'handleTimeout': ConfigDef(shortName="handleTimeout", yamlPath="/global/handleTimeout", required=False, defaultValue=None),
+    'quarantineFile': ConfigDef(shortName="quarantineFile", yamlPath="/global/quarantineFile", required=False, defaultValue=None),
+    'prefetchWorkersCount': ConfigDef(shortName="prefetchWorkersCount", yamlPath="/global/prefetchWorkersCount", required=False, defaultValue=2),
+    'databaseWorkersCount': ConfigDef(shortName="databaseWorkersCount", yamlPath="/global/databaseWorkersCount", required=False, defaultValue=2),
+    'magicHeaderSize': ConfigDef(shortName="magicHeaderSize", yamlPath="/global/magicHeaderSize", required=False, defaultValue=1024),
+    'magicFallbackSize': ConfigDef(shortName="magicFallbackSize", yamlPath="/global/magicFallbackSize", required=False, defaultValue=1024 * 1024),
+    'magicCacheFile': ConfigDef(shortName="magicCacheFile", yamlPath="/global/magicCacheFile", required=False, defaultValue=None),
+    'magicFastPath': ConfigDef(shortName="magicFastPath", yamlPath="/global/magicFastPath", required=False, defaultValue='off'),
+    'contentBufferMaxSize': ConfigDef(shortName="contentBufferMaxSize", yamlPath="/global/contentBufferMaxSize", required=False, defaultValue=32 * 1024 * 1024),
+    'contentBufferTotalSize': ConfigDef(shortName="contentBufferTotalSize", yamlPath="/global/contentBufferTotalSize", required=False, defaultValue=512 * 1024 * 1024),
+    'mapMinSize': ConfigDef(shortName="mapMinSize", yamlPath="/global/mapMinSize", required=False, defaultValue=64 * 1024),
+    'mapMinAge': ConfigDef(shortName="mapMinAge", yamlPath="/global/mapMinAge", required=False, defaultValue=60.0),
+    'listingCacheMemoryRows': ConfigDef(shortName="listingCacheMemoryRows", yamlPath="/global/listingCache/memoryRows", required=False, defaultValue=1000000),
+    'listingCacheDirectory': ConfigDef(shortName="listingCacheDirectory", yamlPath="/global/listingCache/directory", required=False, defaultValue=None),
+    'listingWorkersCount': ConfigDef(shortName="listingWorkersCount", yamlPath="/global/listing/workersCount", required=False, defaultValue=1),
+    'listingOrdered': ConfigDef(shortName="listingOrdered", yamlPath="/global/listing/ordered", required=False, defaultValue=False),
+    'listingDirectoryFds': ConfigDef(shortName="listingDirectoryFds", yamlPath="/global/listing/directoryFds", required=False, defaultValue=False),
+    'listingMaxQueuedDirectories': ConfigDef(shortName="listingMaxQueuedDirectories", yamlPath="/global/listing/maxQueuedDirectories", required=False, defaultValue=10000),
+    'maxPendingJobs': ConfigDef(shortName="maxPendingJobs", yamlPath="/global/maxPendingJobs", required=False, defaultValue=1024),
 }
\ No newline at end of file
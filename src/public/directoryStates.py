@@ -0,0 +1,180 @@
+from typing import Dict, Iterable, List, Tuple
+from collections import defaultdict
+from threading import Lock
+import hashlib
+import time
+import os
+
+from public import FileDescriptor
+
+# Directories modified this close to the listing start may change again within their modification time
+# resolution, they are listed again on the next run
+_racyDelayNs = 2 * 1000000000
+
+
+class DirectoryStates(object):
+    '''
+        The state of the directories of a data source at the last run, used
+        for incremental listings (see
+        :meth:`public.fileSystemModule.FileSystemModule.listFiles`).
+
+        Each directory state holds its modification time, its number of
+        entries and a digest of its entries (files names, sizes and
+        modification times, subdirectories names) :
+            - a directory with the same modification time is not read, its
+              known subdirectories being checked the same way, and its files
+              are not listed
+            - a directory read again whose entries have the same digest (e.g.
+              a file created then removed) does not have its files listed
+
+        Files modified in place do not change the modification time of their
+        directory : they are only found once their directory changes (or
+        without incremental listing).
+
+        States are loaded before the listing and the new ones (see
+        :meth:`DirectoryStates.changes`) saved once the listed files have been
+        processed. Directories with files failing to be processed (see
+        :meth:`DirectoryStates.failed`) are saved as changed, their files being
+        listed again on the next run.
+
+        :param states: The states of the last run, ``(modification time (ns),
+                        entries, digest)`` by directory path.
+        :type states: Dict[str, Tuple[int, int, str]]
+    '''
+
+    def __init__(self, states: Dict[str, Tuple[int, int, str]]):
+        self._states = states
+        self._subDirectories = defaultdict(list)
+        for path in states.keys():
+            self._subDirectories[os.path.dirname(path)].append(path)
+        self._listingStartNs = time.time_ns()
+        self._lock = Lock()
+        self._visited = set()
+        self._updated = {}
+        self._failed = set()
+        #: Directories not read since the last run
+        self.skippedDirectories = 0
+        #: Files of the unchanged directories, not listed
+        self.skippedFiles = 0
+
+    @staticmethod
+    def digest(files: Iterable[FileDescriptor], subDirectories: Iterable[str]) -> str:
+        '''
+            Get the digest of the entries of a directory.
+
+            :param files: The files of the directory.
+            :type files: Iterable[:class:`public.fileDescriptor.FileDescriptor`]
+            :param subDirectories: The paths of the subdirectories.
+            :type subDirectories: Iterable[str]
+
+            :returns: The entries digest.
+            :rtype: str
+        '''
+        entries = []
+        for fileDescriptor in files:
+            stat = fileDescriptor.stat
+            entries.append('f\0%s\0%d\0%d' % (fileDescriptor.name, stat.st_size, stat.st_mtime_ns))
+        for subDirectory in subDirectories:
+            entries.append('d\0%s' % os.path.basename(subDirectory))
+
+        hasher = hashlib.sha1()
+        for entry in sorted(entries):
+            hasher.update(os.fsencode(entry))
+            hasher.update(b'\n')
+        return hasher.hexdigest()
+
+    def isUnchanged(self, path: str, stat: os.stat_result) -> bool:
+        '''
+            Whether a directory did not change since the last run, and does not
+            need to be read.
+
+            :param path: The directory path.
+            :type path: str
+            :param stat: The directory stat.
+            :type stat: :class:`os.stat_result`
+
+            :returns: Whether the directory did not change.
+            :rtype: bool
+        '''
+        state = self._states.get(path)
+        with self._lock:
+            self._visited.add(path)
+            if state is None or state[0] != stat.st_mtime_ns:
+                return False
+            self.skippedDirectories += 1
+            self.skippedFiles += state[1] - len(self._subDirectories[path])
+        return True
+
+    def subDirectories(self, path: str) -> List[str]:
+        '''
+            Get the subdirectories of a directory at the last run.
+
+            :param path: The directory path.
+            :type path: str
+
+            :returns: The subdirectories paths.
+            :rtype: List[str]
+        '''
+        return list(self._subDirectories[path])
+
+    def listed(self, path: str, stat: os.stat_result, files: List[FileDescriptor], subDirectories: List[str]) -> bool:
+        '''
+            Records the new state of a directory, once read.
+
+            :param path: The directory path.
+            :type path: str
+            :param stat: The directory stat.
+            :type stat: :class:`os.stat_result`
+            :param files: The files of the directory.
+            :type files: List[:class:`public.fileDescriptor.FileDescriptor`]
+            :param subDirectories: The paths of the subdirectories.
+            :type subDirectories: List[str]
+
+            :returns: Whether the directory entries changed, its files having to
+                        be listed.
+            :rtype: bool
+        '''
+        entries = len(files) + len(subDirectories)
+        digest = DirectoryStates.digest(files, subDirectories)
+        state = self._states.get(path)
+        changed = state is None or state[1] != entries or state[2] != digest
+        # Listed again on the next run
+        mtime = stat.st_mtime_ns if stat.st_mtime_ns < self._listingStartNs - _racyDelayNs else 0
+
+        with self._lock:
+            self._visited.add(path)
+            if state != (mtime, entries, digest):
+                self._updated[path] = (mtime, entries, digest)
+            if not changed:
+                self.skippedFiles += len(files)
+        return changed
+
+    def failed(self, path: str) -> None:
+        '''
+            Records that a file of a directory failed to be processed : the
+            directory is read and its files listed again on the next run (see
+            :meth:`DirectoryStates.changes`).
+
+            :param path: The directory path.
+            :type path: str
+        '''
+        with self._lock:
+            self._failed.add(os.path.abspath(path))
+
+    def changes(self) -> Tuple[Dict[str, Tuple[int, int, str]], List[str]]:
+        '''
+            Get the states changed by the listing, the directories with failed
+            files having no modification time nor digest (read again).
+
+            :returns: The new or updated states, and the paths of the
+                        directories not found (removed or ignored).
+            :rtype: Tuple[Dict[str, Tuple[int, int, str]], List[str]]
+        '''
+        with self._lock:
+            updated = dict(self._updated)
+            if self._failed:
+                for path in self._visited:
+                    state = updated.get(path) or self._states.get(path)
+                    if state is not None and os.path.abspath(path) in self._failed:
+                        updated[path] = (0, state[1], '')
+            return updated, list(filter(lambda path: path not in self._visited, self._states.keys()))
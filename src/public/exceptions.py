@@ -2,4 +2,7 @@ class ConfiguratonError(Exception):
     pass
 
 class DependencyException(Exception):
+    pass
+
+class HandleTimeoutError(Exception):
     pass
\ No newline at end of file
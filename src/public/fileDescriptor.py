@@ -1,23 +1,95 @@
 from abc import ABC, abstractmethod
 from urllib.parse import ParseResult
+from threading import Lock
 import datetime
 import os
 import logging
-from typing import IO
-from functools import cached_property
+from typing import IO, Tuple, Callable
 
 import public.magicTools as magicTools
+from public.mappedFile import MappedFile, ACCESS_NORMAL, closeMap
 import magic
 
 logger = logging.getLogger('fileIndexer').getChild('public.FileDescriptor')
 
 
 class FileDescriptor(ABC):
+    '''
+        A file listed by a :class:`public.fileSystemModule.FileSystemModule`.
 
-    @cached_property
+        Descriptors use ``__slots__`` (a file system module may keep a lot of
+        them in memory) : the lazily computed values (stat, magic results) are
+        cached in slots instead of an instance dictionary. Subclasses should
+        declare their own ``__slots__``.
+    '''
+
+    __slots__ = ('_dataSource', '_cachedStat', '_cachedMagicInfos', '_magicInfosCallback', '_content', '_contentSize', '_contentLock', '_header')
+
+    #: Size of the file header read to detect the mime, encoding and description
+    magicHeaderSize = 1024
+    #: Maximum size read when the header is not enough to detect the file type
+    magicFallbackSize = 1024 * 1024
+    #: Persistent cache of the magic results (a :class:`lib.magicCache.MagicCache`),
+    #: ``None`` to detect each file
+    magicCache = None
+
+    #: Maximum size of a file kept in memory and shared by the modules (see
+    #: :meth:`FileDescriptor.openContent`), larger files are streamed
+    contentBufferMaxSize = 32 * 1024 * 1024
+    #: Maximum size of all the files kept in memory at the same time
+    contentBufferTotalSize = 512 * 1024 * 1024
+
+    _contentBufferUsedSize = 0
+    _contentBufferLock = Lock()
+
+    def __getstate__(self) -> tuple:
+        # The content is not sent to the process pool workers
+        slotsState = {}
+        for cls in type(self).__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if slot not in ('_content', '_contentLock', '_magicInfosCallback', '__dict__', '__weakref__') and hasattr(self, slot):
+                    slotsState[slot] = getattr(self, slot)
+        return getattr(self, '__dict__', None), slotsState
+
+    @property
+    def dataSource(self) -> str or None:
+        '''
+            The path of the data source this file have been listed from (set by
+            the :class:`lib.messageDispatcher.MessageDispatcher`).
+        '''
+        return getattr(self, '_dataSource', None)
+
+    @dataSource.setter
+    def dataSource(self, dataSource: str) -> None:
+        self._dataSource = dataSource
+
+    def setCachedInfos(self, stat: os.stat_result = None, magicInfos: Tuple[str, str, str] = None, magicInfosCallback: Callable[[Tuple[str, str, str]], None] = None) -> None:
+        '''
+            Sets the file informations already known (e.g. cached by a listing),
+            so they are not read again.
+
+            :param stat: The file stat.
+            :type stat: :class:`os.stat_result`
+            :param magicInfos: The file mime, encoding and description.
+            :type magicInfos: Tuple[str, str, str]
+            :param magicInfosCallback: Called with the mime, encoding and
+                                        description once detected (e.g. to
+                                        cache them).
+            :type magicInfosCallback: Callable[[Tuple[str, str, str]], None]
+        '''
+        if stat is not None:
+            self._cachedStat = stat
+        if magicInfos is not None:
+            self._cachedMagicInfos = magicInfos
+        self._magicInfosCallback = magicInfosCallback
+
+    @property
     def stat(self) -> os.stat_result:
-        return self._getStat()
-        
+        stat = getattr(self, '_cachedStat', None)
+        if stat is None:
+            stat = self._cachedStat = self._getStat()
+        return stat
+
     @property
     def path(self):
         return self._getPath()
@@ -55,6 +127,21 @@ class FileDescriptor(ABC):
     def open(self, mode='rb', buffering=-1, **kwargs) -> IO:
         pass
 
+    def openMapped(self, access: str = ACCESS_NORMAL) -> IO:
+        '''
+            Opens the file for reading without copying it in memory, when the
+            file system allows it (e.g. memory mapped local files, see
+            :class:`public.mappedFile.MappedFile`). Other file systems open the
+            file as usual.
+
+            :param access: The access hint (see :mod:`public.mappedFile`).
+            :type access: str
+
+            :returns: A binary file object.
+            :rtype: IO
+        '''
+        return self.open(mode='rb')
+
     def _getPath(self) -> str:
         return os.path.dirname(self.fullPath)
 
@@ -78,34 +165,209 @@ class FileDescriptor(ABC):
     def _getModificationDateTime(self) -> datetime.datetime:
         return datetime.datetime.fromtimestamp(self.stat.st_mtime)
 
-    def _getFileMagic(self, ms_flags=magicTools.MAGIC_FLAGS_DEFAULT) -> str:
+    @staticmethod
+    def _detectMagic(buffer: bytes) -> Tuple[str, str, str]:
+        # Handles are per thread, no lock required
+        msMime = magicTools.getMagic(magic.MIME)
+        mimeAndEncoding = msMime.buffer(buffer)
+        if not mimeAndEncoding:
+            logger.debug('Unable to get magic info (%s)' % msMime.error())
+            return None, None, None
+
+        # [mime]; charset=[encoding]
+        mime, _, encoding = mimeAndEncoding.partition(';')
+        encoding = encoding.strip()
+        if encoding.startswith('charset='):
+            encoding = encoding[len('charset='):]
+
+        msDescription = magicTools.getMagic(magic.NONE)
+        description = msDescription.buffer(buffer)
+        if not description:
+            logger.debug('Unable to get magic info (%s)' % msDescription.error())
+
+        return mime.strip(), encoding or None, description
+
+    def _getFileMagicInfos(self) -> Tuple[str, str, str]:
+        '''
+            Detects the file mime, encoding and description in a single pass,
+            reading the file header once (:attr:`FileDescriptor.magicHeaderSize`).
+
+            When the header is not enough (no result or a generic binary mime),
+            up to :attr:`FileDescriptor.magicFallbackSize` bytes are read.
+
+            Common file types are detected without libmagic when the fast path
+            is enabled (see :func:`public.magicTools.setFastPathMode`).
+
+            :returns: The file mime, encoding and description (``__UNKNOWN__``
+                        when not detected).
+            :rtype: Tuple[str, str, str]
+        '''
+        fastPathMode = magicTools.getFastPathMode()
+
+        with self.open(mode='rb') as fileIO:
+            buffer = fileIO.read(self.magicHeaderSize)
+            # Kept for the modules reading the file from the start (see getHeader), the
+            # fallback read not being kept as it is not counted in the content buffers
+            self._header = buffer
+
+            if fastPathMode != magicTools.FAST_PATH_OFF:
+                fastMagicInfos = magicTools.fastDetect(self.name, buffer)
+                if fastPathMode == magicTools.FAST_PATH_ON:
+                    magicTools.recordFastPathResult(fastMagicInfos, None, self.fullPath)
+                    if fastMagicInfos:
+                        return fastMagicInfos
+
+            magicInfos = FileDescriptor._detectMagic(buffer)
 
-        try:
-            magicTools.acquireLock()
-            with self.open(mode='rb') as buffer:
-                buffer = buffer.read(1024)
-                ms = magicTools.getMagic(ms_flags)
-                magic = ms.buffer(buffer)
-                if not magic:
-                    logger.debug('Unable to get magic info (%s)' % ms.error())
-                    buffer += buffer.read(-1)
+            if (not magicInfos[0] or magicInfos[0] == 'application/octet-stream') and \
+                    len(buffer) == self.magicHeaderSize and self.magicFallbackSize > self.magicHeaderSize:
+                buffer += fileIO.read(self.magicFallbackSize - len(buffer))
+                magicInfos = FileDescriptor._detectMagic(buffer)
 
-                if not magic:
-                    logger.error('Unable to get magic info (%s)' % ms.error())
-                    return '__UNKNOWN__'
+        if fastPathMode == magicTools.FAST_PATH_VERIFY:
+            magicTools.recordFastPathResult(fastMagicInfos, magicInfos, self.fullPath)
 
-                return magic
-        finally:
-            magicTools.releaseLock()
+        if not all(magicInfos):
+            logger.error('Unable to get magic info of file [%s]' % self.fullPath)
 
-    @cached_property
+        return tuple(map(lambda info: info or '__UNKNOWN__', magicInfos))
+
+    def _readContent(self):
+        '''
+            Reads the whole file content (see :meth:`FileDescriptor.getContent`).
+
+            :returns: The file content.
+            :rtype: bytes or any buffer (e.g. a :class:`mmap.mmap`)
+        '''
+        with self.open(mode='rb') as fileIO:
+            return fileIO.read()
+
+    def getContent(self) -> memoryview or None:
+        '''
+            Get the file content, read once and shared by all the modules
+            handling this file until :meth:`FileDescriptor.releaseContent` is
+            called (by the ``pipeline`` dispatch, once the file went through
+            all the modules; the ``steps`` one releases it after each module).
+
+            :returns: A view on the file content, or ``None`` if the file is too
+                        large to be kept in memory
+                        (:attr:`FileDescriptor.contentBufferMaxSize` and
+                        :attr:`FileDescriptor.contentBufferTotalSize`).
+            :rtype: memoryview or None
+        '''
+        content = getattr(self, '_content', None)
+        if content is not None:
+            return memoryview(content)
+
+        size = self.stat.st_size
+        if size > self.contentBufferMaxSize:
+            return None
+
+        with FileDescriptor._contentBufferLock:
+            contentLock = getattr(self, '_contentLock', None)
+            if contentLock is None:
+                contentLock = self._contentLock = Lock()
+
+        with contentLock:
+            content = getattr(self, '_content', None)
+            if content is None:
+                with FileDescriptor._contentBufferLock:
+                    if FileDescriptor._contentBufferUsedSize + size > self.contentBufferTotalSize:
+                        logger.debug('Content buffers full, streaming file [%s]' % self.fullPath)
+                        return None
+                    FileDescriptor._contentBufferUsedSize += size
+
+                try:
+                    content = self._readContent()
+                except Exception:
+                    with FileDescriptor._contentBufferLock:
+                        FileDescriptor._contentBufferUsedSize -= size
+                    raise
+                self._contentSize = size
+                self._content = content
+
+        return memoryview(content)
+
+    def openContent(self, access: str = ACCESS_NORMAL) -> IO:
+        '''
+            Opens the file for reading, from the shared content (see
+            :meth:`FileDescriptor.getContent`) or with
+            :meth:`FileDescriptor.openMapped` if it is too large.
+
+            Modules should use this method instead of :meth:`FileDescriptor.open`
+            to avoid reading the file once per module.
+
+            :param access: The access hint (see :mod:`public.mappedFile`),
+                            e.g. :data:`public.mappedFile.ACCESS_RANDOM` for
+                            formats indexed at the end of the file.
+            :type access: str
+
+            :returns: A binary file object.
+            :rtype: IO
+        '''
+        content = self.getContent()
+        if content is None:
+            return self.openMapped(access=access)
+
+        # Shares the content, no copy
+        return MappedFile(content.obj, name=self.fullPath, access=access)
+
+    def getHeader(self) -> bytes or None:
+        '''
+            Get the first bytes of the file, when already read to detect its
+            type, so modules reading the file from the start do not read them
+            again.
+
+            :returns: The first bytes of the file, ``None`` if not read (magic
+                        results cached).
+            :rtype: bytes or None
+        '''
+        return getattr(self, '_header', None)
+
+    def releaseContent(self) -> None:
+        '''
+            Drops the shared content (and the header, see
+            :meth:`FileDescriptor.getHeader`), once all the modules are done
+            with this file.
+        '''
+        self._header = None
+        content = getattr(self, '_content', None)
+        if content is not None:
+            self._content = None
+            closeMap(content)
+            with FileDescriptor._contentBufferLock:
+                FileDescriptor._contentBufferUsedSize -= self._contentSize
+
+    @property
+    def _magicInfos(self) -> Tuple[str, str, str]:
+        magicInfos = getattr(self, '_cachedMagicInfos', None)
+        if magicInfos is not None:
+            return magicInfos
+
+        magicCache = self.magicCache
+        if magicCache is not None:
+            magicInfos = magicCache.get(self)
+
+        if not magicInfos:
+            magicInfos = self._getFileMagicInfos()
+            if magicCache is not None:
+                magicCache.put(self, magicInfos)
+
+        self._cachedMagicInfos = magicInfos
+        magicInfosCallback = getattr(self, '_magicInfosCallback', None)
+        if magicInfosCallback is not None:
+            self._magicInfosCallback = None
+            magicInfosCallback(magicInfos)
+        return magicInfos
+
+    @property
     def mime(self) -> str:
-        return self._getFileMagic(ms_flags=magic.MIME_TYPE)
+        return self._magicInfos[0]
 
-    @cached_property
+    @property
     def encoding(self) -> str:
-        return self._getFileMagic(ms_flags=magic.MIME_ENCODING)
+        return self._magicInfos[1]
 
-    @cached_property
+    @property
     def description(self) -> str:
-        return self._getFileMagic(ms_flags=magic.NONE)
\ No newline at end of file
+        return self._magicInfos[2]
\ No newline at end of file
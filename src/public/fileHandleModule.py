@@ -86,6 +86,66 @@ class FileHandleModule(ABC):
         return None
 
     # Processing
+    def runInProcessPool(self) -> bool:
+        '''
+            Whether this module should be run in the process pool instead of
+            the thread pool (CPU-bound modules, limited by the GIL).
+
+            Modules run in a process pool are loaded again in each worker
+            process, with their own database engine, and receive a pickled copy
+            of the :class:`public.fileDescriptor.FileDescriptor`.
+
+            Return ``False`` if not implemented.
+
+            :returns: Whether this module should be run in the process pool.
+            :rtype: bool
+        '''
+        return False
+
+    def runInDatabasePool(self) -> bool:
+        '''
+            Whether this module mostly waits on the database (no file parsing)
+            and should be run in the database pool instead of the thread pool,
+            so a slow database does not hold the threads parsing files. The file
+            stat and mime are read by the thread pool before the module runs.
+
+            Return ``False`` if not implemented.
+
+            :returns: Whether this module should be run in the database pool.
+            :rtype: bool
+        '''
+        return False
+
+    def handleTimeout(self) -> float or None:
+        '''
+            The time budget of this module for a single file (in seconds). Once
+            elapsed, a :class:`public.exceptions.HandleTimeoutError` is raised in
+            the running :meth:`FileHandleModule.handle` call and the file is
+            quarantined. It is deferred while the module holds a database
+            connection, so queries and transactions are never interrupted.
+
+            Return ``None`` if not implemented (``/global/handleTimeout`` is used).
+
+            :returns: The time budget for a single file or ``None``.
+            :rtype: float or None
+        '''
+        return None
+
+    def afterDispatch(self, dbEngine: sqlalchemy.engine.Engine, appConfig: ConfigHandler) -> None:
+        '''
+            Called once all the data sources have been processed (not when the
+            dispatch is stopped or failed), for work on all the files (e.g.
+            comparing them).
+
+            Does nothing if not implemented.
+
+            :param dbEngine: A SQLAlchemy engine to query the configured database.
+            :type dbEngine: :class:`sqlalchemy.engine.Engine`
+            :param appConfig: The application configuration.
+            :type appConfig: :class:`public.configHandler.ConfigHandler`
+        '''
+        pass
+
     @abstractmethod
     def canHandle(self, fileDescriptor: FileDescriptor) -> bool:
         '''
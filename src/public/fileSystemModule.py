@@ -1,7 +1,7 @@
-from public import FileDescriptor, ConfigHandler
+from public import FileDescriptor, ConfigHandler, IgnoreMatcher, DirectoryStates
 
 from abc import ABC, abstractmethod
-from typing import Iterable, List, IO
+from typing import Callable, Iterable, Iterator, List, IO
 from urllib.parse import ParseResult
 
 import sqlalchemy
@@ -19,5 +19,73 @@ class FileSystemModule(ABC):
         pass
 
     @abstractmethod
-    def listFiles(self,  ignorePatterns: List[str] = [], followSymlinks: bool=False) -> Iterable[FileDescriptor]:
-        pass
\ No newline at end of file
+    def listFiles(self,  ignorePatterns: List[str] or IgnoreMatcher = [], followSymlinks: bool=False, withStat: bool=True,
+                    directoryStates: DirectoryStates = None) -> Iterable[FileDescriptor]:
+        '''
+            Lists the files of the connected data source.
+
+            :param ignorePatterns: Patterns of the paths to ignore (see :func:`fnmatch.fnmatch`),
+                                    or their matcher (see :meth:`public.ignoreMatcher.IgnoreMatcher.of`).
+            :type ignorePatterns: List[str] or :class:`public.ignoreMatcher.IgnoreMatcher`
+            :param followSymlinks: Whether to follow the symlinks.
+            :type followSymlinks: bool
+            :param withStat: Whether to stat the files while listing them, from
+                                the directory entries when possible. ``False``
+                                when only the names are needed, files being
+                                stat on first use.
+            :type withStat: bool
+            :param directoryStates: The directories states of the last run, for
+                                    an incremental listing (only the files of
+                                    the changed directories are listed). Ignored
+                                    by the modules not supporting it, listing
+                                    all the files.
+            :type directoryStates: :class:`public.directoryStates.DirectoryStates`
+
+            :returns: The files descriptors.
+            :rtype: Iterable[:class:`public.fileDescriptor.FileDescriptor`]
+        '''
+        pass
+
+    def getFileDescriptor(self, fileFullPath: str) -> FileDescriptor:
+        '''
+            Get the descriptor of a single file of the connected data source
+            (e.g. a file listed by a previous run).
+
+            :param fileFullPath: The file full path (see
+                                    :attr:`public.fileDescriptor.FileDescriptor.fullPath`).
+            :type fileFullPath: str
+
+            :returns: The file descriptor.
+            :rtype: :class:`public.fileDescriptor.FileDescriptor`
+            :raises NotImplementedError: Not supported by this module.
+        '''
+        raise NotImplementedError('%s can not get a single file' % self.__class__.__name__)
+
+    def watchFiles(self, ignorePatterns: List[str] or IgnoreMatcher = [], followSymlinks: bool = False, isStopped: Callable[[], bool] = lambda: False,
+                    debounceDelay: float = 2.0, maxDelay: float = 30.0) -> Iterator[List[FileDescriptor]]:
+        '''
+            Watches the files of the connected data source, yielding the files
+            created or modified since. The watch starts when called, changes
+            happening before the iterator is used being reported.
+
+            Changes are coalesced : a batch is yielded once no change happened
+            for ``debounceDelay`` seconds (or ``maxDelay`` seconds after the
+            first change of the batch).
+
+            :param ignorePatterns: Patterns of the paths to ignore (see :meth:`FileSystemModule.listFiles`).
+            :type ignorePatterns: List[str] or :class:`public.ignoreMatcher.IgnoreMatcher`
+            :param followSymlinks: Whether to follow the symlinks.
+            :type followSymlinks: bool
+            :param isStopped: Whether to stop watching, the iterator then ends.
+            :type isStopped: Callable[[], bool]
+            :param debounceDelay: The delay without changes before yielding
+                                    the changed files (in seconds).
+            :type debounceDelay: float
+            :param maxDelay: The maximum delay of a change (in seconds).
+            :type maxDelay: float
+
+            :returns: The batches of changed files descriptors.
+            :rtype: Iterator[List[:class:`public.fileDescriptor.FileDescriptor`]]
+            :raises NotImplementedError: Not supported by this module.
+        '''
+        raise NotImplementedError('%s can not watch files' % self.__class__.__name__)
\ No newline at end of file
@@ -0,0 +1,113 @@
+from typing import Iterable, List, Tuple
+from threading import Lock
+from fnmatch import translate
+import os
+import re
+
+# 'prefix/*' (or 'prefix/**'), ignoring the whole content of the directories matching 'prefix'
+_subtreeRe = re.compile(r'^(?P<prefix>.+)/\*+$')
+
+
+class IgnoreMatcher(object):
+    '''
+        The ignore patterns of a data source (:func:`fnmatch.fnmatch`
+        patterns, matched against the full paths), compiled once into a single
+        regex instead of matching each pattern for each directory entry.
+
+        Directories can be pruned before being listed : besides the
+        directories matching a pattern, patterns ending with ``/*`` (e.g.
+        ``*/.git/*``) match all the content of the directories matching their
+        prefix (``*/.git``), which are therefore not listed.
+
+        The entries removed by each pattern are counted (a pruned directory
+        counting for one entry), see :meth:`IgnoreMatcher.report`.
+
+        :param patterns: The patterns to ignore.
+        :type patterns: Iterable[str]
+    '''
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = list(patterns)
+        self._counts = [0] * len(self.patterns)
+        self._countsLock = Lock()
+        # Same case handling as fnmatch.fnmatch
+        self._normcase = os.path.normcase('A') != 'A'
+
+        self._regex = self._compile(enumerate(self.patterns))
+        self._subtreeRegex = self._compile(
+            (patternId, prefixMatch.group('prefix'))
+            for patternId, prefixMatch in enumerate(map(_subtreeRe.match, self.patterns))
+            if prefixMatch
+        )
+
+    def _compile(self, patterns: Iterable[Tuple[int, str]]) -> re.Pattern or None:
+        # Named after the pattern index, the first matching pattern being reported
+        alternatives = list(map(
+            lambda p: '(?P<p%d>%s)' % (p[0], translate(os.path.normcase(p[1]) if self._normcase else p[1])),
+            patterns
+        ))
+        if len(alternatives) == 0:
+            return None
+        return re.compile('|'.join(alternatives))
+
+    @staticmethod
+    def of(ignorePatterns: 'List[str] or IgnoreMatcher') -> 'IgnoreMatcher':
+        '''
+            Get the matcher of the given patterns.
+
+            :param ignorePatterns: The patterns, or an already compiled matcher
+                                    (returned as is).
+            :type ignorePatterns: List[str] or :class:`IgnoreMatcher`
+
+            :returns: The patterns matcher.
+            :rtype: :class:`IgnoreMatcher`
+        '''
+        if isinstance(ignorePatterns, IgnoreMatcher):
+            return ignorePatterns
+        return IgnoreMatcher(ignorePatterns or [])
+
+    def _match(self, regex: re.Pattern or None, path: str) -> bool:
+        if regex is None:
+            return False
+        match = regex.match(os.path.normcase(path) if self._normcase else path)
+        if match is None:
+            return False
+        with self._countsLock:
+            self._counts[int(match.lastgroup[1:])] += 1
+        return True
+
+    def matches(self, path: str) -> bool:
+        '''
+            Whether a path is ignored.
+
+            :param path: The full path of a file.
+            :type path: str
+
+            :returns: Whether the path matches a pattern.
+            :rtype: bool
+        '''
+        return self._match(self._regex, path)
+
+    def prunes(self, directoryPath: str) -> bool:
+        '''
+            Whether a directory is not to be listed, as it or all its content
+            is ignored.
+
+            :param directoryPath: The full path of a directory.
+            :type directoryPath: str
+
+            :returns: Whether the directory is ignored.
+            :rtype: bool
+        '''
+        return self._match(self._regex, directoryPath) or self._match(self._subtreeRegex, directoryPath)
+
+    def report(self) -> List[Tuple[str, int]]:
+        '''
+            Get the number of entries removed by each pattern so far.
+
+            :returns: ``(pattern, removed entries)`` couples, in the patterns
+                        order.
+            :rtype: List[Tuple[str, int]]
+        '''
+        with self._countsLock:
+            return list(zip(self.patterns, self._counts))
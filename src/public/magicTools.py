@@ -1,13 +1,19 @@
 import logging
 import atexit
+import os
 import magic
-from threading import Lock
+from threading import Lock, local
+from typing import Dict, Tuple
 
 logger = logging.getLogger('fileIndexer').getChild('public.magicTools')
 MAGIC_FLAGS_DEFAULT = magic.MIME
 
 
-ms = None
+# Handles of the current thread, by flags
+_threadHandles = local()
+# All the loaded handles, freed at exit
+_handles = []
+_handlesLock = Lock()
 
 _lock = Lock()
 
@@ -16,35 +22,233 @@ def getMagic(ms_flags=MAGIC_FLAGS_DEFAULT):
     '''
         Loads magic library and returns a handle.
 
-        It also registers a :func:`atexit.atexit` function.
+        Handles are not shared : each thread (and each process) gets its own
+        handle for each flags set, loaded on the first call, so no lock is
+        required to use it. Handles are freed at exit.
 
         :returns: A loaded magic handle.
         :rtype: :class:`magic.Magic`
     '''
-    
-    global ms
+    handles = getattr(_threadHandles, 'handles', None)
+    if handles is None:
+        handles = {}
+        _threadHandles.handles = handles
 
-    def free_magic():
-        if ms != None:
-            logger.info('Freeing libmagic')
-            ms.close()
-        
-
-    if ms == None:
-        logger.info('Loading libmagic configuration')
+    ms = handles.get(ms_flags)
+    if ms is None:
+        logger.debug('Loading libmagic configuration (flags %d)' % ms_flags)
         ms = magic.open(ms_flags)
         ms.load()
-        atexit.register(free_magic)
-        logger.info('Done')
-
-    ms.setflags(ms_flags)
+        handles[ms_flags] = ms
+        with _handlesLock:
+            _handles.append(ms)
 
     return ms
 
 
+def _freeMagic() -> None:
+    with _handlesLock:
+        if len(_handles) > 0:
+            logger.info('Freeing libmagic (%d handles)' % len(_handles))
+        for ms in _handles:
+            ms.close()
+        _handles.clear()
+
+atexit.register(_freeMagic)
+
+
+def _resetAfterFork() -> None:
+    '''
+        Drops the handles and the locks inherited from the parent process, new
+        handles will be loaded by the child process on demand.
+    '''
+    global _threadHandles
+    global _handles
+    global _handlesLock
+    global _lock
+    global _fastPathStatsLock
+
+    _threadHandles = local()
+    _handles = []
+    _handlesLock = Lock()
+    _lock = Lock()
+    _fastPathStatsLock = Lock()
+
+os.register_at_fork(after_in_child=_resetAfterFork)
+
+
+## Fast path
+FAST_PATH_OFF = 'off'
+FAST_PATH_ON = 'on'
+#: Both detections are run, the libmagic result is used and mismatches are counted
+FAST_PATH_VERIFY = 'verify'
+
+# Extension -> [(mime, signature parts as (offset, bytes), description)]
+_fastPathTable = {
+    'pdf':  [('application/pdf', ((0, b'%PDF-'),), 'PDF document')],
+    'png':  [('image/png', ((0, b'\x89PNG\r\n\x1a\n'),), 'PNG image data')],
+    'jpg':  [('image/jpeg', ((0, b'\xff\xd8\xff'),), 'JPEG image data')],
+    'jpeg': [('image/jpeg', ((0, b'\xff\xd8\xff'),), 'JPEG image data')],
+    'gif':  [
+        ('image/gif', ((0, b'GIF87a'),), 'GIF image data, version 87a'),
+        ('image/gif', ((0, b'GIF89a'),), 'GIF image data, version 89a'),
+    ],
+    'webp': [('image/webp', ((0, b'RIFF'), (8, b'WEBP')), 'RIFF (little-endian) data, Web/P image')],
+    'flac': [('audio/flac', ((0, b'fLaC'),), 'FLAC audio bitstream data')],
+    'mp3':  [
+        ('audio/mpeg', ((0, b'ID3'),), 'Audio file with ID3 version 2'),
+        ('audio/mpeg', ((0, b'\xff\xfb'),), 'MPEG ADTS, layer III, v1'),
+        ('audio/mpeg', ((0, b'\xff\xf3'),), 'MPEG ADTS, layer III, v2'),
+        ('audio/mpeg', ((0, b'\xff\xf2'),), 'MPEG ADTS, layer III, v2'),
+    ],
+    'm4a':  [('audio/x-m4a', ((4, b'ftypM4A '),), 'ISO Media, Apple iTunes ALAC/AAC-LC (.M4A) Audio')],
+    'mp4':  [
+        ('video/mp4', ((4, b'ftypisom'),), 'ISO Media, MP4 Base Media v1 [ISO 14496-12:2003]'),
+        ('video/mp4', ((4, b'ftypmp42'),), 'ISO Media, MP4 v2 [ISO 14496-14]'),
+        ('video/mp4', ((4, b'ftypmp41'),), 'ISO Media, MP4 v1 [ISO 14496-1:ch13]'),
+    ],
+    'mkv':  [('video/x-matroska', ((0, b'\x1a\x45\xdf\xa3'),), 'Matroska data')],
+    'epub': [('application/epub+zip', ((0, b'PK\x03\x04'), (30, b'mimetypeapplication/epub+zip')), 'EPUB document')],
+}
+_FAST_PATH_HEADER_SIZE = max(
+    offset + len(part) for candidates in _fastPathTable.values() for _, parts, _ in candidates for offset, part in parts
+)
+
+
+def _compileSignatureTries() -> Dict[int, dict]:
+    # Offset of the first signature part -> bytes trie, candidates stored with the None key
+    tries = {}
+    for candidates in _fastPathTable.values():
+        for mime, parts, description in candidates:
+            offset, firstPart = parts[0]
+            node = tries.setdefault(offset, {})
+            for byte in firstPart:
+                node = node.setdefault(byte, {})
+            candidate = (mime, parts[1:], description)
+            if candidate not in node.setdefault(None, []):
+                node[None].append(candidate)
+    return tries
+
+_signatureTries = _compileSignatureTries()
+
+_fastPathMode = FAST_PATH_OFF
+_fastPathStats = {'hits': 0, 'misses': 0, 'agreements': 0, 'disagreements': 0}
+_fastPathStatsLock = Lock()
+
+
+def setFastPathMode(mode: str) -> None:
+    '''
+        Enables the extension and signature detection (:func:`fastDetect`),
+        used by :class:`public.fileDescriptor.FileDescriptor` before libmagic.
+
+        :param mode: :data:`FAST_PATH_OFF`, :data:`FAST_PATH_ON` or :data:`FAST_PATH_VERIFY`
+                        (or a boolean, YAML reading unquoted ``on`` and ``off``
+                        as booleans).
+        :type mode: str or bool
+    '''
+    global _fastPathMode
+
+    if isinstance(mode, bool):
+        mode = FAST_PATH_ON if mode else FAST_PATH_OFF
+
+    if mode not in (FAST_PATH_OFF, FAST_PATH_ON, FAST_PATH_VERIFY):
+        raise ValueError('Unknown fast path mode [%s]' % mode)
+    _fastPathMode = mode
+
+
+def getFastPathMode() -> str:
+    '''
+        :returns: The fast path mode (see :func:`setFastPathMode`).
+        :rtype: str
+    '''
+    return _fastPathMode
+
+
+def fastDetect(fileName: str, header: bytes) -> Tuple[str, str, str] or None:
+    '''
+        Detects common file types from their extension and their signature
+        (first bytes), without libmagic.
+
+        The signatures are compiled in a trie, the file type is returned only
+        when the extension and the signature give the same mime.
+
+        :param fileName: The file name.
+        :type fileName: str
+        :param header: The first bytes of the file (at least 64 bytes).
+        :type header: bytes
+
+        :returns: The file mime, encoding (always ``binary``) and description or
+                    ``None`` if the file type is unknown or ambiguous (libmagic
+                    should be used).
+        :rtype: Tuple[str, str, str] or None
+    '''
+    extensionStart = fileName.rfind('.')
+    if extensionStart == -1:
+        return None
+    extensionCandidates = _fastPathTable.get(fileName[extensionStart+1:].lower())
+    if not extensionCandidates:
+        return None
+
+    matches = []
+    for offset, node in _signatureTries.items():
+        for byte in header[offset:offset+_FAST_PATH_HEADER_SIZE]:
+            node = node.get(byte)
+            if node is None:
+                break
+            for mime, parts, description in node.get(None, ()):
+                if all(map(lambda part: header[part[0]:part[0]+len(part[1])] == part[1], parts)):
+                    matches.append((mime, description))
+
+    mimes = set(map(lambda m: m[0], matches))
+    if len(mimes) != 1 or not any(map(lambda c: c[0] in mimes, extensionCandidates)):
+        return None
+
+    mime, description = matches[-1]
+    return mime, 'binary', description
+
+
+def recordFastPathResult(fastResult: Tuple[str, str, str] or None, magicResult: Tuple[str, str, str] or None, path: str) -> None:
+    '''
+        Counts the fast path results (and compares them with the libmagic ones
+        in verify mode, see :func:`getFastPathStats`).
+
+        :param fastResult: The :func:`fastDetect` result.
+        :type fastResult: Tuple[str, str, str] or None
+        :param magicResult: The libmagic result, ``None`` if not run.
+        :type magicResult: Tuple[str, str, str] or None
+        :param path: The file path (logged on mismatch).
+        :type path: str
+    '''
+    with _fastPathStatsLock:
+        _fastPathStats['hits' if fastResult else 'misses'] += 1
+        if fastResult and magicResult:
+            if fastResult[0] == magicResult[0]:
+                _fastPathStats['agreements'] += 1
+            else:
+                _fastPathStats['disagreements'] += 1
+                logger.debug('Fast path mismatch for [%s] : %s (libmagic : %s)' % (path, fastResult[0], magicResult[0]))
+
+
+def getFastPathStats() -> Dict[str, int]:
+    '''
+        Fast path counters :
+            - ``hits``: files detected by :func:`fastDetect`
+            - ``misses``: files left to libmagic
+            - ``agreements`` / ``disagreements``: mimes compared with libmagic (verify mode)
+
+        :returns: The fast path counters (of the current process).
+        :rtype: Dict[str, int]
+    '''
+    with _fastPathStatsLock:
+        return dict(_fastPathStats)
+
+
 def acquireLock() -> bool:
     '''
         Acquire the modue lock.
+
+        .. note::
+            Not required to use the handles returned by :func:`getMagic`.
     '''
     return _lock.acquire(blocking=True)
 
@@ -52,4 +256,4 @@ def releaseLock() -> None:
     '''
         Releases the module lock.
     '''
-    return _lock.release()
\ No newline at end of file
+    return _lock.release()
@@ -0,0 +1,290 @@
+from typing import IO
+import io
+import mmap
+import time
+import os
+import logging
+
+logger = logging.getLogger('fileIndexer').getChild('public.MappedFile')
+
+#: No access hint, the kernel default read-ahead is used
+ACCESS_NORMAL = 'normal'
+#: The file is read from start to end, aggressive read-ahead
+ACCESS_SEQUENTIAL = 'sequential'
+#: The file is read at random offsets (e.g. an index at the end), no read-ahead
+ACCESS_RANDOM = 'random'
+
+_madviseFlags = {
+    ACCESS_NORMAL:      getattr(mmap, 'MADV_NORMAL', None),
+    ACCESS_SEQUENTIAL:  getattr(mmap, 'MADV_SEQUENTIAL', None),
+    ACCESS_RANDOM:      getattr(mmap, 'MADV_RANDOM', None),
+}
+
+_fadviseFlags = {
+    ACCESS_NORMAL:      getattr(os, 'POSIX_FADV_NORMAL', None),
+    ACCESS_SEQUENTIAL:  getattr(os, 'POSIX_FADV_SEQUENTIAL', None),
+    ACCESS_RANDOM:      getattr(os, 'POSIX_FADV_RANDOM', None),
+}
+
+# Smaller files are read, copying them costing less than mapping them
+_mapMinSize = 64 * 1024
+# Files modified more recently may still be written, and a mapped file truncated kills the process (SIGBUS)
+_mapMinAge = 60.0
+
+
+def setMapPolicy(minSize: int, minAge: float) -> None:
+    '''
+        Sets the files mapped by :func:`mapFile` and :func:`openMappedFile`,
+        the other ones being read.
+
+        :param minSize: The minimum size of the mapped files (in bytes).
+        :type minSize: int
+        :param minAge: The minimum time since the last modification of the
+                        mapped files (in seconds).
+        :type minAge: float
+    '''
+    global _mapMinSize
+    global _mapMinAge
+
+    _mapMinSize = minSize
+    _mapMinAge = minAge
+
+
+def _openFile(filePath: str, dirFd: int = None) -> IO:
+    opener = (lambda path, flags: os.open(path, flags, dir_fd=dirFd)) if dirFd is not None else None
+    return open(filePath, 'rb', opener=opener)
+
+
+def _mapOpenFile(fileIO: IO) -> mmap.mmap or None:
+    # The map of the file, None if it should be read
+    stat = os.fstat(fileIO.fileno())
+    if stat.st_size == 0 or stat.st_size < _mapMinSize or time.time() - stat.st_mtime < _mapMinAge:
+        return None
+
+    buffer = mmap.mmap(fileIO.fileno(), 0, access=mmap.ACCESS_READ)
+    mappedStat = os.fstat(fileIO.fileno())
+    if (mappedStat.st_size, mappedStat.st_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+        # Written while mapped
+        buffer.close()
+        return None
+    return buffer
+
+
+def mapFile(filePath: str, dirFd: int = None) -> mmap.mmap or bytes:
+    '''
+        Maps a file in memory (read only).
+
+        Small files and files modified recently (possibly still written, see
+        :func:`setMapPolicy`) are read instead : a mapped file truncated while
+        read would kill the process (``SIGBUS``).
+
+        :param filePath: The file path.
+        :type filePath: str
+        :param dirFd: A directory file descriptor ``filePath`` is relative to
+                        (see :func:`os.open`).
+        :type dirFd: int
+
+        :returns: The file map, or the file content when not mapped.
+        :rtype: :class:`mmap.mmap` or bytes
+    '''
+    with _openFile(filePath, dirFd=dirFd) as fileIO:
+        buffer = _mapOpenFile(fileIO)
+        if buffer is None:
+            fileIO.seek(0)
+            return fileIO.read()
+        # The map stays valid once the file is closed
+        return buffer
+
+
+def openMappedFile(filePath: str, name: str = None, access: str = ACCESS_NORMAL, dirFd: int = None) -> IO:
+    '''
+        Opens a file mapped in memory (see :class:`MappedFile`), or as a
+        regular binary file when it should not be mapped (see :func:`mapFile`).
+
+        :param filePath: The file path.
+        :type filePath: str
+        :param name: The file name given to the file object.
+        :type name: str
+        :param access: The access hint given to the kernel (see :func:`advise`).
+        :type access: str
+        :param dirFd: A directory file descriptor ``filePath`` is relative to
+                        (see :func:`os.open`).
+        :type dirFd: int
+
+        :returns: A binary file object.
+        :rtype: IO
+    '''
+    if access not in _madviseFlags:
+        raise ValueError('Unknown access hint [%s]' % access)
+
+    fileIO = _openFile(filePath, dirFd=dirFd)
+    try:
+        buffer = _mapOpenFile(fileIO)
+        if buffer is None:
+            fileIO.seek(0)
+            if access != ACCESS_NORMAL and _fadviseFlags[access] is not None:
+                os.posix_fadvise(fileIO.fileno(), 0, 0, _fadviseFlags[access])
+            return fileIO
+    except BaseException:
+        fileIO.close()
+        raise
+
+    fileIO.close()
+    return MappedFile(buffer, name=name, access=access, closeBuffer=True)
+
+
+def advise(buffer, access: str) -> None:
+    '''
+        Gives the kernel an access hint on a file map (see :manpage:`madvise(2)`).
+        Ignored when not supported by the platform or when the buffer is not a
+        map.
+
+        :param buffer: The file map.
+        :type buffer: :class:`mmap.mmap`
+        :param access: :data:`ACCESS_NORMAL`, :data:`ACCESS_SEQUENTIAL` or :data:`ACCESS_RANDOM`.
+        :type access: str
+    '''
+    if access not in _madviseFlags:
+        raise ValueError('Unknown access hint [%s]' % access)
+
+    flag = _madviseFlags[access]
+    if flag is not None and isinstance(buffer, mmap.mmap) and not buffer.closed:
+        try:
+            buffer.madvise(flag)
+        except OSError as ex:
+            logger.debug('Unable to give the access hint [%s] (%s)' % (access, ex))
+
+
+def closeMap(buffer) -> None:
+    '''
+        Closes a file map, unless views on it are still in use (the map is then
+        closed once garbage collected).
+
+        :param buffer: The file map (other buffers are ignored).
+        :type buffer: :class:`mmap.mmap`
+    '''
+    if isinstance(buffer, mmap.mmap):
+        try:
+            buffer.close()
+        except BufferError:
+            logger.debug('File map still in use, not closed')
+
+
+class MappedFile(io.BufferedIOBase):
+    '''
+        A read only, seekable file object over a buffer (usually a file map,
+        see :func:`mapFile`).
+
+        The buffer is not copied : :meth:`MappedFile.readinto` and
+        :meth:`MappedFile.getbuffer` give zero-copy access, :meth:`MappedFile.read`
+        only copies the requested bytes.
+
+        Unless ``closeBuffer`` is set, closing the file object does not close
+        the buffer, which can be shared by several file objects. Views returned
+        by :meth:`MappedFile.getbuffer` are valid until the file object is
+        closed.
+
+        :param buffer: The file content.
+        :type buffer: :class:`mmap.mmap`, bytes or memoryview
+        :param name: The file name (some parsers use it, e.g. to guess the file
+                        type from its extension).
+        :type name: str
+        :param access: The access hint given to the kernel (see :func:`advise`).
+        :type access: str
+        :param closeBuffer: Whether to close the buffer (a file map) with the
+                            file object.
+        :type closeBuffer: bool
+    '''
+
+    def __init__(self, buffer, name: str = None, access: str = ACCESS_NORMAL, closeBuffer: bool = False):
+        super().__init__()
+        self._buffer = buffer
+        self._closeBuffer = closeBuffer
+        self._view = memoryview(buffer).cast('B')
+        self._position = 0
+        self.name = name
+        if access != ACCESS_NORMAL:
+            advise(buffer, access)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def getbuffer(self) -> memoryview:
+        '''
+            :returns: A view on the whole file content (no copy).
+            :rtype: memoryview
+        '''
+        self._checkClosed()
+        return self._view
+
+    def tell(self) -> int:
+        self._checkClosed()
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._checkClosed()
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError('Invalid whence (%r)' % whence)
+
+        if position < 0:
+            raise ValueError('Negative seek position %d' % position)
+        self._position = position
+        return position
+
+    def read(self, size: int = -1) -> bytes:
+        self._checkClosed()
+        start = min(self._position, len(self._view))
+        end = len(self._view) if size is None or size < 0 else min(start + size, len(self._view))
+        self._position = end
+        return self._view[start:end].tobytes()
+
+    read1 = read
+
+    def readinto(self, buffer) -> int:
+        self._checkClosed()
+        target = memoryview(buffer).cast('B')
+        start = min(self._position, len(self._view))
+        end = min(start + len(target), len(self._view))
+        target[0:end-start] = self._view[start:end]
+        self._position = end
+        return end - start
+
+    readinto1 = readinto
+
+    def readline(self, size: int = -1) -> bytes:
+        self._checkClosed()
+        start = min(self._position, len(self._view))
+        end = len(self._view) if size is None or size < 0 else min(start + size, len(self._view))
+        # Searching the view directly would require a copy
+        obj = self._view.obj
+        if isinstance(obj, (bytes, bytearray, mmap.mmap)) and len(obj) == len(self._view):
+            newLine = obj.find(b'\n', start, end)
+            if newLine != -1:
+                end = newLine + 1
+        else:
+            for position in range(start, end):
+                if self._view[position] == 0x0A:
+                    end = position + 1
+                    break
+        self._position = end
+        return self._view[start:end].tobytes()
+
+    def close(self) -> None:
+        if not self.closed:
+            try:
+                # Releasing the view allows the map to be closed
+                self._view.release()
+            except BufferError:
+                logger.debug('File view still in use, not released')
+            if self._closeBuffer:
+                closeMap(self._buffer)
+        super().close()
@@ -0,0 +1,110 @@
+from typing import Any, Iterable, Tuple, List, Dict
+from fnmatch import translate
+import re
+import logging
+
+logger = logging.getLogger('fileIndexer').getChild('public.MimeRouter')
+
+_wildcardRe = re.compile(r'[*?\[]')
+_typePrefixRe = re.compile(r'^(?P<prefix>[^*?\[/]+/)\*$')
+
+
+class MimeRouter(object):
+    '''
+        Resolves a mime to the targets (modules, processors, ...) declared
+        with :func:`fnmatch.fnmatch` patterns, without matching each pattern
+        for each file.
+
+        Patterns are compiled once into :
+            - an exact-match dict (patterns without wildcard)
+            - a ``type/`` prefix dict (``type/*`` patterns)
+            - a list of targets matching any mime (``*``)
+            - a single compiled regex for the remaining patterns
+
+        Resolved mimes are cached, the number of distinct mimes being small.
+
+        :param routes: ``(pattern, target)`` couples, the resolved targets are
+                        returned in this order.
+        :type routes: Iterable[Tuple[str, Any]]
+    '''
+
+    def __init__(self, routes: Iterable[Tuple[str, Any]]):
+        self._targets = []
+        self._exact = {}
+        self._prefixes = {}
+        self._catchAll = []
+        self._patterns = []
+        self._cache = {}
+
+        for pattern, target in routes:
+            if target in self._targets:
+                targetId = self._targets.index(target)
+            else:
+                targetId = len(self._targets)
+                self._targets.append(target)
+
+            prefixMatch = _typePrefixRe.match(pattern)
+            if pattern == '*':
+                self._catchAll.append(targetId)
+            elif not _wildcardRe.search(pattern):
+                self._exact.setdefault(pattern, []).append(targetId)
+            elif prefixMatch:
+                self._prefixes.setdefault(prefixMatch.group('prefix'), []).append(targetId)
+            else:
+                self._patterns.append((re.compile(translate(pattern)), targetId))
+
+        if len(self._patterns) > 0:
+            self._patternsRe = re.compile('|'.join(map(lambda p: '(?:%s)' % p[0].pattern, self._patterns)))
+        else:
+            self._patternsRe = None
+
+    @property
+    def routesAll(self) -> bool:
+        '''
+            Whether a target is declared for any mime (``*``), meaning any file
+            is routed to at least one target.
+        '''
+        return len(self._catchAll) > 0
+
+    def isCatchAll(self, target: Any) -> bool:
+        '''
+            Whether the given target is declared for any mime (``*``).
+
+            :param target: A declared target.
+            :type target: Any
+
+            :returns: Whether the target is declared for any mime.
+            :rtype: bool
+        '''
+        return any(map(lambda targetId: self._targets[targetId] == target, self._catchAll))
+
+    def route(self, mime: str) -> Tuple[Any, ...]:
+        '''
+            Get the targets declared for the given mime.
+
+            :param mime: The mime to resolve.
+            :type mime: str
+
+            :returns: The matching targets, in the order they were declared.
+            :rtype: Tuple[Any, ...]
+        '''
+        try:
+            return self._cache[mime]
+        except KeyError:
+            pass
+
+        targetIds = set(self._catchAll)
+        targetIds.update(self._exact.get(mime, ()))
+
+        prefixEnd = mime.find('/')
+        if prefixEnd != -1:
+            targetIds.update(self._prefixes.get(mime[:prefixEnd+1], ()))
+
+        if self._patternsRe and self._patternsRe.match(mime):
+            targetIds.update(
+                map(lambda p: p[1], filter(lambda p: p[0].match(mime), self._patterns))
+            )
+
+        targets = tuple(map(lambda targetId: self._targets[targetId], sorted(targetIds)))
+        self._cache[mime] = targets
+        return targets
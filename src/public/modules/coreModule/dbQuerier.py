@@ -1,3 +1,5 @@
+from typing import Dict, List, Tuple
+
 from public import FileDescriptor
 import public.dbTools as dbTools
 import logging
@@ -45,6 +47,7 @@ class DbQuerier(object):
             where(and_(
                 table['file'].c.filename == fileDescriptor.name,
                 table['file_path'].c.path == fileDescriptor.path,
+                table['file_path'].c.scheme_host == fileDescriptor.schemeAndHost,
             ))
 
         with self.dbEngine.connect() as dbConnection:
@@ -75,6 +78,7 @@ class DbQuerier(object):
             where(and_(
                 table['file'].c.filename == fileDescriptor.name,
                 table['file_path'].c.path == fileDescriptor.path,
+                table['file_path'].c.scheme_host == fileDescriptor.schemeAndHost,
             ))
 
         with self.dbEngine.connect() as dbConnection:
@@ -134,7 +138,7 @@ class DbQuerier(object):
             :param filePath: The file path to retrieve.
             :type filePath: str
             :param fileSchemeAndHost: The file scheme and host to support multiple locations
-            :type filePath: str
+            :type fileSchemeAndHost: str
 
             :return: A file path entity
             :rtype: dict
@@ -145,7 +149,10 @@ class DbQuerier(object):
         s = select([
             table['file_path']
             ]).\
-            where(table['file_path'].c.path == filePath)
+            where(and_(
+                table['file_path'].c.path == filePath,
+                table['file_path'].c.scheme_host == fileSchemeAndHost,
+            ))
 
         i = table['file_path'].insert().values(path=filePath, scheme_host=fileSchemeAndHost)
         
@@ -193,6 +200,139 @@ class DbQuerier(object):
         
         return dbTools.getSingletonEntity(s, i, self.dbEngine, allowParallel=True)
 
+    def getFileHash(self, fileDescriptor: FileDescriptor):
+        '''
+            Get the hash of a file.
+
+            :param fileDescriptor: A file descriptor to search in the database.
+            :type fileDescriptor: :class:`public.fileDescriptor.FileDescriptor`
+
+            :return: The file ``id`` and ``hash`` or ``None`` if not in the
+                        database.
+            :rtype: dict
+        '''
+        table = self.table
+
+        s = select([
+                table['file'].c.id,
+                table['file'].c.hash,
+            ]).\
+            select_from(table['file'].join(table['file_path'])).\
+            where(and_(
+                table['file'].c.filename == fileDescriptor.name,
+                table['file_path'].c.path == fileDescriptor.path,
+                table['file_path'].c.scheme_host == fileDescriptor.schemeAndHost,
+            ))
+
+        with self.dbEngine.connect() as dbConnection:
+            return dbConnection.execute(s).first()
+
+
+    def setFileHash(self, fileId: int, fileHash: str, dbConnection: sqlalchemy.engine.Connection = None) -> None:
+        '''
+            Updates the hash of a file (the core ``last_update`` and
+            ``size_kilobyte`` being left to the core module).
+
+            :param fileId: The file entity id.
+            :type fileId: int
+            :param fileHash: The file hash.
+            :type fileHash: str
+            :param dbConnection: The connection to use (for example within a
+                                    transaction), a new one if not set.
+            :type dbConnection: sqlalchemy.engine.Connection
+        '''
+        table = self.table
+
+        u = table['file'].update().\
+            where(table['file'].c.id == fileId).\
+            values(hash=fileHash)
+
+        if dbConnection is not None:
+            dbConnection.execute(u)
+        else:
+            with self.dbEngine.connect() as dbConnection:
+                dbConnection.execute(u)
+
+
+    def getDirectoryStates(self, dataSource: str, listingKey: str) -> Dict[str, Tuple[int, int, str]]:
+        '''
+            Get the directories states of a data source (see
+            :class:`public.directoryStates.DirectoryStates`).
+
+            :param dataSource: The data source path.
+            :type dataSource: str
+            :param listingKey: The key of the listing options, states of other
+                                options are ignored.
+            :type listingKey: str
+
+            :return: The ``(mtime, entries, digest)`` states by directory path.
+            :rtype: Dict[str, Tuple[int, int, str]]
+        '''
+        table = self.table['directory_state']
+
+        s = select([
+                table.c.path,
+                table.c.mtime,
+                table.c.entries,
+                table.c.digest,
+            ]).\
+            where(and_(
+                table.c.data_source == dataSource,
+                table.c.listing_key == listingKey,
+            ))
+
+        with self.dbEngine.connect() as dbConnection:
+            return dict(map(
+                lambda row: (row['path'], (row['mtime'], row['entries'], row['digest'])),
+                dbConnection.execute(s)
+            ))
+
+
+    def saveDirectoryStates(self, dataSource: str, listingKey: str, updatedStates: Dict[str, Tuple[int, int, str]], removedPaths: List[str]) -> None:
+        '''
+            Saves the directories states changed by a listing, in a single
+            transaction.
+
+            :param dataSource: The data source path.
+            :type dataSource: str
+            :param listingKey: The key of the listing options, states of other
+                                options are removed.
+            :type listingKey: str
+            :param updatedStates: The new or updated ``(mtime, entries, digest)``
+                                    states by directory path.
+            :type updatedStates: Dict[str, Tuple[int, int, str]]
+            :param removedPaths: The paths of the directories not found.
+            :type removedPaths: List[str]
+        '''
+        table = self.table['directory_state']
+        # Bounded IN clauses
+        chunkSize = 500
+        deletedPaths = list(updatedStates.keys()) + removedPaths
+
+        with self.dbEngine.begin() as dbConnection:
+            dbConnection.execute(table.delete().where(and_(
+                table.c.data_source == dataSource,
+                table.c.listing_key != listingKey,
+            )))
+            for chunkStart in range(0, len(deletedPaths), chunkSize):
+                dbConnection.execute(table.delete().where(and_(
+                    table.c.data_source == dataSource,
+                    table.c.path.in_(deletedPaths[chunkStart:chunkStart+chunkSize]),
+                )))
+            if len(updatedStates) > 0:
+                dbConnection.execute(table.insert(), list(map(
+                    lambda state: {
+                        'data_source': dataSource,
+                        'listing_key': listingKey,
+                        'path': state[0],
+                        'mtime': state[1][0],
+                        'entries': state[1][1],
+                        'digest': state[1][2],
+                    },
+                    updatedStates.items()
+                )))
+
+
     def getFileInDatabase(self, fileDescriptor: FileDescriptor) -> None:
         '''
             Insert base file information in the database and return it.
@@ -52,7 +52,17 @@ class CoreModule(FileHandleModule):
             sqlalchemy.Column('size_kilobyte', sqlalchemy.Integer, nullable=False),
             sqlalchemy.Column('last_update', sqlalchemy.DateTime, index=True, default=None),    # Updated with sha
             sqlalchemy.Column('file_description', sqlalchemy.String),                      # Libmagic default output
-            sqlalchemy.Column('hash', sqlalchemy.String(256), index=True, default=None)         # SHA-256
+            sqlalchemy.Column('hash', sqlalchemy.String(256), index=True, default=None)         # <algorithm>:<hex digest> (hashFileModule)
+        )
+        ## Incremental listing (public.directoryStates)
+        self.tables['directory_state'] = sqlalchemy.Table('directory_state', metadata,
+            sqlalchemy.Column('id', sqlalchemy.Integer, sqlalchemy.Sequence('directory_state_id_seq'), primary_key=True),
+            sqlalchemy.Column('data_source', sqlalchemy.String(4096), index=True, nullable=False),
+            sqlalchemy.Column('listing_key', sqlalchemy.String(64), nullable=False),            # Listing options and modules
+            sqlalchemy.Column('path', sqlalchemy.String(4096), nullable=False),
+            sqlalchemy.Column('mtime', sqlalchemy.BigInteger, nullable=False),                  # Nanoseconds, 0 to read again
+            sqlalchemy.Column('entries', sqlalchemy.Integer, nullable=False),
+            sqlalchemy.Column('digest', sqlalchemy.String(64), nullable=False)                  # Entries names, sizes and modification times
         )
 
 
@@ -65,6 +75,10 @@ class CoreModule(FileHandleModule):
     def getDBQuerier(self, dbEngine: sqlalchemy.engine.Engine, appConfig: ConfigHandler):
         return DbQuerier(dbEngine, self)
 
+    def runInDatabasePool(self) -> bool:
+        # Only database round trips, the file metadata being read by the dispatcher thread pool
+        return True
+
     def canHandle(self, fileDescriptor: FileDescriptor) -> bool:
         # Handle everything
         return True
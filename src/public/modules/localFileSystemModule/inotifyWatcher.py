@@ -0,0 +1,367 @@
+from typing import Callable, Iterator, List, Tuple
+import ctypes
+import ctypes.util
+import select
+import struct
+import errno
+import time
+import os
+import logging
+
+from public.ignoreMatcher import IgnoreMatcher
+from public.directoryStates import DirectoryStates
+
+from .localFileDescriptor import LocalFileDescriptor
+
+logger = logging.getLogger('fileIndexer').getChild('public.modules.LocalFileSystemModule.InotifyWatcher')
+
+# <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+_WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF | \
+                IN_ONLYDIR | IN_EXCL_UNLINK
+# Events of a file to index again
+_FILE_CHANGED_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+_eventHeader = struct.Struct('iIII')
+
+_libc = None
+
+
+def _getLibc() -> ctypes.CDLL:
+    global _libc
+
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        try:
+            libc.inotify_init1.argtypes = [ ctypes.c_int ]
+            libc.inotify_add_watch.argtypes = [ ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32 ]
+            libc.inotify_rm_watch.argtypes = [ ctypes.c_int, ctypes.c_int ]
+        except AttributeError:
+            raise NotImplementedError('inotify is not available on this platform')
+        _libc = libc
+    return _libc
+
+
+class InotifyWatcher(object):
+    '''
+        Watches a directory tree with inotify (see :manpage:`inotify(7)`),
+        reporting the files created or modified.
+
+        A watch is added on each directory of the tree (directories ignored by
+        the patterns excepted), directories created or moved in the tree being
+        watched (and their files reported) when found.
+
+        When the kernel events queue overflows, events are lost : the tree is
+        scanned again, reporting the files of the directories changed since
+        they were last read (see :class:`public.directoryStates.DirectoryStates`,
+        the directories with the same modification time not being read). Files
+        modified in place during the overflow, their directory not changing,
+        are not reported.
+
+        Raises :class:`NotImplementedError` when inotify is not available.
+
+        :param rootPath: The directory to watch.
+        :type rootPath: str
+        :param ignoreMatcher: The ignored paths.
+        :type ignoreMatcher: :class:`public.ignoreMatcher.IgnoreMatcher`
+        :param followSymlinks: Whether the links to directories are watched.
+        :type followSymlinks: bool
+    '''
+
+    def __init__(self, rootPath: str, ignoreMatcher: IgnoreMatcher, followSymlinks: bool = False):
+        self._libc = _getLibc()
+        self._rootPath = rootPath
+        self._ignoreMatcher = ignoreMatcher
+        self._followSymlinks = followSymlinks
+        self._mask = _WATCH_MASK if followSymlinks else _WATCH_MASK | IN_DONT_FOLLOW
+        # Watch descriptor -> directory path (and back)
+        self._paths = {}
+        self._watches = {}
+        self._watchLimitReached = False
+        # Directories states when last read, to scan again only the changed ones on overflow
+        self._directoryStates = {}
+
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, 'Unable to initialize inotify (%s)' % os.strerror(error))
+
+        try:
+            self.addTree(rootPath, withFiles=False)
+        except BaseException:
+            self.close()
+            raise
+        logger.info('Watching [%s] (%d directories)' % (rootPath, len(self._watches)))
+
+    def __len__(self) -> int:
+        '''
+            :returns: The number of watched directories.
+            :rtype: int
+        '''
+        return len(self._watches)
+
+    def _addWatch(self, path: str) -> bool:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self._mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                if not self._watchLimitReached:
+                    logger.warning('Watch limit reached, changes of [%s] and of the next directories will be missed (see /proc/sys/fs/inotify/max_user_watches)' % path)
+                    self._watchLimitReached = True
+            elif error not in (errno.ENOENT, errno.ENOTDIR):
+                logger.warning('Unable to watch [%s] (%s)' % (path, os.strerror(error)))
+            return False
+
+        previousPath = self._paths.get(wd)
+        if previousPath is not None and previousPath != path:
+            self._watches.pop(previousPath, None)
+        self._paths[wd] = path
+        self._watches[path] = wd
+        return True
+
+    def _removeWatches(self, path: str) -> None:
+        # The directory and its subdirectories (moved out of their path)
+        prefix = path + os.sep
+        for watchedPath in list(filter(lambda watchedPath: watchedPath == path or watchedPath.startswith(prefix), self._watches.keys())):
+            wd = self._watches.pop(watchedPath)
+            self._paths.pop(wd, None)
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _isFile(self, path: str) -> bool:
+        return os.path.isfile(path) and (self._followSymlinks or not os.path.islink(path))
+
+    def _readDirectory(self, directory: str, directoryStates: DirectoryStates, digestFiles: bool) -> Tuple[List[str], List[str]] or None:
+        # The files and subdirectories of a directory (None if removed), its state being recorded
+        files = []
+        subDirectories = []
+        try:
+            directoryStat = os.stat(directory)
+            with os.scandir(directory) as dirElements:
+                for dirElement in dirElements:
+                    if dirElement.is_file(follow_symlinks=self._followSymlinks):
+                        if not self._ignoreMatcher.matches(dirElement.path):
+                            files.append(LocalFileDescriptor.fromDirEntry(dirElement, followSymlinks=self._followSymlinks, withStat=False))
+                    elif dirElement.is_dir(follow_symlinks=self._followSymlinks):
+                        if not self._ignoreMatcher.prunes(dirElement.path):
+                            subDirectories.append(dirElement.path)
+        except (FileNotFoundError, NotADirectoryError):
+            # Removed since
+            return None
+
+        if not digestFiles:
+            # Files not stat when watched, their digest being computed by the next scan
+            directoryStates.listed(directory, directoryStat, [], subDirectories)
+        else:
+            try:
+                if not directoryStates.listed(directory, directoryStat, files, subDirectories):
+                    files = []
+            except FileNotFoundError:
+                # A file removed since, the state being recorded by the next scan
+                pass
+        return list(map(lambda fileDescriptor: fileDescriptor.fileFullPath, files)), subDirectories
+
+    def _saveStates(self, directoryStates: DirectoryStates) -> None:
+        updatedStates, removedPaths = directoryStates.changes()
+        for path in removedPaths:
+            self._directoryStates.pop(path, None)
+        self._directoryStates.update(updatedStates)
+
+    def addTree(self, path: str, withFiles: bool = True) -> List[str]:
+        '''
+            Watches a directory and its subdirectories.
+
+            :param path: The directory path.
+            :type path: str
+            :param withFiles: Whether to return the files of the tree.
+            :type withFiles: bool
+
+            :returns: The files of the tree.
+            :rtype: List[str]
+        '''
+        files = []
+        directoryStates = DirectoryStates({})
+        directories = [ path ]
+        while directories:
+            directory = directories.pop()
+            if not self._addWatch(directory):
+                continue
+            # Files of the new directories digested, not reported again by the next scan
+            content = self._readDirectory(directory, directoryStates, digestFiles=withFiles)
+            if content is not None:
+                if withFiles:
+                    files.extend(content[0])
+                directories.extend(content[1])
+        self._saveStates(directoryStates)
+        return files
+
+    def rescan(self) -> List[str]:
+        '''
+            Scans the tree again (after events have been lost), reading only
+            the directories changed since they were last read.
+
+            :returns: The files of the directories whose entries changed, and
+                        of the new directories.
+            :rtype: List[str]
+        '''
+        files = []
+        newDirectories = []
+        directoryStates = DirectoryStates(dict(self._directoryStates))
+        directories = [ self._rootPath ]
+        while directories:
+            directory = directories.pop()
+            if directory not in self._watches:
+                # Not watched yet, its events lost
+                newDirectories.append(directory)
+                continue
+            try:
+                if directoryStates.isUnchanged(directory, os.stat(directory)):
+                    directories.extend(directoryStates.subDirectories(directory))
+                    continue
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            content = self._readDirectory(directory, directoryStates, digestFiles=True)
+            if content is not None:
+                files.extend(content[0])
+                directories.extend(content[1])
+        self._saveStates(directoryStates)
+
+        for directory in newDirectories:
+            files.extend(self.addTree(directory))
+        logger.info('Scanned [%s] again, %d directories not read, %d files reported' % (
+            self._rootPath, directoryStates.skippedDirectories, len(files)))
+        return files
+
+    def readEvents(self, timeout: float) -> List[Tuple[str or None, int, str]]:
+        '''
+            Reads the pending events, waiting for them at most ``timeout``
+            seconds.
+
+            :param timeout: The maximum waiting time (in seconds).
+            :type timeout: float
+
+            :returns: The ``(directory path, mask, name)`` events (the directory
+                        path being ``None`` for a queue overflow).
+            :rtype: List[Tuple[str or None, int, str]]
+        '''
+        events = []
+        readable, _, _ = select.select([ self._fd ], [], [], timeout)
+        if not readable:
+            return events
+
+        while True:
+            try:
+                buffer = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            position = 0
+            while position + _eventHeader.size <= len(buffer):
+                wd, mask, _, nameLength = _eventHeader.unpack_from(buffer, position)
+                position += _eventHeader.size
+                name = os.fsdecode(buffer[position:position+nameLength].rstrip(b'\0'))
+                position += nameLength
+
+                if mask & IN_Q_OVERFLOW:
+                    events.append((None, mask, ''))
+                    continue
+                path = self._paths.get(wd)
+                if mask & IN_IGNORED:
+                    # Watch removed (directory deleted or unmounted)
+                    if path is not None:
+                        self._paths.pop(wd, None)
+                        if self._watches.get(path) == wd:
+                            self._watches.pop(path)
+                    continue
+                if path is not None:
+                    events.append((path, mask, name))
+        return events
+
+    def _changedFiles(self, events: List[Tuple[str or None, int, str]]) -> List[str]:
+        changedFiles = []
+        for directory, mask, name in events:
+            if directory is None:
+                logger.warning('Events queue overflow, scanning [%s] again' % self._rootPath)
+                changedFiles.extend(self.rescan())
+                continue
+            if not name:
+                # Event of the watched directory itself
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF) and directory == self._rootPath:
+                    logger.warning('Watched directory [%s] removed or moved' % directory)
+                continue
+
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & IN_MOVED_FROM:
+                    self._removeWatches(path)
+                elif mask & (IN_CREATE | IN_MOVED_TO) and not self._ignoreMatcher.prunes(path):
+                    # Files created before the watch was added are reported too
+                    changedFiles.extend(self.addTree(path))
+            elif mask & _FILE_CHANGED_MASK and not self._ignoreMatcher.matches(path):
+                changedFiles.append(path)
+        return changedFiles
+
+    def changes(self, isStopped: Callable[[], bool], debounceDelay: float = 2.0, maxDelay: float = 30.0) -> Iterator[List[str]]:
+        '''
+            Get the changed files, coalesced : a batch is yielded once no event
+            happened for ``debounceDelay`` seconds (or ``maxDelay`` seconds
+            after the first change of the batch), each file being reported once.
+
+            :param isStopped: Whether to stop watching (checked every second).
+            :type isStopped: Callable[[], bool]
+            :param debounceDelay: The delay without events before yielding the
+                                    changed files (in seconds).
+            :type debounceDelay: float
+            :param maxDelay: The maximum delay of a change (in seconds).
+            :type maxDelay: float
+
+            :returns: The paths of the changed files (still existing).
+            :rtype: Iterator[List[str]]
+        '''
+        pending = {}
+        firstChange = lastChange = None
+
+        while not isStopped():
+            now = time.monotonic()
+            timeout = 1.0
+            if pending:
+                timeout = max(0.0, min(timeout, lastChange + debounceDelay - now, firstChange + maxDelay - now))
+
+            changedFiles = self._changedFiles(self.readEvents(timeout))
+            now = time.monotonic()
+            if changedFiles:
+                if not pending:
+                    firstChange = now
+                lastChange = now
+                pending.update(dict.fromkeys(changedFiles))
+
+            if pending and (now - lastChange >= debounceDelay or now - firstChange >= maxDelay):
+                batch = list(filter(self._isFile, pending.keys()))
+                pending = {}
+                if batch:
+                    yield batch
+
+    def close(self) -> None:
+        '''
+            Removes the watches.
+        '''
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._paths = {}
+            self._watches = {}
+            self._directoryStates = {}
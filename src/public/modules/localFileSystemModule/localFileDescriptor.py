@@ -1,17 +1,48 @@
 from public import FileDescriptor
+from public.mappedFile import ACCESS_NORMAL, mapFile, openMappedFile
 from typing import IO
+from threading import Lock
 
 import os
 
 class LocalFileDescriptor(FileDescriptor):
 
-    def __init__(self, fileFullPath):
+    __slots__ = ('fileFullPath',)
+
+    def __init__(self, fileFullPath: str, stat: os.stat_result = None):
         self.fileFullPath = fileFullPath
-        self._cachedStat = None
+        # Given when listed, read on first use otherwise
+        self._cachedStat = stat
+
+    @staticmethod
+    def fromDirEntry(dirEntry: os.DirEntry, followSymlinks: bool = False, withStat: bool = True) -> 'LocalFileDescriptor':
+        '''
+            Get the descriptor of a listed file, with the stat of the directory
+            entry (cached by :func:`os.scandir`, free on some platforms).
+
+            :param dirEntry: The directory entry of the file.
+            :type dirEntry: :class:`os.DirEntry`
+            :param followSymlinks: Whether to stat the symlinks target.
+            :type followSymlinks: bool
+            :param withStat: Whether to stat the file now (``False`` to stat it
+                                on first use).
+            :type withStat: bool
+
+            :returns: The file descriptor.
+            :rtype: :class:`public.modules.localFileSystemModule.localFileDescriptor.LocalFileDescriptor`
+        '''
+        return LocalFileDescriptor(dirEntry.path, dirEntry.stat(follow_symlinks=followSymlinks) if withStat else None)
 
     def open(self, mode='rb', buffering=-1, **kwargs) -> IO:
         return open(self.fileFullPath, mode=mode, buffering=buffering, **kwargs)
 
+    def openMapped(self, access: str = ACCESS_NORMAL) -> IO:
+        return openMappedFile(self.fileFullPath, name=self.fullPath, access=access)
+
+    def _readContent(self):
+        # Mapped unless small or recently modified, the shared content lives in the page cache
+        return mapFile(self.fileFullPath)
+
     def _getFullPath(self) -> str:
         return os.path.abspath(self.fileFullPath)
 
@@ -19,6 +50,135 @@ class LocalFileDescriptor(FileDescriptor):
         return 'file://'
 
     def _getStat(self) -> os.stat_result:
-        if not self._cachedStat:
-            self._cachedStat = os.stat(self.fileFullPath)
-        return self._cachedStat
+        return os.stat(self.fileFullPath)
+
+
+class DirectoryHandle(object):
+    '''
+        An open directory, shared by the descriptors of its files (see
+        :class:`LocalRelativeFileDescriptor`) so that they are opened and stat
+        relatively to it, without resolving their full path again.
+
+        The directory is closed once no longer referenced (by the listing or
+        by a descriptor), the number of open directories being available with
+        :meth:`DirectoryHandle.openCount`.
+
+        :param path: The directory absolute path.
+        :type path: str
+        :param fd: The directory file descriptor (owned by the handle).
+        :type fd: int
+    '''
+
+    __slots__ = ('path', 'fd')
+
+    _openCount = 0
+    _openCountLock = Lock()
+
+    def __init__(self, path: str, fd: int):
+        self.path = path
+        self.fd = fd
+        with DirectoryHandle._openCountLock:
+            DirectoryHandle._openCount += 1
+
+    @staticmethod
+    def openCount() -> int:
+        '''
+            :returns: The number of directories currently open.
+            :rtype: int
+        '''
+        return DirectoryHandle._openCount
+
+    @staticmethod
+    def open(path: str) -> 'DirectoryHandle':
+        '''
+            Opens a directory.
+
+            :param path: The directory absolute path.
+            :type path: str
+
+            :returns: The directory handle.
+            :rtype: :class:`DirectoryHandle`
+        '''
+        return DirectoryHandle(path, os.open(path, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0) | getattr(os, 'O_CLOEXEC', 0)))
+
+    def close(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            with DirectoryHandle._openCountLock:
+                DirectoryHandle._openCount -= 1
+
+    def __del__(self):
+        self.close()
+
+    def __reduce__(self):
+        raise TypeError('A directory handle can not be sent to another process')
+
+
+class LocalRelativeFileDescriptor(LocalFileDescriptor):
+    '''
+        A local file listed from an open directory : it is opened and stat
+        relatively to the directory (``dir_fd``), its full path being only
+        built when needed.
+
+        Sent to another process, the descriptor uses the full path.
+
+        :param directory: The directory of the file.
+        :type directory: :class:`DirectoryHandle`
+        :param fileName: The file name.
+        :type fileName: str
+        :param stat: The file stat (read on first use if not given).
+        :type stat: :class:`os.stat_result`
+    '''
+
+    __slots__ = ('_directory', '_fileName')
+
+    def __init__(self, directory: DirectoryHandle, fileName: str, stat: os.stat_result = None):
+        self._directory = directory
+        self._fileName = fileName
+        # Given when listed, read on first use otherwise
+        self._cachedStat = stat
+
+    def __getstate__(self) -> tuple:
+        # The directory is not opened in the other process
+        self._getFullPath()
+        instanceDict, slotsState = super().__getstate__()
+        slotsState['_directory'] = None
+        return instanceDict, slotsState
+
+    def _opener(self, path: str, flags: int) -> int:
+        return os.open(path, flags, dir_fd=self._directory.fd)
+
+    def open(self, mode='rb', buffering=-1, **kwargs) -> IO:
+        if self._directory is None:
+            return super().open(mode=mode, buffering=buffering, **kwargs)
+        return open(self._fileName, mode=mode, buffering=buffering, opener=self._opener, **kwargs)
+
+    def openMapped(self, access: str = ACCESS_NORMAL) -> IO:
+        if self._directory is None:
+            return super().openMapped(access=access)
+        return openMappedFile(self._fileName, name=self.fullPath, access=access, dirFd=self._directory.fd)
+
+    def _readContent(self):
+        if self._directory is None:
+            return super()._readContent()
+        return mapFile(self._fileName, dirFd=self._directory.fd)
+
+    def _getFullPath(self) -> str:
+        fileFullPath = getattr(self, 'fileFullPath', None)
+        if fileFullPath is None:
+            fileFullPath = self.fileFullPath = os.path.join(self._directory.path, self._fileName)
+        return fileFullPath
+
+    def _getPath(self) -> str:
+        if self._directory is None:
+            return super()._getPath()
+        return self._directory.path
+
+    def _getName(self) -> str:
+        return self._fileName
+
+    def _getStat(self) -> os.stat_result:
+        if self._directory is None:
+            return super()._getStat()
+        return os.stat(self._fileName, dir_fd=self._directory.fd)
@@ -2,14 +2,19 @@ from public.fileSystemModule import FileSystemModule
 from public.fileDescriptor import FileDescriptor
 from public.configHandler import ConfigHandler
 from public.configuration import moduleConfiguration
+from public.ignoreMatcher import IgnoreMatcher
+from public.directoryStates import DirectoryStates
+from public.parallelWalker import ParallelWalker
 
-from .localFileDescriptor import LocalFileDescriptor
+from .localFileDescriptor import LocalFileDescriptor, LocalRelativeFileDescriptor, DirectoryHandle
+from .inotifyWatcher import InotifyWatcher
 
 import os
+import errno
+import resource
 import logging
-from fnmatch import fnmatch
 from urllib.parse import ParseResult
-from typing import Iterable, List, IO
+from typing import Callable, Iterable, Iterator, List, Tuple, IO
 import itertools
 
 import sqlalchemy
@@ -32,22 +37,117 @@ class LocalFileSystemModule(FileSystemModule):
         self.basePath = parsedUri.path
         self.config = config
 
-    def listFiles(self, ignorePatterns: List[str] = [], followSymlinks: bool = False) -> Iterable[FileDescriptor]:
+    def listFiles(self, ignorePatterns: List[str] or IgnoreMatcher = [], followSymlinks: bool = False, withStat: bool = True,
+                    directoryStates: DirectoryStates = None) -> Iterable[FileDescriptor]:
+
+        ignoreMatcher = IgnoreMatcher.of(ignorePatterns)
 
         def list_dir_content(absoluteDirPath: str) -> Iterable[FileDescriptor]:
             for dirElement in os.scandir(absoluteDirPath):
-                if not any(map(lambda pattern: fnmatch(dirElement.path, pattern), ignorePatterns)):
-                    if dirElement.is_file(follow_symlinks=followSymlinks):
-                        yield LocalFileDescriptor(dirElement.path)
-                    elif dirElement.is_dir(follow_symlinks=followSymlinks):
+                if dirElement.is_file(follow_symlinks=followSymlinks):
+                    if not ignoreMatcher.matches(dirElement.path):
+                        yield LocalFileDescriptor.fromDirEntry(dirElement, followSymlinks=followSymlinks, withStat=withStat)
+                elif dirElement.is_dir(follow_symlinks=followSymlinks):
+                    # Ignored directories are not listed
+                    if not ignoreMatcher.prunes(dirElement.path):
                         for subDirElement in list_dir_content(dirElement.path):
                             yield subDirElement
-                    else:
-                        # We can't handle this kind of file
+                elif not ignoreMatcher.matches(dirElement.path):
+                    # We can't handle this kind of file
+                    logger.warn(
+                        'Unable to process element [%s]' % dirElement.path)
+
+        def list_dir_content_by_dir(absoluteDirPath: str) -> Iterable[FileDescriptor]:
+            files, subDirs = scan_dir(absoluteDirPath)
+            for fileDescriptor in files:
+                yield fileDescriptor
+            for subDir in subDirs:
+                for subDirElement in list_dir_content_by_dir(subDir):
+                    yield subDirElement
+
+        def open_dir(absoluteDirPath: str) -> DirectoryHandle or None:
+            if DirectoryHandle.openCount() >= maxOpenDirectories:
+                # Directories kept open by the files in flight, the others are listed by path
+                return None
+            try:
+                return DirectoryHandle.open(absoluteDirPath)
+            except OSError as ex:
+                if ex.errno != errno.EMFILE:
+                    raise
+                logger.debug('Too many open files, [%s] listed by path' % absoluteDirPath)
+                return None
+
+        def scan_dir(absoluteDirPath: str) -> Tuple[List[FileDescriptor], List[str]]:
+            files = []
+            subDirs = []
+            if directoryStates is not None:
+                try:
+                    dirStat = os.stat(absoluteDirPath)
+                except FileNotFoundError:
+                    if absoluteDirPath == searchPath:
+                        raise
+                    # Known subdirectory of an unchanged directory, removed since
+                    return files, subDirs
+                if directoryStates.isUnchanged(absoluteDirPath, dirStat):
+                    # Not read, its files did not change
+                    return files, directoryStates.subDirectories(absoluteDirPath)
+
+            directory = open_dir(absoluteDirPath) if directoryFds else None
+            if directory is not None:
+                # Files opened and stat relatively to the directory, their path being built when needed
+                scannedDir = directory.fd
+                element_path = lambda dirElement: os.path.join(absoluteDirPath, dirElement.name)
+                new_descriptor = lambda dirElement: LocalRelativeFileDescriptor(
+                    directory, dirElement.name, dirElement.stat(follow_symlinks=followSymlinks) if withStat else None)
+            else:
+                scannedDir = absoluteDirPath
+                element_path = lambda dirElement: dirElement.path
+                new_descriptor = lambda dirElement: LocalFileDescriptor.fromDirEntry(dirElement, followSymlinks=followSymlinks, withStat=withStat)
+
+            with os.scandir(scannedDir) as dirElements:
+                for dirElement in dirElements:
+                    if dirElement.is_file(follow_symlinks=followSymlinks):
+                        if not ignoreMatcher.patterns or not ignoreMatcher.matches(element_path(dirElement)):
+                            files.append(new_descriptor(dirElement))
+                    elif dirElement.is_dir(follow_symlinks=followSymlinks):
+                        subDirPath = element_path(dirElement)
+                        if not ignoreMatcher.prunes(subDirPath):
+                            subDirs.append(subDirPath)
+                    elif not ignoreMatcher.matches(element_path(dirElement)):
                         logger.warn(
-                            'Unable to process element [%s]' % dirElement.path)
-                        pass
+                            'Unable to process element [%s]' % element_path(dirElement))
 
+            if directoryStates is not None and not directoryStates.listed(absoluteDirPath, dirStat, files, subDirs):
+                files = []
+            return files, subDirs
+
+        searchPath = self._getSearchPath()
+        directoryFds = self.config.get(moduleConfiguration['listingDirectoryFds'])
+        if directoryFds and not {os.open, os.stat} <= os.supports_dir_fd:
+            logger.warning('Directory file descriptors are not supported on this platform, files are listed by path')
+            directoryFds = False
+        if directoryFds:
+            # Paths of the relative descriptors built from their directory path
+            searchPath = os.path.abspath(searchPath)
+            # Half of the open files limit, leaving room for the opened files
+            openFilesLimit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+            maxOpenDirectories = openFilesLimit // 2 if openFilesLimit != resource.RLIM_INFINITY else 65536
+
+        workersCount = self.config.get(moduleConfiguration['listingWorkersCount'])
+        if workersCount and workersCount > 1:
+            return ParallelWalker(
+                scan_dir,
+                workersCount=workersCount,
+                maxQueuedDirectories=self.config.get(moduleConfiguration['listingMaxQueuedDirectories']),
+                ordered=self.config.get(moduleConfiguration['listingOrdered'])
+            ).walk(searchPath)
+
+        if directoryStates is not None or directoryFds:
+            # Directories read as a whole, their state being known (and their descriptor shared) once read
+            return list_dir_content_by_dir(searchPath)
+        return list_dir_content(searchPath)
+
+    def _getSearchPath(self) -> str:
         if not self.basePath:
             raise RuntimeError(
                 'LocalFileSystemModule not connected. You should connect to the data source before listing files.')
@@ -59,5 +159,33 @@ class LocalFileSystemModule(FileSystemModule):
                 raise RuntimeError(
                     'Expect to list files using a relative path but relative location not given')
             searchPath = os.path.join(searchPath, relativePath)
+        return searchPath
 
-        return list_dir_content(searchPath)
+    def getFileDescriptor(self, fileFullPath: str) -> FileDescriptor:
+        return LocalFileDescriptor(fileFullPath)
+
+    def watchFiles(self, ignorePatterns: List[str] or IgnoreMatcher = [], followSymlinks: bool = False, isStopped: Callable[[], bool] = lambda: False,
+                    debounceDelay: float = 2.0, maxDelay: float = 30.0) -> Iterator[List[FileDescriptor]]:
+
+        def watch_changes() -> Iterator[List[FileDescriptor]]:
+            watcher = InotifyWatcher(self._getSearchPath(), IgnoreMatcher.of(ignorePatterns), followSymlinks=followSymlinks)
+            try:
+                # Watches added, the changes being kept by the kernel until read
+                yield None
+                for changedFiles in watcher.changes(isStopped, debounceDelay=debounceDelay, maxDelay=maxDelay):
+                    fileDescriptors = []
+                    for changedFile in changedFiles:
+                        try:
+                            fileDescriptors.append(LocalFileDescriptor(changedFile, os.stat(changedFile, follow_symlinks=followSymlinks)))
+                        except FileNotFoundError:
+                            # Removed since
+                            pass
+                    if fileDescriptors:
+                        yield fileDescriptors
+            finally:
+                watcher.close()
+
+        changes = watch_changes()
+        # Started, so that closing it removes the watches
+        next(changes)
+        return changes
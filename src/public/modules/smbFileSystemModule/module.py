@@ -1,11 +1,10 @@
 from typing import List, Iterable
 from urllib.parse import ParseResult
-from fnmatch import fnmatch
 import logging
 
 import smbclient
 
-from public import FileSystemModule, FileDescriptor, ConfigHandler
+from public import FileSystemModule, FileDescriptor, ConfigHandler, IgnoreMatcher, DirectoryStates
 from .config import configuration as moduleConfiguration
 from .smbFileDescriptor import SmbFileDescriptor
 
@@ -31,21 +30,30 @@ class SmbFileSystemModule(FileSystemModule):
             port=moduleConfiguration['port'],
             connection_timeout=moduleConfiguration['connection_timeout'])
 
-    def listFiles(self,  ignorePatterns: List[str] = [], followSymlinks: bool=False) -> Iterable[FileDescriptor]:
+    def listFiles(self,  ignorePatterns: List[str] or IgnoreMatcher = [], followSymlinks: bool=False, withStat: bool=True,
+                    directoryStates: DirectoryStates = None) -> Iterable[FileDescriptor]:
+        # Incremental listing not supported (directoryStates ignored), all the files are listed
+        ignoreMatcher = IgnoreMatcher.of(ignorePatterns)
 
         def list_dir_content(absoluteDirPath: str) -> Iterable[FileDescriptor]:
             for dirElement in smbclient.scandir(absoluteDirPath):
-                if not any(map(lambda pattern: fnmatch(dirElement.path, pattern), ignorePatterns)):
-                    if dirElement.is_file(follow_symlinks=followSymlinks):
-                        yield SmbFileDescriptor(dirElement.path, self.schemeAndLocation)
-                    elif dirElement.is_dir(follow_symlinks=followSymlinks):
+                if dirElement.is_file(follow_symlinks=followSymlinks):
+                    if not ignoreMatcher.matches(dirElement.path):
+                        yield SmbFileDescriptor(
+                            dirElement.path,
+                            self.schemeAndLocation,
+                            # Cached from the directory query
+                            dirElement.stat(follow_symlinks=followSymlinks) if withStat else None
+                        )
+                elif dirElement.is_dir(follow_symlinks=followSymlinks):
+                    # Ignored directories are not listed
+                    if not ignoreMatcher.prunes(dirElement.path):
                         for subDirElement in list_dir_content(dirElement.path):
                             yield subDirElement
-                    else:
-                        # We can't handle this kind of file
-                        logger.warn(
-                            'Unable to process element [%s]' % dirElement.path)
-                        pass
+                elif not ignoreMatcher.matches(dirElement.path):
+                    # We can't handle this kind of file
+                    logger.warn(
+                        'Unable to process element [%s]' % dirElement.path)
 
         if not self.basePath:
             raise RuntimeError(
@@ -53,4 +61,7 @@ class SmbFileSystemModule(FileSystemModule):
 
         searchPath = self.basePath
 
-        return list_dir_content(searchPath)
\ No newline at end of file
+        return list_dir_content(searchPath)
+
+    def getFileDescriptor(self, fileFullPath: str) -> FileDescriptor:
+        return SmbFileDescriptor(fileFullPath, self.schemeAndLocation)
\ No newline at end of file
@@ -6,10 +6,13 @@ import smbclient
 
 class SmbFileDescriptor(FileDescriptor):
 
-    def __init__(self, fileFullPath: str, schemeAndLocation: str):
+    __slots__ = ('fileFullPath', 'schemeAndLocation')
+
+    def __init__(self, fileFullPath: str, schemeAndLocation: str, stat: os.stat_result = None):
         self.fileFullPath = fileFullPath
         self.schemeAndLocation = schemeAndLocation
-        self._cachedStat = None
+        # Given when listed, read on first use otherwise
+        self._cachedStat = stat
 
     def open(self, mode='rb', buffering=-1, **kwargs) -> IO:
         return smbclient.open_file(self.fileFullPath, mode=mode, buffering=buffering, **kwargs)
@@ -21,6 +24,4 @@ class SmbFileDescriptor(FileDescriptor):
         return self.schemeAndLocation
 
     def _getStat(self) -> os.stat_result:
-        if not self._cachedStat:
-            self._cachedStat = smbclient.stat(self.fileFullPath)
-        return self._cachedStat
+        return smbclient.stat(self.fileFullPath)
@@ -0,0 +1,243 @@
+from threading import Thread, Condition, Semaphore, Event
+from typing import Callable, Iterator, List, Tuple
+import heapq
+import queue
+
+from public import FileDescriptor
+
+# Batches end
+_DONE = object()
+
+
+class _Directory(object):
+
+    __slots__ = ('key', 'path', 'claimed', 'scanned', 'permit', 'files', 'children', 'error')
+
+    def __init__(self, key: tuple, path: str):
+        self.key = key
+        self.path = path
+        self.claimed = False
+        self.scanned = False
+        self.permit = False
+        self.files = None
+        self.children = None
+        self.error = None
+
+
+class ParallelWalker(object):
+    '''
+        Walks a directory tree reading several directories at once, yielding
+        the files as a single stream.
+
+        Directories are scanned by ``scanDirectory``, returning the files
+        descriptors and the subdirectories paths of a directory (filtered by
+        the file system module).
+
+        Unordered, the subdirectories are queued for the worker threads up to
+        ``maxQueuedDirectories``, the others being walked by the thread which
+        found them, and the files are yielded as soon as read.
+
+        Ordered, the files are yielded in the same order on each run (depth
+        first, sorted by name, as a sequential walk would). Worker threads
+        read ahead the next directories, up to ``maxQueuedDirectories``
+        directories being read and not yet yielded.
+
+        :param scanDirectory: Reads a directory, returning its files and
+                                subdirectories paths.
+        :type scanDirectory: Callable[[str], Tuple[List[:class:`public.fileDescriptor.FileDescriptor`], List[str]]]
+        :param workersCount: The number of directories read at once.
+        :type workersCount: int
+        :param maxQueuedDirectories: The maximum number of directories queued
+                                        (or read ahead when ordered).
+        :type maxQueuedDirectories: int
+        :param ordered: Whether to yield the files in a deterministic order.
+        :type ordered: bool
+    '''
+
+    def __init__(self, scanDirectory: Callable[[str], Tuple[List[FileDescriptor], List[str]]], workersCount: int,
+                    maxQueuedDirectories: int = 10000, ordered: bool = False):
+        self._scanDirectory = scanDirectory
+        self._workersCount = max(1, workersCount)
+        self._maxQueuedDirectories = max(1, maxQueuedDirectories)
+        self._ordered = ordered
+
+    def walk(self, rootPath: str) -> Iterator[FileDescriptor]:
+        '''
+            Walks a directory tree.
+
+            Reading errors are raised by the iterator. Closing the iterator
+            stops the worker threads.
+
+            :param rootPath: The directory to walk.
+            :type rootPath: str
+
+            :returns: The files of the tree.
+            :rtype: Iterator[:class:`public.fileDescriptor.FileDescriptor`]
+        '''
+        if self._ordered:
+            return self._walkOrdered(rootPath)
+        else:
+            return self._walkUnordered(rootPath)
+
+    def _startWorkers(self, target: Callable[[], None]) -> List[Thread]:
+        workers = list(map(
+            lambda workerId: Thread(target=target, name='ParallelWalker-%d' % workerId, daemon=True),
+            range(self._workersCount)
+        ))
+        for worker in workers:
+            worker.start()
+        return workers
+
+    def _walkUnordered(self, rootPath: str) -> Iterator[FileDescriptor]:
+        condition = Condition()
+        stop = Event()
+        directories = [ rootPath ]
+        # Directories queued or being walked
+        pendingDirectories = 1
+        # Files batches (one per directory), bounded so a slow consumer holds the workers
+        batches = queue.Queue(maxsize=self._workersCount * 4)
+
+        def putBatch(batch) -> bool:
+            while not stop.is_set():
+                try:
+                    batches.put(batch, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def walkDirectory(path: str) -> None:
+            nonlocal pendingDirectories
+
+            files, subDirectories = self._scanDirectory(path)
+            if files and not putBatch(files):
+                return
+
+            walkedHere = []
+            with condition:
+                for subDirectory in subDirectories:
+                    if len(directories) < self._maxQueuedDirectories:
+                        directories.append(subDirectory)
+                        pendingDirectories += 1
+                        condition.notify()
+                    else:
+                        walkedHere.append(subDirectory)
+
+            for subDirectory in walkedHere:
+                if stop.is_set():
+                    return
+                walkDirectory(subDirectory)
+
+        def work() -> None:
+            nonlocal pendingDirectories
+
+            while True:
+                with condition:
+                    while not directories and pendingDirectories > 0 and not stop.is_set():
+                        condition.wait()
+                    if pendingDirectories == 0 or stop.is_set():
+                        return
+                    # Depth first, keeping the queue short
+                    path = directories.pop()
+
+                try:
+                    walkDirectory(path)
+                except Exception as ex:
+                    putBatch(ex)
+
+                with condition:
+                    pendingDirectories -= 1
+                    if pendingDirectories == 0:
+                        condition.notify_all()
+                        putBatch(_DONE)
+
+        workers = self._startWorkers(work)
+        try:
+            while True:
+                batch = batches.get()
+                if batch is _DONE:
+                    return
+                if isinstance(batch, Exception):
+                    raise batch
+                for fileDescriptor in batch:
+                    yield fileDescriptor
+        finally:
+            stop.set()
+            with condition:
+                condition.notify_all()
+            for worker in workers:
+                worker.join()
+
+    def _walkOrdered(self, rootPath: str) -> Iterator[FileDescriptor]:
+        condition = Condition()
+        stop = Event()
+        # Read ahead directories, not yet yielded
+        permits = Semaphore(self._maxQueuedDirectories)
+        # Directories to read, by walk order (depth first keys)
+        toScan = []
+
+        def scan(directory: _Directory) -> None:
+            try:
+                files, subDirectories = self._scanDirectory(directory.path)
+                directory.files = sorted(files, key=lambda fileDescriptor: fileDescriptor.name)
+                directory.children = list(map(
+                    lambda child: _Directory(directory.key + (child[0],), child[1]),
+                    enumerate(sorted(subDirectories))
+                ))
+            except Exception as ex:
+                directory.error = ex
+                directory.children = []
+
+            with condition:
+                directory.scanned = True
+                for child in directory.children:
+                    heapq.heappush(toScan, (child.key, child))
+                condition.notify_all()
+
+        def work() -> None:
+            while not stop.is_set():
+                if not permits.acquire(timeout=0.1):
+                    continue
+                with condition:
+                    while not toScan and not stop.is_set():
+                        condition.wait(timeout=0.1)
+                    if stop.is_set():
+                        permits.release()
+                        return
+                    _, directory = heapq.heappop(toScan)
+                    if directory.claimed:
+                        permits.release()
+                        continue
+                    directory.claimed = True
+                    directory.permit = True
+                scan(directory)
+
+        root = _Directory((), rootPath)
+        workers = self._startWorkers(work)
+        try:
+            walkStack = [ root ]
+            while walkStack:
+                directory = walkStack.pop()
+                with condition:
+                    scanHere = not directory.claimed
+                    directory.claimed = True
+                    while not scanHere and not directory.scanned:
+                        condition.wait()
+                if scanHere:
+                    # Not read ahead yet, read by the consumer
+                    scan(directory)
+                if directory.permit:
+                    permits.release()
+                if directory.error:
+                    raise directory.error
+
+                for fileDescriptor in directory.files:
+                    yield fileDescriptor
+                walkStack.extend(reversed(directory.children))
+                directory.files = directory.children = None
+        finally:
+            stop.set()
+            with condition:
+                condition.notify_all()
+            for worker in workers:
+                worker.join()
@@ -0,0 +1,92 @@
+import tempfile
+import json
+import os
+import unittest
+
+from lib.crawlJournal import CrawlJournal
+
+
+class CrawlJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journalPath = os.path.join(self.directory.name, 'journal', 'crawl.journal')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_resume(self):
+        journal = CrawlJournal(self.journalPath, batchSize=2)
+        journal.record('/data', '/data/a', CrawlJournal.ALL_MODULES, CrawlJournal.STATUS_DONE, 10, 1000)
+        journal.record('/data', '/data/b', 'module', CrawlJournal.STATUS_DONE, 20, 2000)
+        journal.record('/data', '/data/c', 'module', CrawlJournal.STATUS_ERROR, 30, 3000)
+        journal.record('/data', '/data/d', 'module', CrawlJournal.STATUS_INTERRUPTED, 40, 4000)
+        journal.close()
+
+        journal = CrawlJournal(self.journalPath)
+        self.assertEqual(len(journal), 2)
+        self.assertTrue(journal.isDone('/data', '/data/a', CrawlJournal.ALL_MODULES, 10, 1000))
+        self.assertTrue(journal.isDone('/data', '/data/b', 'module', 20, 2000))
+        self.assertFalse(journal.isDone('/data', '/data/b', 'other', 20, 2000))
+        self.assertFalse(journal.isDone('/other', '/data/b', 'module', 20, 2000))
+        self.assertFalse(journal.isDone('/data', '/data/c', 'module', 30, 3000))
+        self.assertFalse(journal.isDone('/data', '/data/d', 'module', 40, 4000))
+        journal.close()
+
+    def test_changedFilesAreRedone(self):
+        journal = CrawlJournal(self.journalPath)
+        journal.record('/data', '/data/a', 'module', CrawlJournal.STATUS_DONE, 10, 1000)
+        journal.close()
+
+        journal = CrawlJournal(self.journalPath)
+        self.assertFalse(journal.isDone('/data', '/data/a', 'module', 11, 1000))
+        self.assertFalse(journal.isDone('/data', '/data/a', 'module', 10, 1001))
+        self.assertFalse(journal.isDone('/data', '/data/a', 'module'))
+        journal.close()
+
+    def test_batchesAreWritten(self):
+        journal = CrawlJournal(self.journalPath, batchSize=2)
+        journal.record('/data', '/data/a', 'module', CrawlJournal.STATUS_DONE, 10, 1000)
+        self.assertEqual(os.path.getsize(self.journalPath), 0)
+        journal.record('/data', '/data/b', 'module', CrawlJournal.STATUS_DONE, 10, 1000)
+        self.assertGreater(os.path.getsize(self.journalPath), 0)
+
+        journal.record('/data', '/data/c', 'module', CrawlJournal.STATUS_DONE, 10, 1000)
+        journal.flush()
+        with open(self.journalPath, 'r', encoding='utf-8') as journalIO:
+            self.assertEqual(len(journalIO.readlines()), 3)
+        journal.close()
+
+    def test_invalidLines(self):
+        os.makedirs(os.path.dirname(self.journalPath))
+        with open(self.journalPath, 'w', encoding='utf-8') as journalIO:
+            # Previous format, without the file size and modification time
+            journalIO.write(json.dumps(['/data', '/data/a', 'module', CrawlJournal.STATUS_DONE]) + '\n')
+            journalIO.write(json.dumps(['/data', '/data/b', 'module', CrawlJournal.STATUS_DONE, 10, 1000]) + '\n')
+            # Interrupted write
+            journalIO.write('["/data", "/data/c", "mod')
+
+        journal = CrawlJournal(self.journalPath)
+        self.assertEqual(len(journal), 1)
+        self.assertFalse(journal.isDone('/data', '/data/a', 'module', 10, 1000))
+        self.assertTrue(journal.isDone('/data', '/data/b', 'module', 10, 1000))
+        journal.record('/data', '/data/c', 'module', CrawlJournal.STATUS_DONE, 10, 1000)
+        journal.close()
+
+        journal = CrawlJournal(self.journalPath)
+        self.assertTrue(journal.isDone('/data', '/data/c', 'module', 10, 1000))
+        journal.close()
+
+    def test_clear(self):
+        journal = CrawlJournal(self.journalPath)
+        journal.record('/data', '/data/a', 'module', CrawlJournal.STATUS_DONE, 10, 1000)
+        journal.clear()
+        self.assertFalse(os.path.exists(self.journalPath))
+
+        journal = CrawlJournal(self.journalPath)
+        self.assertEqual(len(journal), 0)
+        journal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import tempfile
+import shutil
+import time
+import os
+import unittest
+
+from public.directoryStates import DirectoryStates
+
+from tests.tools import makeTree, makeConfig, localModule
+
+
+class DirectoryStatesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.rootPath = os.path.join(self.directory.name, 'root')
+        os.mkdir(self.rootPath)
+        self.filePaths = makeTree(self.rootPath, directories=3, depth=2, files=2)
+        self.setOld()
+        self.states = {}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def setOld(self, age: float = 3600, directoryPaths: list = None):
+        # Directories modified long before the listing
+        oldTime = time.time() - age
+        for directoryPath in directoryPaths or map(lambda walked: walked[0], os.walk(self.rootPath)):
+            os.utime(directoryPath, (oldTime, oldTime))
+
+    def listFiles(self, workersCount: int = 1, failed: list = ()):
+        # Incremental listing, the states being saved as the dispatcher does
+        config = makeConfig(self.directory.name, {'listing': {'workersCount': workersCount}})
+        directoryStates = DirectoryStates(dict(self.states))
+        listing = sorted(map(
+            lambda fileDescriptor: fileDescriptor.fullPath,
+            localModule(self.rootPath, config).listFiles(directoryStates=directoryStates)
+        ))
+        for directoryPath in failed:
+            directoryStates.failed(directoryPath)
+
+        updated, removed = directoryStates.changes()
+        self.states.update(updated)
+        for directoryPath in removed:
+            del self.states[directoryPath]
+        return listing, directoryStates, updated, removed
+
+    def test_unchangedDirectoriesAreSkipped(self):
+        for workersCount in (1, 4):
+            self.states = {}
+            listing, _, _, _ = self.listFiles(workersCount=workersCount)
+            self.assertEqual(listing, sorted(self.filePaths))
+
+            listing, directoryStates, updated, removed = self.listFiles(workersCount=workersCount)
+            self.assertEqual(listing, [])
+            self.assertEqual((updated, removed), ({}, []))
+            self.assertEqual(directoryStates.skippedDirectories, len(self.states))
+            self.assertEqual(directoryStates.skippedFiles, len(self.filePaths))
+
+    def test_changedDirectoriesAreListed(self):
+        self.listFiles()
+        changedDirectory = os.path.join(self.rootPath, 'dir1', 'dir2')
+        newFile = os.path.join(changedDirectory, 'new.txt')
+        open(newFile, 'w').close()
+        shutil.rmtree(os.path.join(self.rootPath, 'dir2'))
+        self.setOld(age=1800, directoryPaths=[self.rootPath, changedDirectory])
+
+        listing, _, updated, removed = self.listFiles()
+        # The root lost a subdirectory
+        self.assertEqual(listing, sorted(filter(
+            lambda filePath: os.path.dirname(filePath) in (changedDirectory, self.rootPath),
+            self.filePaths + [newFile]
+        )))
+        self.assertEqual(sorted(updated.keys()), sorted([self.rootPath, changedDirectory]))
+        self.assertIn(os.path.join(self.rootPath, 'dir2'), removed)
+        self.assertIn(os.path.join(self.rootPath, 'dir2', 'dir0'), removed)
+
+    def test_sameEntriesAreNotListed(self):
+        self.listFiles()
+        # Modified, with the same entries (a file created then removed)
+        newFile = os.path.join(self.rootPath, 'dir0', 'new.txt')
+        open(newFile, 'w').close()
+        os.remove(newFile)
+        self.setOld(age=1800)
+        listing, directoryStates, updated, _ = self.listFiles()
+        self.assertEqual(listing, [])
+        self.assertIn(os.path.join(self.rootPath, 'dir0'), updated)
+        self.assertEqual(directoryStates.skippedFiles, len(self.filePaths))
+
+        # Modified in place, listed with the directory
+        with open(os.path.join(self.rootPath, 'dir0', 'file1.txt'), 'a') as fileIO:
+            fileIO.write('appended')
+        open(newFile, 'w').close()
+        os.remove(newFile)
+        self.setOld(age=900)
+        listing, _, _, _ = self.listFiles()
+        self.assertEqual(listing, [os.path.join(self.rootPath, 'dir0', 'file0.txt'), os.path.join(self.rootPath, 'dir0', 'file1.txt')])
+
+    def test_recentDirectoriesAreReadAgain(self):
+        self.listFiles()
+        recentDirectory = os.path.join(self.rootPath, 'dir0')
+        open(os.path.join(recentDirectory, 'new.txt'), 'w').close()
+
+        listing, _, updated, _ = self.listFiles()
+        self.assertIn(os.path.join(recentDirectory, 'new.txt'), listing)
+        # Its modification time not saved, read (not listed) on the next run
+        self.assertEqual(updated[recentDirectory][0], 0)
+
+        listing, directoryStates, _, _ = self.listFiles()
+        self.assertEqual(listing, [])
+        self.assertEqual(directoryStates.skippedDirectories, len(self.states) - 1)
+
+    def test_failedDirectoriesAreListedAgain(self):
+        failedDirectory = os.path.join(self.rootPath, 'dir1', 'dir1')
+        _, _, updated, _ = self.listFiles(failed=[failedDirectory])
+        self.assertEqual(updated[failedDirectory][0], 0)
+        self.assertEqual(updated[failedDirectory][2], '')
+
+        listing, _, _, _ = self.listFiles()
+        self.assertEqual(listing, sorted(filter(lambda filePath: os.path.dirname(filePath) == failedDirectory, self.filePaths)))
+
+        listing, _, _, _ = self.listFiles()
+        self.assertEqual(listing, [])
+
+    def test_digest(self):
+        fileDescriptors = list(localModule(self.rootPath, makeConfig(self.directory.name)).listFiles())[:3]
+        subDirectories = ['/data/a', '/data/b']
+        self.assertEqual(
+            DirectoryStates.digest(fileDescriptors, subDirectories),
+            DirectoryStates.digest(list(reversed(fileDescriptors)), list(reversed(subDirectories)))
+        )
+        self.assertNotEqual(
+            DirectoryStates.digest(fileDescriptors, subDirectories),
+            DirectoryStates.digest(fileDescriptors, subDirectories[:1])
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+from unittest import mock
+import tempfile
+import json
+import os
+import unittest
+
+from lib.dispatcherMetrics import DispatcherMetrics
+
+
+class DispatcherMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('lib.dispatcherMetrics.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record(self, metrics: DispatcherMetrics, module: str, count: int, interval: float, **kwargs):
+        # Files handled one after the other
+        for _ in range(count):
+            self.now += interval
+            metrics.recordHandle(module, '/data', queueWait=0.0, duration=interval, size=100, **kwargs)
+
+    def test_filesPerSecond(self):
+        metrics = DispatcherMetrics()
+        self.record(metrics, 'fast', 100, 0.1)
+        self.now += 1000
+        self.record(metrics, 'slow', 10, 1.0)
+
+        summary = dict(map(lambda module: (module['module'], module), metrics.toDict()['modules']))
+        # While each module ran, not over the whole run
+        self.assertAlmostEqual(summary['fast']['filesPerSecond'], 10.0)
+        self.assertAlmostEqual(summary['slow']['filesPerSecond'], 1.0)
+        self.assertEqual(summary['fast']['handledFileBytes'], 10000)
+        # Nothing recent for the first one
+        self.assertEqual(summary['fast']['recentFilesPerSecond'], 0.0)
+        self.assertAlmostEqual(summary['slow']['recentFilesPerSecond'], 1.0, places=1)
+
+    def test_recentFilesPerSecond(self):
+        metrics = DispatcherMetrics()
+        self.record(metrics, 'module', 600, 0.1)
+        self.record(metrics, 'module', 60, 1.0)
+        module = metrics.toDict()['modules'][0]
+        self.assertAlmostEqual(module['filesPerSecond'], 660 / 120)
+        self.assertAlmostEqual(module['recentFilesPerSecond'], 1.0, delta=0.2)
+
+    def test_prometheus(self):
+        metrics = DispatcherMetrics()
+        self.record(metrics, 'module', 3, 0.02, error=True)
+        self.record(metrics, 'module', 1, 2.0)
+        metrics.recordHandle('module', '/data/a "quoted"\\path\nwith a newline', 0.0, 0.1, 10)
+        lines = metrics.toPrometheus().splitlines()
+
+        self.assertIn('fileindexer_files_total{module="module",data_source="/data"} 4', lines)
+        self.assertIn('fileindexer_errors_total{module="module",data_source="/data"} 3', lines)
+        self.assertIn('fileindexer_handled_file_bytes_total{module="module",data_source="/data"} 400', lines)
+        self.assertIn('fileindexer_handle_duration_seconds_bucket{module="module",data_source="/data",le="0.05"} 3', lines)
+        self.assertIn('fileindexer_handle_duration_seconds_bucket{module="module",data_source="/data",le="1.0"} 3', lines)
+        self.assertIn('fileindexer_handle_duration_seconds_bucket{module="module",data_source="/data",le="+Inf"} 4', lines)
+        self.assertIn('fileindexer_files_total{module="module",data_source="/data/a \\"quoted\\"\\\\path\\nwith a newline"} 1', lines)
+        # One sample per line
+        self.assertTrue(all(map(lambda line: line.startswith('fileindexer_') or line.startswith('# '), lines)))
+
+    def test_writeSummary(self):
+        metrics = DispatcherMetrics()
+        self.record(metrics, 'module', 2, 0.5)
+        with tempfile.TemporaryDirectory() as directory:
+            summaryPath = os.path.join(directory, 'metrics', 'metrics.json')
+            metrics.writeSummary(summaryPath)
+            with open(summaryPath, 'r', encoding='utf-8') as summaryIO:
+                summary = json.load(summaryIO)
+        self.assertEqual(summary['modules'][0]['files'], 2)
+        self.assertEqual(summary['modules'][0]['handleDurationBuckets']['0.5'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+from unittest import mock
+import tempfile
+import os
+import unittest
+
+import yaml
+
+import fileIndexer
+from lib.database import getInitializedDb
+from lib.messageDispatcher import MessageDispatcher
+from modules.duplicateFileModule.module import DuplicateFileModule
+
+BLOCK_SIZE = 1024
+
+# name -> content
+FILES = {
+    'small-a': b'a' * 100,
+    'small-b': b'a' * 100,
+    'small-c': b'b' * 100,
+    'unique': b'a' * 150,
+    # First and last blocks shared by the three files, full hashes compared
+    'large-a': b'h' * BLOCK_SIZE + b'x' * BLOCK_SIZE * 2 + b't' * BLOCK_SIZE,
+    'large-b': b'h' * BLOCK_SIZE + b'x' * BLOCK_SIZE * 2 + b't' * BLOCK_SIZE,
+    'large-c': b'h' * BLOCK_SIZE + b'y' * BLOCK_SIZE * 2 + b't' * BLOCK_SIZE,
+    'large-d': b'H' * BLOCK_SIZE + b'x' * BLOCK_SIZE * 2 + b't' * BLOCK_SIZE,
+}
+
+
+class DuplicateFileModuleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dataPath = os.path.join(self.directory.name, 'data')
+        os.makedirs(os.path.join(self.dataPath, 'sub'))
+        for name, content in FILES.items():
+            # Duplicates across directories
+            with open(os.path.join(self.dataPath, 'sub' if name.endswith('-b') else '', name), 'wb') as fileIO:
+                fileIO.write(content)
+        self.dbEngine = None
+
+    def tearDown(self):
+        if self.dbEngine is not None:
+            self.dbEngine.dispose()
+        self.directory.cleanup()
+
+    def load(self, hashModule: bool = True) -> None:
+        configPath = os.path.join(self.directory.name, 'config.yaml')
+        with open(configPath, 'w') as configIO:
+            yaml.dump({
+                'global': {
+                    'sqliteDir': os.path.join(self.directory.name, 'db'),
+                    'fileHandleModules': ['modules.duplicateFileModule.DuplicateFileModule'] + (
+                        ['modules.hashFileModule.HashFileModule'] if hashModule else []
+                    ),
+                    'dataSources': [self.dataPath],
+                },
+                'duplicate': {'blockSize': BLOCK_SIZE},
+            }, configIO)
+        self.appConfig = fileIndexer.loadApplicationConfiguration(configPath)
+        self.dbEngine = getInitializedDb(self.appConfig)
+        self.module = self.appConfig.getFileHandleModuleByName('DuplicateFileModule')
+
+    def dispatch(self) -> list:
+        hashedFiles = []
+        hashFile = DuplicateFileModule.hashFile
+
+        def countingHashFile(fileDescriptor, algorithm, blockSize=None, **kwargs):
+            hashedFiles.append((fileDescriptor.name, blockSize is not None))
+            return hashFile(fileDescriptor, algorithm, blockSize=blockSize, **kwargs)
+
+        with mock.patch.object(DuplicateFileModule, 'hashFile', staticmethod(countingHashFile)):
+            MessageDispatcher(self.appConfig, appConfigLoader=fileIndexer.loadApplicationConfiguration).dispatch(self.dbEngine, self.appConfig)
+        return sorted(hashedFiles)
+
+    def duplicateGroups(self) -> list:
+        with self.dbEngine.connect() as dbConnection:
+            rows = dbConnection.execute(
+                'SELECT f.id_duplicate_group, c.filename FROM duplicate.duplicate_file f JOIN core.file c ON c.id = f.id_file'
+            )
+            groups = {}
+            for groupId, filename in rows:
+                groups.setdefault(groupId, []).append(filename)
+        return sorted(map(sorted, groups.values()))
+
+    def test_cascade(self):
+        self.load(hashModule=False)
+        hashedFiles = self.dispatch()
+        self.assertEqual(self.duplicateGroups(), [['large-a', 'large-b'], ['small-a', 'small-b']])
+
+        # Unique sizes never read, full hashes only for the same partial hashes
+        self.assertEqual(
+            list(filter(lambda hashed: hashed[1], hashedFiles)),
+            list(map(lambda name: (name, True), sorted(filter(lambda name: name != 'unique', FILES))))
+        )
+        self.assertEqual(
+            list(filter(lambda hashed: not hashed[1], hashedFiles)),
+            [('large-a', False), ('large-b', False), ('large-c', False)]
+        )
+
+    def test_hashModuleHashesAreUsed(self):
+        self.load()
+        hashedFiles = self.dispatch()
+        self.assertEqual(self.duplicateGroups(), [['large-a', 'large-b'], ['small-a', 'small-b']])
+        self.assertEqual(list(filter(lambda hashed: not hashed[1], hashedFiles)), [])
+
+    def test_partialHashesAreKept(self):
+        self.load()
+        self.dispatch()
+        # Full hashes kept by the hash module
+        self.assertEqual(self.dispatch(), [])
+        self.assertEqual(self.duplicateGroups(), [['large-a', 'large-b'], ['small-a', 'small-b']])
+
+        # A changed file is compared again
+        with open(os.path.join(self.dataPath, 'small-c'), 'wb') as fileIO:
+            fileIO.write(b'a' * 100)
+        self.assertEqual(self.dispatch(), [('small-c', True)])
+        self.assertEqual(self.duplicateGroups(), [['large-a', 'large-b'], ['small-a', 'small-b', 'small-c']])
+
+    def test_candidatesPages(self):
+        self.load()
+        self.dispatch()
+        dbQuerier = self.module.getDBQuerier(self.dbEngine, self.appConfig)
+        candidates = list(map(lambda candidate: (candidate['size'], candidate['filename']), dbQuerier.getCandidateFiles(1)))
+        self.assertEqual(sorted(candidates), sorted(map(
+            lambda name: (len(FILES[name]), name),
+            filter(lambda name: name != 'unique', FILES)
+        )))
+        self.assertEqual(list(map(lambda candidate: candidate[0], candidates)), sorted(map(lambda candidate: candidate[0], candidates)))
+
+        for sizesPerPage in (1, 2):
+            self.assertEqual(
+                sorted(map(lambda candidate: (candidate['size'], candidate['filename']), dbQuerier.getCandidateFiles(1, sizesPerPage=sizesPerPage))),
+                sorted(candidates)
+            )
+        self.assertEqual(list(dbQuerier.getCandidateFiles(len(FILES['large-a']) + 1)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
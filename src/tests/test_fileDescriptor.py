@@ -0,0 +1,174 @@
+from urllib.parse import urlparse
+from unittest import mock
+import tempfile
+import pickle
+import os
+import unittest
+
+import yaml
+
+from public.configHandler import ConfigHandler
+from public.fileDescriptor import FileDescriptor
+from public.modules.localFileSystemModule.localFileDescriptor import LocalFileDescriptor
+from public.modules.localFileSystemModule.module import LocalFileSystemModule
+
+
+class FileDescriptorMagicTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.opens = 0
+        self.detections = []
+
+        fileOpen = LocalFileDescriptor.open
+        detectMagic = FileDescriptor._detectMagic
+
+        def countingOpen(fileDescriptor, *args, **kwargs):
+            self.opens += 1
+            return fileOpen(fileDescriptor, *args, **kwargs)
+
+        def recordingDetectMagic(buffer):
+            self.detections.append(len(buffer))
+            return detectMagic(buffer)
+
+        for patcher in (
+            mock.patch.object(LocalFileDescriptor, 'open', countingOpen),
+            mock.patch.object(FileDescriptor, '_detectMagic', staticmethod(recordingDetectMagic)),
+            mock.patch.object(FileDescriptor, 'magicHeaderSize', 1024),
+            mock.patch.object(FileDescriptor, 'magicFallbackSize', 2048),
+            mock.patch.object(FileDescriptor, 'magicCache', None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def fileDescriptor(self, name: str, content: bytes) -> LocalFileDescriptor:
+        filePath = os.path.join(self.directory.name, name)
+        with open(filePath, 'wb') as fileIO:
+            fileIO.write(content)
+        return LocalFileDescriptor(filePath)
+
+    def test_singleRead(self):
+        content = 'héllo wörld\n'.encode('latin-1') * 200
+        fileDescriptor = self.fileDescriptor('text.txt', content)
+        self.assertEqual(
+            (fileDescriptor.mime, fileDescriptor.encoding, fileDescriptor.description),
+            ('text/plain', 'iso-8859-1', 'ISO-8859 text')
+        )
+        self.assertEqual(self.opens, 1)
+        self.assertEqual(self.detections, [1024])
+        # Kept for the modules reading the file
+        self.assertEqual(fileDescriptor.getHeader(), content[:1024])
+
+    def test_fallback(self):
+        fileDescriptor = self.fileDescriptor('data', b'\x00' * 3000)
+        self.assertEqual(fileDescriptor.mime, 'application/octet-stream')
+        self.assertEqual(self.opens, 1)
+        self.assertEqual(self.detections, [1024, 2048])
+        self.assertEqual(fileDescriptor.getHeader(), b'\x00' * 1024)
+
+    def test_noFallbackForSmallFiles(self):
+        fileDescriptor = self.fileDescriptor('data', b'\x00' * 100)
+        self.assertEqual(fileDescriptor.mime, 'application/octet-stream')
+        self.assertEqual(self.detections, [100])
+
+    def test_cachedInfos(self):
+        fileDescriptor = self.fileDescriptor('text.txt', b'text\n')
+        fileDescriptor.setCachedInfos(magicInfos=('text/plain', 'us-ascii', 'ASCII text'))
+        self.assertEqual(fileDescriptor.description, 'ASCII text')
+        self.assertEqual(self.opens, 0)
+
+        # Detected results given to the listing
+        detectedInfos = []
+        fileDescriptor = self.fileDescriptor('other.txt', b'text\n')
+        fileDescriptor.setCachedInfos(magicInfosCallback=detectedInfos.append)
+        self.assertEqual(fileDescriptor.mime, 'text/plain')
+        self.assertEqual(fileDescriptor.encoding, 'us-ascii')
+        self.assertEqual(detectedInfos, [('text/plain', 'us-ascii', 'ASCII text')])
+
+
+class ListedDescriptorsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dataPath = os.path.join(self.directory.name, 'data')
+        # path -> size
+        self.sizes = {}
+        for directory in ('', 'sub'):
+            os.makedirs(os.path.join(self.dataPath, directory), exist_ok=True)
+            for index in range(3):
+                filePath = os.path.join(self.dataPath, directory, 'file%d.txt' % index)
+                with open(filePath, 'w') as fileIO:
+                    fileIO.write('file %d\n' % index * (index + 1))
+                self.sizes[filePath] = len('file %d\n' % index) * (index + 1)
+
+        self.stats = []
+        stat = os.stat
+
+        def countingStat(path, *args, **kwargs):
+            self.stats.append(path)
+            return stat(path, *args, **kwargs)
+
+        patcher = mock.patch('os.stat', countingStat)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def listFiles(self, directoryFds: bool = False, **kwargs) -> list:
+        configPath = os.path.join(self.directory.name, 'config.yaml')
+        with open(configPath, 'w') as configIO:
+            yaml.dump({'global': {'listing': {'directoryFds': directoryFds}}}, configIO)
+        fileSystemModule = LocalFileSystemModule()
+        fileSystemModule.connect(urlparse('file://%s' % self.dataPath), ConfigHandler(configPath))
+        return list(fileSystemModule.listFiles(**kwargs))
+
+    def test_statFromTheListing(self):
+        for directoryFds in (False, True):
+            with self.subTest(directoryFds=directoryFds):
+                self.stats.clear()
+                fileDescriptors = self.listFiles(directoryFds=directoryFds)
+                self.assertEqual(
+                    dict(map(lambda fileDescriptor: (fileDescriptor.fullPath, fileDescriptor.stat.st_size), fileDescriptors)),
+                    self.sizes
+                )
+                for fileDescriptor in fileDescriptors:
+                    self.assertEqual(fileDescriptor.sizeKB, 0)
+                    self.assertIsNotNone(fileDescriptor.modificationDateTime)
+                self.assertEqual(self.stats, [])
+
+    def test_statOnFirstUse(self):
+        fileDescriptors = self.listFiles(withStat=False)
+        self.assertEqual(self.stats, [])
+        for fileDescriptor in fileDescriptors:
+            self.assertEqual(fileDescriptor.stat.st_size, self.sizes[fileDescriptor.fullPath])
+            self.assertIsNotNone(fileDescriptor.modificationDateTime)
+        # Once per file
+        self.assertEqual(len(self.stats), 6)
+
+    def test_compactDescriptors(self):
+        for directoryFds in (False, True):
+            with self.subTest(directoryFds=directoryFds):
+                fileDescriptor = self.listFiles(directoryFds=directoryFds)[0]
+                self.assertFalse(hasattr(fileDescriptor, '__dict__'))
+
+                # Sent to the process pool with its stat and magic results, not its content
+                fileDescriptor.dataSource = self.dataPath
+                mime = fileDescriptor.mime
+                self.assertIsNotNone(fileDescriptor.getContent())
+                copy = pickle.loads(pickle.dumps(fileDescriptor))
+                fileDescriptor.releaseContent()
+                self.stats.clear()
+                self.assertEqual(copy.fullPath, fileDescriptor.fullPath)
+                self.assertEqual(copy.dataSource, self.dataPath)
+                self.assertEqual(copy.stat, fileDescriptor.stat)
+                self.assertEqual(copy.mime, mime)
+                self.assertIsNone(getattr(copy, '_content', None))
+                self.assertEqual(self.stats, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import tempfile
+import time
+import os
+import unittest
+
+import sqlalchemy
+
+from lib.handleWatchdog import HandleWatchdog, criticalSection, guardEngine
+from public import HandleTimeoutError
+
+
+def _busy(seconds: float) -> None:
+    # Runs Python code, the timeout being raised in it
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+class HandleWatchdogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.watchdog = HandleWatchdog()
+        self.dbEngine = sqlalchemy.create_engine('sqlite:///%s' % os.path.join(self.directory.name, 'test.db'))
+        self.dbEngine.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+        guardEngine(self.dbEngine)
+
+    def tearDown(self):
+        self.dbEngine.dispose()
+        self.directory.cleanup()
+
+    def itemsCount(self) -> int:
+        return self.dbEngine.execute('SELECT COUNT(*) FROM item').scalar()
+
+    def test_timeout(self):
+        startTime = time.monotonic()
+        with self.assertRaises(HandleTimeoutError):
+            with self.watchdog.watch(0.1):
+                _busy(5)
+        self.assertLess(time.monotonic() - startTime, 1)
+
+        # Not raised once the block ended
+        with self.watchdog.watch(0.1):
+            pass
+        _busy(0.3)
+
+    def test_criticalSection(self):
+        completed = []
+        with self.assertRaises(HandleTimeoutError):
+            with self.watchdog.watch(0.1):
+                with criticalSection():
+                    _busy(0.3)
+                    completed.append(True)
+                completed.append(False)
+        self.assertEqual(completed, [True])
+
+    def test_transactionsAreNotInterrupted(self):
+        completed = []
+        with self.assertRaises(HandleTimeoutError):
+            with self.watchdog.watch(0.1):
+                with self.dbEngine.begin() as dbConnection:
+                    for _ in range(10):
+                        dbConnection.execute('INSERT INTO item DEFAULT VALUES')
+                        _busy(0.03)
+                completed.append(True)
+                # Raised after the connection is returned
+                _busy(5)
+                completed.append(False)
+        self.assertEqual(completed, [True])
+        self.assertEqual(self.itemsCount(), 10)
+
+    def test_connectionsAfterTheTimeout(self):
+        with self.assertRaises(HandleTimeoutError):
+            with self.watchdog.watch(0.1):
+                with self.dbEngine.connect() as dbConnection:
+                    dbConnection.execute('INSERT INTO item DEFAULT VALUES')
+                    _busy(0.2)
+                # Raised before running the query
+                self.dbEngine.execute('INSERT INTO item DEFAULT VALUES')
+        self.assertEqual(self.itemsCount(), 1)
+
+        # The engine is usable afterwards
+        self.dbEngine.execute('INSERT INTO item DEFAULT VALUES')
+        self.assertEqual(self.itemsCount(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
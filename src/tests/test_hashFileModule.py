@@ -0,0 +1,132 @@
+from unittest import mock
+import tempfile
+import hashlib
+import time
+import os
+import unittest
+
+import yaml
+
+import fileIndexer
+from lib.database import getInitializedDb
+from lib.messageDispatcher import MessageDispatcher
+from modules.hashFileModule.module import HashFileModule
+from modules.hashFileModule.rateLimiter import RateLimiter
+
+# name -> content, around the magic header size and the chunk size
+FILES = {
+    'empty': b'',
+    'short.txt': b'short\n',
+    'header.txt': b'h' * 1024,
+    'chunks.bin': bytes(range(256)) * 40,
+    'large.bin': os.urandom(200 * 1024),
+}
+
+
+class HashFileModuleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dataPath = os.path.join(self.directory.name, 'data')
+        os.mkdir(self.dataPath)
+        oldTime = time.time() - 3600
+        for name, content in FILES.items():
+            filePath = os.path.join(self.dataPath, name)
+            with open(filePath, 'wb') as fileIO:
+                fileIO.write(content)
+            # Old enough to be mapped
+            os.utime(filePath, (oldTime, oldTime))
+        self.dbEngines = []
+
+    def tearDown(self):
+        for dbEngine in self.dbEngines:
+            dbEngine.dispose()
+        self.directory.cleanup()
+
+    def dispatch(self, dbName: str = 'db', globalConfig: dict = None, hashConfig: dict = None) -> list:
+        '''
+            Runs the hash module on the data directory.
+
+            :returns: The names of the files hashed.
+        '''
+        configPath = os.path.join(self.directory.name, 'config.yaml')
+        with open(configPath, 'w') as configIO:
+            yaml.dump({
+                'global': dict({
+                    'sqliteDir': os.path.join(self.directory.name, dbName),
+                    'fileHandleModules': ['modules.hashFileModule.HashFileModule'],
+                    'dataSources': [self.dataPath],
+                }, **(globalConfig or {})),
+                'hash': hashConfig or {},
+            }, configIO)
+        appConfig = fileIndexer.loadApplicationConfiguration(configPath)
+        self.dbEngine = getInitializedDb(appConfig)
+        self.dbEngines.append(self.dbEngine)
+
+        hashedFiles = []
+        hashFile = HashFileModule.hashFile
+
+        def countingHashFile(module, fileDescriptor, *args, **kwargs):
+            hashedFiles.append(fileDescriptor.name)
+            return hashFile(module, fileDescriptor, *args, **kwargs)
+
+        with mock.patch.object(HashFileModule, 'hashFile', countingHashFile):
+            MessageDispatcher(appConfig).dispatch(self.dbEngine, appConfig)
+        return sorted(hashedFiles)
+
+    def fileHashes(self) -> dict:
+        with self.dbEngine.connect() as dbConnection:
+            return dict(dbConnection.execute('SELECT filename, hash FROM core.file').fetchall())
+
+    def test_hashes(self):
+        self.assertEqual(self.dispatch(), sorted(FILES))
+        self.assertEqual(self.fileHashes(), dict(map(
+            lambda name: (name, 'sha256:%s' % hashlib.sha256(FILES[name]).hexdigest()),
+            FILES
+        )))
+
+    def test_readModes(self):
+        expectedHashes = dict(map(lambda name: (name, 'sha256:%s' % hashlib.sha256(FILES[name]).hexdigest()), FILES))
+        # Mapped, streamed, and streamed by small chunks after the magic header
+        for dbName, globalConfig, hashConfig in (
+            ('mapped', {'mapMinSize': 1, 'mapMinAge': 0}, {}),
+            ('streamed', {'mapMinSize': 1024 * 1024 * 1024}, {}),
+            ('chunks', {'mapMinSize': 1024 * 1024 * 1024, 'contentBufferMaxSize': 0}, {'chunkSize': 1000}),
+        ):
+            with self.subTest(dbName):
+                self.dispatch(dbName, globalConfig, hashConfig)
+                self.assertEqual(self.fileHashes(), expectedHashes)
+
+    def test_unchangedFilesAreNotHashed(self):
+        self.dispatch()
+        self.assertEqual(self.dispatch(), [])
+
+        # Same size, newer content
+        with open(os.path.join(self.dataPath, 'short.txt'), 'wb') as fileIO:
+            fileIO.write(b'SHORT\n')
+        self.assertEqual(self.dispatch(), ['short.txt'])
+        self.assertEqual(self.fileHashes()['short.txt'], 'sha256:%s' % hashlib.sha256(b'SHORT\n').hexdigest())
+
+    def test_algorithmChange(self):
+        self.dispatch()
+        self.assertEqual(self.dispatch(hashConfig={'algorithm': 'blake2b'}), sorted(FILES))
+        self.assertEqual(self.fileHashes()['large.bin'], 'blake2b:%s' % hashlib.blake2b(FILES['large.bin']).hexdigest())
+        self.assertEqual(self.dispatch(hashConfig={'algorithm': 'blake2b'}), [])
+
+    def test_unsupportedAlgorithm(self):
+        # The error is logged, no file hashed
+        self.assertEqual(self.dispatch(hashConfig={'algorithm': 'md5'}), [])
+        self.assertEqual(set(self.fileHashes().values()), {None})
+
+    def test_rateLimiter(self):
+        rateLimiter = RateLimiter(100000)
+        startTime = time.monotonic()
+        # A second of burst, then half a second
+        rateLimiter.consume(100000)
+        self.assertLess(time.monotonic() - startTime, 0.1)
+        rateLimiter.consume(50000)
+        self.assertGreaterEqual(time.monotonic() - startTime, 0.45)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+from fnmatch import fnmatch
+import tempfile
+import os
+import unittest
+
+from public.ignoreMatcher import IgnoreMatcher
+
+from tests.tools import makeTree, makeConfig, localModule
+
+
+PATTERNS = ['*/.git/*', '*.pyc', '*/dir1/dir2', '*/dir3/file[01].txt', '*/dir0/*/dir1/*', '*~']
+
+PATHS = [
+    '/data/.git', '/data/.git/config', '/data/sub/.git/objects/ab', '/data/.gitignore',
+    '/data/a.pyc', '/data/a.py', '/data/a.pyc/b',
+    '/data/dir1/dir2', '/data/dir1/dir2/file', '/data/x/dir1/dir2', '/data/dir1/dir20',
+    '/data/dir3/file0.txt', '/data/dir3/file2.txt', '/data/dir3/file1.txt.bak',
+    '/data/dir0/dir2/dir1', '/data/dir0/dir2/dir1/file', '/data/dir0/dir1',
+    '/data/file~', '/data/~file',
+]
+
+
+def _originalListing(rootPath: str, patterns):
+    # Listing before the matcher : each entry matched against each pattern, ignored directories not listed
+    for entry in os.scandir(rootPath):
+        if not any(map(lambda pattern: fnmatch(entry.path, pattern), patterns)):
+            if entry.is_file(follow_symlinks=False):
+                yield entry.path
+            elif entry.is_dir(follow_symlinks=False):
+                yield from _originalListing(entry.path, patterns)
+
+
+class IgnoreMatcherTest(unittest.TestCase):
+
+    def test_sameMatchesAsFnmatch(self):
+        matcher = IgnoreMatcher(PATTERNS)
+        for path in PATHS:
+            self.assertEqual(matcher.matches(path), any(map(lambda pattern: fnmatch(path, pattern), PATTERNS)), path)
+
+    def test_prunes(self):
+        matcher = IgnoreMatcher(PATTERNS)
+        # Matching a pattern
+        self.assertTrue(matcher.prunes('/data/dir1/dir2'))
+        # All the content matching a pattern
+        self.assertTrue(matcher.prunes('/data/.git'))
+        self.assertTrue(matcher.prunes('/data/sub/.git'))
+        self.assertTrue(matcher.prunes('/data/dir0/dir2/dir1'))
+        self.assertFalse(matcher.prunes('/data/dir0/dir1'))
+        self.assertFalse(matcher.prunes('/data/.gitignore'))
+        self.assertFalse(matcher.prunes('/data/dir1'))
+
+    def test_noPatterns(self):
+        matcher = IgnoreMatcher.of([])
+        self.assertFalse(matcher.matches('/data/a'))
+        self.assertFalse(matcher.prunes('/data'))
+        self.assertIs(IgnoreMatcher.of(matcher), matcher)
+
+    def test_report(self):
+        matcher = IgnoreMatcher(['*.pyc', '*/.git/*', '*.py*'])
+        matcher.matches('/data/a.pyc')
+        matcher.matches('/data/b.pyc')
+        matcher.matches('/data/a.py')
+        matcher.matches('/data/a.txt')
+        matcher.prunes('/data/.git')
+        self.assertEqual(matcher.report(), [('*.pyc', 2), ('*/.git/*', 1), ('*.py*', 1)])
+
+
+class IgnoredListingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.rootPath = os.path.join(self.directory.name, 'root')
+        os.mkdir(self.rootPath)
+        makeTree(self.rootPath, directories=4, depth=3, files=3)
+        os.makedirs(os.path.join(self.rootPath, 'dir1', '.git', 'objects'))
+        for filePath in ('dir1/.git/config', 'dir1/.git/objects/ab', 'dir2/a.pyc', 'dir2/a.py', 'file~'):
+            open(os.path.join(self.rootPath, filePath), 'w').close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_sameFilesAsTheOriginalListing(self):
+        expected = sorted(_originalListing(self.rootPath, PATTERNS))
+        self.assertNotIn(os.path.join(self.rootPath, 'dir1', '.git', 'config'), expected)
+
+        for listingConfig in ({}, {'directoryFds': True}, {'workersCount': 4}, {'workersCount': 4, 'directoryFds': True}):
+            config = makeConfig(self.directory.name, {'listing': listingConfig})
+            listing = localModule(self.rootPath, config).listFiles(ignorePatterns=PATTERNS)
+            self.assertEqual(sorted(map(lambda fileDescriptor: fileDescriptor.fullPath, listing)), expected, listingConfig)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+from urllib.parse import urlparse
+import tempfile
+import shutil
+import time
+import os
+import unittest
+
+from public.configHandler import ConfigHandler
+from public.ignoreMatcher import IgnoreMatcher
+from public.modules.localFileSystemModule.inotifyWatcher import InotifyWatcher, IN_Q_OVERFLOW
+from public.modules.localFileSystemModule.module import LocalFileSystemModule
+
+
+class InotifyWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.rootPath = os.path.join(self.directory.name, 'root')
+        for directory in ('a', os.path.join('a', 'b'), 'c', 'ignored'):
+            os.makedirs(os.path.join(self.rootPath, directory))
+            self.write(os.path.join(directory, 'existing.txt'))
+        # Not recently modified, so that unchanged directories are not read again
+        oldTime = time.time() - 3600
+        for directory, _, _ in os.walk(self.rootPath):
+            os.utime(directory, (oldTime, oldTime))
+
+        try:
+            self.watcher = InotifyWatcher(self.rootPath, IgnoreMatcher.of(['*/ignored', '*.tmp']))
+        except NotImplementedError:
+            self.skipTest('inotify not available')
+        self.addCleanup(self.watcher.close)
+
+    def path(self, relativePath: str) -> str:
+        return os.path.join(self.rootPath, relativePath)
+
+    def write(self, relativePath: str, content: str = 'content\n') -> None:
+        with open(self.path(relativePath), 'w') as fileIO:
+            fileIO.write(content)
+
+    def changedFiles(self) -> list:
+        return sorted(set(self.watcher._changedFiles(self.watcher.readEvents(0.5))))
+
+    def test_watchedDirectories(self):
+        self.assertEqual(len(self.watcher), 4)
+
+    def test_changedFiles(self):
+        self.write(os.path.join('a', 'b', 'new.txt'))
+        self.write(os.path.join('c', 'existing.txt'), 'changed\n')
+        self.write(os.path.join('c', 'new.tmp'))
+        self.write(os.path.join('ignored', 'new.txt'))
+        self.assertEqual(self.changedFiles(), [self.path(os.path.join('a', 'b', 'new.txt')), self.path(os.path.join('c', 'existing.txt'))])
+
+    def test_newDirectories(self):
+        # Files created before the watch is added are reported too
+        os.makedirs(self.path(os.path.join('d', 'e')))
+        self.write(os.path.join('d', 'e', 'new.txt'))
+        self.assertEqual(self.changedFiles(), [self.path(os.path.join('d', 'e', 'new.txt'))])
+        self.assertEqual(len(self.watcher), 6)
+
+        self.write(os.path.join('d', 'e', 'other.txt'))
+        self.assertEqual(self.changedFiles(), [self.path(os.path.join('d', 'e', 'other.txt'))])
+
+    def test_movedDirectories(self):
+        shutil.move(self.path('a'), os.path.join(self.directory.name, 'a'))
+        self.assertEqual(self.changedFiles(), [])
+        self.assertEqual(len(self.watcher), 2)
+
+        shutil.move(os.path.join(self.directory.name, 'a'), self.path('moved'))
+        self.assertEqual(self.changedFiles(), [self.path(os.path.join('moved', 'b', 'existing.txt')), self.path(os.path.join('moved', 'existing.txt'))])
+        self.assertEqual(len(self.watcher), 4)
+
+    def test_overflow(self):
+        self.write(os.path.join('a', 'b', 'new.txt'))
+        os.makedirs(self.path('d'))
+        self.write(os.path.join('d', 'new.txt'))
+        # Events lost : the changed directories are read again
+        self.assertEqual(sorted(self.watcher._changedFiles([(None, IN_Q_OVERFLOW, '')])), [
+            self.path(os.path.join('a', 'b', 'existing.txt')),
+            self.path(os.path.join('a', 'b', 'new.txt')),
+            self.path(os.path.join('d', 'new.txt')),
+        ])
+        self.assertEqual(len(self.watcher), 5)
+
+    def test_batches(self):
+        batches = []
+        changes = self.watcher.changes(lambda: len(batches) > 0, debounceDelay=0.2, maxDelay=5)
+        self.write(os.path.join('a', 'new.txt'))
+        self.write(os.path.join('a', 'new.txt'), 'changed\n')
+        self.write(os.path.join('c', 'removed.txt'))
+        os.remove(self.path(os.path.join('c', 'removed.txt')))
+        batches.extend(changes)
+        # Coalesced, the removed files left out
+        self.assertEqual(batches, [[self.path(os.path.join('a', 'new.txt'))]])
+
+    def test_watchFiles(self):
+        configPath = os.path.join(self.directory.name, 'config.yaml')
+        with open(configPath, 'w') as configIO:
+            configIO.write('global: {}\n')
+        fileSystemModule = LocalFileSystemModule()
+        fileSystemModule.connect(urlparse('file://%s' % self.rootPath), ConfigHandler(configPath))
+
+        changes = fileSystemModule.watchFiles(ignorePatterns=['*.tmp'], debounceDelay=0.2)
+        try:
+            # Watching as soon as returned
+            self.write(os.path.join('c', 'new.txt'), 'new content\n')
+            self.write(os.path.join('c', 'new.tmp'))
+            fileDescriptors = next(changes)
+        finally:
+            changes.close()
+        self.assertEqual(list(map(lambda fileDescriptor: fileDescriptor.fullPath, fileDescriptors)), [self.path(os.path.join('c', 'new.txt'))])
+        self.assertEqual(fileDescriptors[0].stat.st_size, len('new content\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import tempfile
+import os
+import unittest
+
+from lib.listingCache import ListingCache
+from public.modules.localFileSystemModule.module import LocalFileSystemModule
+from public.modules.localFileSystemModule.localFileDescriptor import LocalFileDescriptor
+
+from tests.tools import makeTree, makeConfig, localModule
+
+_statFields = ('st_mode', 'st_ino', 'st_dev', 'st_size', 'st_mtime', 'st_ctime', 'st_mtime_ns', 'st_ctime_ns')
+
+
+class _NoSingleFileModule(LocalFileSystemModule):
+
+    def getFileDescriptor(self, fileFullPath: str):
+        raise NotImplementedError()
+
+
+class ListingCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.rootPath = os.path.join(self.directory.name, 'root')
+        os.mkdir(self.rootPath)
+        self.filePaths = makeTree(self.rootPath, directories=3, depth=2, files=4)
+        self.config = makeConfig(self.directory.name)
+        self.fileSystemModule = localModule(self.rootPath, self.config)
+        self.listing = list(map(lambda fileDescriptor: fileDescriptor.fullPath, self.fileSystemModule.listFiles()))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def newCache(self, fileSystemModule=None, **kwargs) -> ListingCache:
+        listingCache = ListingCache(fileSystemModule or self.fileSystemModule, [], False, spillDirectory=self.directory.name, **kwargs)
+        self.addCleanup(listingCache.close)
+        return listingCache
+
+    def assertSameStat(self, fileDescriptor):
+        expected = os.stat(fileDescriptor.fullPath)
+        for field in _statFields:
+            self.assertEqual(getattr(fileDescriptor.stat, field), getattr(expected, field), '%s of %s' % (field, fileDescriptor.fullPath))
+
+    def test_sameFilesAsTheListing(self):
+        self.assertEqual(sorted(self.listing), sorted(self.filePaths))
+
+        listingCache = self.newCache()
+        self.assertEqual(list(map(lambda fileDescriptor: fileDescriptor.fullPath, listingCache)), self.listing)
+        self.assertEqual(len(listingCache), len(self.listing))
+
+    def test_spilledRoundTrip(self):
+        listingCache = self.newCache(memoryRows=8, chunkRows=4)
+
+        for iteration in range(2):
+            fileDescriptors = list(listingCache)
+            self.assertEqual(list(map(lambda fileDescriptor: fileDescriptor.fullPath, fileDescriptors)), self.listing)
+            for fileDescriptor in fileDescriptors:
+                self.assertIsInstance(fileDescriptor, LocalFileDescriptor)
+                self.assertSameStat(fileDescriptor)
+
+        # Chunks over the memory limit have been written to the temporary file
+        self.assertGreater(len(listingCache._chunks) - listingCache._memoryChunks, 0)
+
+    def test_concurrentIterators(self):
+        listingCache = self.newCache(memoryRows=8, chunkRows=4)
+        first = iter(listingCache)
+        second = iter(listingCache)
+
+        paths = ([], [])
+        for firstDescriptor, secondDescriptor in zip(first, second):
+            paths[0].append(firstDescriptor.fullPath)
+            paths[1].append(secondDescriptor.fullPath)
+            paths[0].append(next(first).fullPath)
+        paths[0].extend(map(lambda fileDescriptor: fileDescriptor.fullPath, first))
+        paths[1].extend(map(lambda fileDescriptor: fileDescriptor.fullPath, second))
+
+        self.assertEqual(paths[0], self.listing)
+        self.assertEqual(paths[1], self.listing)
+
+    def test_magicInfosAreCached(self):
+        listingCache = self.newCache(memoryRows=8, chunkRows=4)
+        mimes = list(map(lambda fileDescriptor: fileDescriptor.mime, listingCache))
+        self.assertEqual(mimes, list(map(lambda filePath: LocalFileDescriptor(filePath).mime, self.listing)))
+
+        for fileDescriptor, mime in zip(listingCache, mimes):
+            self.assertEqual(fileDescriptor._cachedMagicInfos[0], mime)
+
+    def test_descriptorsKept(self):
+        fileSystemModule = localModule(self.rootPath, self.config, moduleClass=_NoSingleFileModule)
+        listingCache = self.newCache(fileSystemModule=fileSystemModule, memoryRows=8, chunkRows=4)
+
+        first = list(listingCache)
+        self.assertEqual(list(map(lambda fileDescriptor: fileDescriptor.fullPath, first)), self.listing)
+        self.assertEqual(list(listingCache), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
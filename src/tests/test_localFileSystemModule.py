@@ -0,0 +1,108 @@
+from urllib.parse import urlparse
+from unittest import mock
+import tempfile
+import pickle
+import gc
+import os
+import unittest
+
+import yaml
+
+from public.configHandler import ConfigHandler
+from public.modules.localFileSystemModule.localFileDescriptor import DirectoryHandle, LocalFileDescriptor, LocalRelativeFileDescriptor
+from public.modules.localFileSystemModule.module import LocalFileSystemModule
+
+# relative path -> content, a directory without files
+FILES = {
+    'root.txt': b'root\n',
+    os.path.join('a', 'a.txt'): b'a\n' * 10,
+    os.path.join('a', 'b', 'b.txt'): b'b\n' * 20,
+    os.path.join('a', 'b', 'c', 'd', 'd.txt'): b'd\n' * 30,
+    os.path.join('e', 'e.txt'): b'e\n' * 40,
+}
+
+
+class DirectoryFdsListingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dataPath = os.path.join(self.directory.name, 'data')
+        for relativePath, content in FILES.items():
+            os.makedirs(os.path.join(self.dataPath, os.path.dirname(relativePath)), exist_ok=True)
+            with open(os.path.join(self.dataPath, relativePath), 'wb') as fileIO:
+                fileIO.write(content)
+
+        configPath = os.path.join(self.directory.name, 'config.yaml')
+        with open(configPath, 'w') as configIO:
+            yaml.dump({'global': {'listing': {'directoryFds': True}}}, configIO)
+        self.fileSystemModule = LocalFileSystemModule()
+        self.fileSystemModule.connect(urlparse('file://%s' % self.dataPath), ConfigHandler(configPath))
+        self.openCount = DirectoryHandle.openCount()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def listFiles(self) -> dict:
+        return dict(map(
+            lambda fileDescriptor: (os.path.relpath(fileDescriptor.fullPath, self.dataPath), fileDescriptor),
+            self.fileSystemModule.listFiles()
+        ))
+
+    def test_relativeDescriptors(self):
+        fileDescriptors = self.listFiles()
+        self.assertEqual(sorted(fileDescriptors), sorted(FILES))
+        for relativePath, fileDescriptor in fileDescriptors.items():
+            self.assertIsInstance(fileDescriptor, LocalRelativeFileDescriptor)
+            self.assertEqual(fileDescriptor.name, os.path.basename(relativePath))
+            self.assertEqual(fileDescriptor.path, os.path.dirname(os.path.join(self.dataPath, relativePath)))
+            self.assertEqual(fileDescriptor.stat.st_ino, os.stat(fileDescriptor.fullPath).st_ino)
+            with fileDescriptor.open() as fileIO:
+                self.assertEqual(fileIO.read(), FILES[relativePath])
+            with fileDescriptor.openMapped() as fileIO:
+                self.assertEqual(fileIO.read(), FILES[relativePath])
+            self.assertEqual(bytes(fileDescriptor.getContent()), FILES[relativePath])
+            fileDescriptor.releaseContent()
+
+    def test_openedRelativelyToTheDirectory(self):
+        fileDescriptors = self.listFiles()
+        os.rename(self.dataPath, os.path.join(self.directory.name, 'renamed'))
+        # The path is not resolved again
+        fileDescriptor = fileDescriptors[os.path.join('a', 'b', 'c', 'd', 'd.txt')]
+        with fileDescriptor.open() as fileIO:
+            self.assertEqual(fileIO.read(), FILES[os.path.join('a', 'b', 'c', 'd', 'd.txt')])
+
+    def test_directoriesClosed(self):
+        fileDescriptors = self.listFiles()
+        # Kept open by their files only
+        self.assertEqual(DirectoryHandle.openCount() - self.openCount, len(FILES))
+        del fileDescriptors
+        gc.collect()
+        self.assertEqual(DirectoryHandle.openCount(), self.openCount)
+
+    def test_openDirectoriesLimit(self):
+        with mock.patch('public.modules.localFileSystemModule.module.resource.getrlimit', return_value=(self.openCount * 2 + 4, 1024)):
+            fileDescriptors = self.listFiles()
+        # Once the limit reached, listed by path
+        self.assertEqual(sorted(fileDescriptors), sorted(FILES))
+        self.assertEqual(DirectoryHandle.openCount() - self.openCount, 2)
+        self.assertEqual(len(list(filter(lambda fileDescriptor: type(fileDescriptor) is LocalFileDescriptor, fileDescriptors.values()))), 3)
+        for relativePath, fileDescriptor in fileDescriptors.items():
+            with fileDescriptor.open() as fileIO:
+                self.assertEqual(fileIO.read(), FILES[relativePath])
+
+    def test_pickled(self):
+        fileDescriptor = self.listFiles()[os.path.join('a', 'a.txt')]
+        with self.assertRaises(TypeError):
+            pickle.dumps(fileDescriptor._directory)
+
+        # Opened by path in the other process
+        copy = pickle.loads(pickle.dumps(fileDescriptor))
+        self.assertEqual(copy.fullPath, fileDescriptor.fullPath)
+        self.assertEqual(copy.path, fileDescriptor.path)
+        self.assertEqual(copy.stat, fileDescriptor.stat)
+        with copy.open() as fileIO:
+            self.assertEqual(fileIO.read(), FILES[os.path.join('a', 'a.txt')])
+
+
+if __name__ == '__main__':
+    unittest.main()
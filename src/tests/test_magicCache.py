@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor
+import tempfile
+import sqlite3
+import os
+import unittest
+
+from lib.magicCache import MagicCache
+from public.modules.localFileSystemModule.localFileDescriptor import LocalFileDescriptor
+
+from tests.tools import makeTree
+
+
+MAGIC_INFOS = ('text/plain', 'us-ascii', 'ASCII text')
+
+
+class MagicCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.rootPath = os.path.join(self.directory.name, 'root')
+        os.mkdir(self.rootPath)
+        self.filePaths = makeTree(self.rootPath, directories=3, depth=2, files=3)
+        self.cachePath = os.path.join(self.directory.name, 'magic.cache')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def storedCount(self) -> int:
+        with sqlite3.connect(self.cachePath) as connection:
+            return connection.execute('SELECT COUNT(*) FROM magic').fetchone()[0]
+
+    def test_cachedResults(self):
+        magicCache = MagicCache(self.cachePath)
+        for filePath in self.filePaths:
+            self.assertIsNone(magicCache.get(LocalFileDescriptor(filePath)))
+            magicCache.put(LocalFileDescriptor(filePath), MAGIC_INFOS)
+        for filePath in self.filePaths:
+            self.assertEqual(magicCache.get(LocalFileDescriptor(filePath)), MAGIC_INFOS)
+        magicCache.close()
+
+        # Stored, a changed file detected again
+        with open(self.filePaths[0], 'a') as fileIO:
+            fileIO.write('changed')
+        magicCache = MagicCache(self.cachePath)
+        self.assertIsNone(magicCache.get(LocalFileDescriptor(self.filePaths[0])))
+        for filePath in self.filePaths[1:]:
+            self.assertEqual(magicCache.get(LocalFileDescriptor(filePath)), MAGIC_INFOS)
+        magicCache.close()
+        self.assertEqual((magicCache.hits, magicCache.misses), (len(self.filePaths) - 1, 1))
+
+    def test_pendingResultsAreVisible(self):
+        # Not written, the directories being evicted and loaded again
+        magicCache = MagicCache(self.cachePath, batchSize=100000, cachedDirectories=1, flushInterval=3600)
+        for filePath in self.filePaths:
+            magicCache.put(LocalFileDescriptor(filePath), MAGIC_INFOS)
+        self.assertEqual(self.storedCount(), 0)
+
+        for filePath in self.filePaths:
+            self.assertEqual(magicCache.get(LocalFileDescriptor(filePath)), MAGIC_INFOS)
+        self.assertEqual(self.storedCount(), 0)
+        magicCache.close()
+        self.assertEqual(self.storedCount(), len(self.filePaths))
+
+    def test_batches(self):
+        magicCache = MagicCache(self.cachePath, batchSize=10, flushInterval=3600)
+        for filePath in self.filePaths[:25]:
+            magicCache.put(LocalFileDescriptor(filePath), MAGIC_INFOS)
+        self.assertEqual(self.storedCount(), 20)
+        magicCache.close()
+
+        # Written after the flush interval
+        magicCache = MagicCache(self.cachePath, batchSize=100000, flushInterval=0)
+        magicCache.put(LocalFileDescriptor(self.filePaths[30]), MAGIC_INFOS)
+        self.assertEqual(self.storedCount(), 26)
+        magicCache.close()
+
+    def test_concurrentAccess(self):
+        magicCache = MagicCache(self.cachePath, batchSize=5, cachedDirectories=2)
+
+        def detect(filePath: str):
+            fileDescriptor = LocalFileDescriptor(filePath)
+            magicInfos = magicCache.get(fileDescriptor)
+            if magicInfos is None:
+                magicCache.put(fileDescriptor, MAGIC_INFOS)
+                return False
+            return magicInfos == MAGIC_INFOS
+
+        with ThreadPoolExecutor(8) as executor:
+            self.assertFalse(any(executor.map(detect, self.filePaths)))
+            self.assertTrue(all(executor.map(detect, self.filePaths)))
+        magicCache.close()
+        self.assertEqual(self.storedCount(), len(self.filePaths))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+from multiprocessing import get_context
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import tempfile
+import threading
+import os
+import unittest
+
+import magic
+
+import public.magicTools as magicTools
+from public.fileDescriptor import FileDescriptor
+from public.modules.localFileSystemModule.localFileDescriptor import LocalFileDescriptor
+
+# buffer -> mime
+BUFFERS = {
+    b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n1 0 obj\n<< /Type /Catalog >>\nendobj\n': 'application/pdf',
+    b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x02\x00\x00\x00\x90wS\xde': 'image/png',
+    b'<html><head><title>page</title></head><body></body></html>\n': 'text/html',
+    b'plain text\n' * 10: 'text/plain',
+}
+
+
+# file name -> header, known by the fast path
+HEADERS = {
+    'document.pdf': b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n',
+    'image.PNG': b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x02\x00\x00\x00\x90wS\xde',
+    'image.gif': b'GIF89a\x01\x00\x01\x00\x80\x00\x00' + b'\x00' * 60,
+    'image.webp': b'RIFF\x24\x00\x00\x00WEBPVP8 ' + b'\x00' * 60,
+    'sound.flac': b'fLaC\x00\x00\x00\x22' + b'\x00' * 60,
+}
+
+
+def _detectMimes() -> list:
+    return list(map(lambda buffer: FileDescriptor._detectMagic(buffer)[0], BUFFERS))
+
+
+class MagicToolsTest(unittest.TestCase):
+
+    def test_handlesPerThread(self):
+        handle = magicTools.getMagic(magic.MIME)
+        self.assertIs(magicTools.getMagic(magic.MIME), handle)
+        self.assertIsNot(magicTools.getMagic(magic.NONE), handle)
+
+        threadHandles = []
+        thread = threading.Thread(target=lambda: threadHandles.append(magicTools.getMagic(magic.MIME)))
+        thread.start()
+        thread.join()
+        self.assertIsNot(threadHandles[0], handle)
+
+    def test_concurrentDetections(self):
+        expected = list(BUFFERS.values())
+        self.assertEqual(_detectMimes(), expected)
+
+        # Without the module lock
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda _: _detectMimes(), range(64)))
+        self.assertEqual(results, [expected] * 64)
+
+    def test_handlesAfterFork(self):
+        # Loaded in this process, loaded again by the child processes
+        magicTools.getMagic(magic.MIME)
+        with get_context('fork').Pool(2) as pool:
+            self.assertEqual(pool.apply(_detectMimes), list(BUFFERS.values()))
+
+
+class FastPathTest(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(magicTools.setFastPathMode, magicTools.getFastPathMode())
+
+    def test_sameMimesAsLibmagic(self):
+        for name, header in HEADERS.items():
+            with self.subTest(name):
+                fastMagicInfos = magicTools.fastDetect(name, header)
+                self.assertIsNotNone(fastMagicInfos)
+                self.assertEqual(fastMagicInfos[0], FileDescriptor._detectMagic(header)[0])
+                self.assertEqual(fastMagicInfos[1], 'binary')
+
+    def test_libmagicCases(self):
+        pngHeader = HEADERS['image.PNG']
+        # Extension and signature not matching
+        self.assertIsNone(magicTools.fastDetect('image.jpg', pngHeader))
+        self.assertIsNone(magicTools.fastDetect('image.png', b'not a png'))
+        # Unknown extension, no extension
+        self.assertIsNone(magicTools.fastDetect('image.bmp', pngHeader))
+        self.assertIsNone(magicTools.fastDetect('image', pngHeader))
+        # Second part of the signature missing
+        self.assertIsNone(magicTools.fastDetect('book.epub', b'PK\x03\x04' + b'\x00' * 60))
+        self.assertIsNone(magicTools.fastDetect('image.webp', b'RIFF\x24\x00\x00\x00WAVEfmt ' + b'\x00' * 60))
+
+    def test_modes(self):
+        magicTools.setFastPathMode(True)
+        self.assertEqual(magicTools.getFastPathMode(), magicTools.FAST_PATH_ON)
+        magicTools.setFastPathMode(False)
+        self.assertEqual(magicTools.getFastPathMode(), magicTools.FAST_PATH_OFF)
+        with self.assertRaises(ValueError):
+            magicTools.setFastPathMode('always')
+
+    def test_fileDescriptors(self):
+        detectMagic = FileDescriptor._detectMagic
+        detections = []
+
+        def recordingDetectMagic(buffer):
+            detections.append(buffer)
+            return detectMagic(buffer)
+
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(FileDescriptor, '_detectMagic', staticmethod(recordingDetectMagic)), \
+                mock.patch.object(FileDescriptor, 'magicCache', None):
+            for name, content in (('document.pdf', HEADERS['document.pdf']), ('text.txt', b'text\n')):
+                with open(os.path.join(directory, name), 'wb') as fileIO:
+                    fileIO.write(content)
+
+            def detect(mode: str) -> list:
+                magicTools.setFastPathMode(mode)
+                stats = magicTools.getFastPathStats()
+                detections.clear()
+                mimes = list(map(lambda name: LocalFileDescriptor(os.path.join(directory, name)).mime, ('document.pdf', 'text.txt')))
+                self.assertEqual(mimes, ['application/pdf', 'text/plain'])
+                return list(map(lambda counter: magicTools.getFastPathStats()[counter] - stats[counter], sorted(stats)))
+
+            # agreements, disagreements, hits, misses
+            self.assertEqual(detect(magicTools.FAST_PATH_OFF), [0, 0, 0, 0])
+            self.assertEqual(len(detections), 2)
+            self.assertEqual(detect(magicTools.FAST_PATH_ON), [0, 0, 1, 1])
+            self.assertEqual(detections, [b'text\n'])
+            self.assertEqual(detect(magicTools.FAST_PATH_VERIFY), [1, 0, 1, 1])
+            self.assertEqual(len(detections), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
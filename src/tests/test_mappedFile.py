@@ -0,0 +1,123 @@
+import tempfile
+import mmap
+import time
+import io
+import os
+import unittest
+
+import public.mappedFile as mappedFile
+from public.mappedFile import MappedFile, mapFile, openMappedFile, setMapPolicy
+
+
+CONTENT = b''.join(b'line %d %s\n' % (index, b'x' * (index % 50)) for index in range(4000)) + b'no end of line'
+
+
+def _operations(fileIO):
+    # Same operations on a MappedFile and a BytesIO
+    results = []
+    results.append(fileIO.read(10))
+    results.append(fileIO.readline())
+    results.append(fileIO.readline(5))
+    results.append(fileIO.tell())
+    results.append(fileIO.seek(100))
+    results.append(fileIO.read(0))
+    buffer = bytearray(64)
+    results.append(fileIO.readinto(buffer))
+    results.append(bytes(buffer))
+    results.append(fileIO.seek(-20, io.SEEK_END))
+    results.append(fileIO.readline())
+    results.append(fileIO.readline())
+    results.append(fileIO.read())
+    results.append(fileIO.seek(10, io.SEEK_SET))
+    results.append(fileIO.seek(15, io.SEEK_CUR))
+    results.append(fileIO.readlines()[:3])
+    results.append(fileIO.seek(len(CONTENT) + 10))
+    results.append(fileIO.read())
+    results.append(fileIO.readinto(buffer))
+    fileIO.seek(0)
+    results.append(list(fileIO)[-2:])
+    return results
+
+
+class MappedFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filePath = os.path.join(self.directory.name, 'file')
+        with open(self.filePath, 'wb') as fileIO:
+            fileIO.write(CONTENT)
+        self.setAge(3600)
+
+    def tearDown(self):
+        setMapPolicy(64 * 1024, 60.0)
+        self.directory.cleanup()
+
+    def setAge(self, age: float):
+        fileTime = time.time() - age
+        os.utime(self.filePath, (fileTime, fileTime))
+
+    def test_readsAsBytesIO(self):
+        self.assertEqual(_operations(MappedFile(CONTENT)), _operations(io.BytesIO(CONTENT)))
+
+    def test_readsTheMap(self):
+        buffer = mapFile(self.filePath)
+        self.assertIsInstance(buffer, mmap.mmap)
+        with MappedFile(buffer, closeBuffer=True) as fileIO:
+            self.assertEqual(_operations(fileIO), _operations(io.BytesIO(CONTENT)))
+        self.assertTrue(buffer.closed)
+
+    def test_invalidSeek(self):
+        fileIO = MappedFile(CONTENT)
+        with self.assertRaises(ValueError):
+            fileIO.seek(-1)
+        with self.assertRaises(ValueError):
+            fileIO.seek(0, 3)
+
+    def test_closed(self):
+        fileIO = MappedFile(CONTENT)
+        fileIO.close()
+        with self.assertRaises(ValueError):
+            fileIO.read()
+
+    def test_smallFilesAreRead(self):
+        setMapPolicy(len(CONTENT) + 1, 0)
+        self.assertEqual(mapFile(self.filePath), CONTENT)
+        self.assertNotIsInstance(mapFile(self.filePath), mmap.mmap)
+
+    def test_recentFilesAreRead(self):
+        self.setAge(0)
+        self.assertEqual(mapFile(self.filePath), CONTENT)
+        self.assertNotIsInstance(mapFile(self.filePath), mmap.mmap)
+
+        with openMappedFile(self.filePath, access=mappedFile.ACCESS_SEQUENTIAL) as fileIO:
+            self.assertNotIsInstance(fileIO, MappedFile)
+            self.assertEqual(fileIO.read(), CONTENT)
+
+    def test_emptyFile(self):
+        open(self.filePath, 'wb').close()
+        self.setAge(3600)
+        self.assertEqual(mapFile(self.filePath), b'')
+        with openMappedFile(self.filePath) as fileIO:
+            self.assertEqual(fileIO.read(), b'')
+
+    def test_openMappedFile(self):
+        with openMappedFile(self.filePath, name='file', access=mappedFile.ACCESS_RANDOM) as fileIO:
+            self.assertIsInstance(fileIO, MappedFile)
+            self.assertEqual(fileIO.name, 'file')
+            self.assertEqual(_operations(fileIO), _operations(io.BytesIO(CONTENT)))
+
+        with self.assertRaises(ValueError):
+            openMappedFile(self.filePath, access='unknown')
+
+    def test_relativeToDirectory(self):
+        directoryFd = os.open(self.directory.name, os.O_RDONLY)
+        try:
+            self.assertEqual(bytes(mapFile('file', dirFd=directoryFd)), CONTENT)
+            with openMappedFile('file', dirFd=directoryFd) as fileIO:
+                self.assertEqual(fileIO.read(), CONTENT)
+        finally:
+            os.close(directoryFd)
+
+
+if __name__ == '__main__':
+    unittest.main()
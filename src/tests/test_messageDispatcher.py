@@ -0,0 +1,434 @@
+from typing import Iterable, Dict
+from unittest import mock
+import tempfile
+import errno
+import time
+import threading
+import shutil
+import os
+import unittest
+
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
+import yaml
+
+import fileIndexer
+from lib.database import getInitializedDb
+from lib.database.dbInitializer import initializeDb
+from lib.messageDispatcher import MessageDispatcher
+from public import FileHandleModule, ConfigHandler, FileDescriptor, ConfiguratonError
+from public.modules.coreModule import CoreModule
+from public.modules.localFileSystemModule.localFileDescriptor import LocalFileDescriptor
+
+
+class RecorderModule(FileHandleModule):
+    '''
+        Records each file it handles (``recorder.handled``), with the process
+        that handled it. The file must already be in the core module tables.
+    '''
+
+    def __init__(self):
+        self.tables = {}
+
+    @staticmethod
+    def handledFileMimes() -> str or Iterable[str]:
+        return '*'
+
+    def requiredModules(self) -> Iterable[str] or None:
+        return [
+            'CoreModule'
+        ]
+
+    def getDatabaseSchema(self) -> str:
+        return 'recorder'
+
+    def defineTables(self, metadata: sqlalchemy.MetaData, configuration: ConfigHandler) -> None:
+        coreModuleTables = configuration.getFileHandleModuleByName('CoreModule').getSharedTables()
+        self.tables['handled'] = sqlalchemy.Table('handled', metadata,
+            sqlalchemy.Column('id', sqlalchemy.Integer, sqlalchemy.Sequence('handled_id_seq'), primary_key=True),
+            sqlalchemy.Column('id_file', sqlalchemy.Integer, sqlalchemy.ForeignKey(coreModuleTables['file'].c.id), nullable=False),
+            sqlalchemy.Column('pid', sqlalchemy.Integer, nullable=False)
+        )
+
+    def getSharedTables(self) -> Dict[str, sqlalchemy.Table]:
+        return self.tables.copy()
+
+    def canHandle(self, fileDescriptor: FileDescriptor) -> bool:
+        return True
+
+    def handle(self, fileDescriptor: FileDescriptor, dbEngine: sqlalchemy.engine.Engine, appConfig: ConfigHandler) -> None:
+        fileEntity = appConfig.getFileHandleModuleByName('CoreModule').getDBQuerier(dbEngine, appConfig).getFileHash(fileDescriptor)
+        if not fileEntity:
+            raise RuntimeError('File [%s] handled before the core module' % fileDescriptor.fullPath)
+        with dbEngine.begin() as dbConnection:
+            dbConnection.execute(self.tables['handled'].insert().values(id_file=fileEntity['id'], pid=os.getpid()))
+
+
+class ProcessRecorderModule(RecorderModule):
+    '''
+        The recorder module, run in the process pool.
+    '''
+
+    def getDatabaseSchema(self) -> str:
+        return 'process_recorder'
+
+    def runInProcessPool(self) -> bool:
+        return True
+
+
+def makeFiles(dataPath: str) -> list:
+    # Two levels of directories, files of different types
+    filenames = []
+    for directory in ('', 'a', os.path.join('a', 'b'), 'c'):
+        os.makedirs(os.path.join(dataPath, directory), exist_ok=True)
+        for index in range(5):
+            filename = 'file-%s-%d.%s' % (directory.replace(os.sep, '') or 'root', index, ('txt', 'csv', 'html')[index % 3])
+            with open(os.path.join(dataPath, directory, filename), 'w') as fileIO:
+                fileIO.write('%s\n' % filename * (index + 1))
+            filenames.append(filename)
+    return sorted(filenames)
+
+
+class MessageDispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dbPath = os.path.join(self.directory.name, 'db')
+        self.dataPath = os.path.join(self.directory.name, 'data')
+        self.filenames = makeFiles(self.dataPath)
+        self.dbEngine = None
+
+    def tearDown(self):
+        if self.dbEngine is not None:
+            self.dbEngine.dispose()
+        self.directory.cleanup()
+
+    def load(self, parallel: bool = False, **globalConfig) -> None:
+        configPath = os.path.join(self.directory.name, 'config.yaml')
+        with open(configPath, 'w') as configIO:
+            yaml.dump({
+                'global': dict({
+                    'sqliteDir': self.dbPath,
+                    'fileHandleModules': ['tests.test_messageDispatcher.RecorderModule'],
+                    'dataSources': [self.dataPath],
+                    'workersCount': 4,
+                }, **globalConfig),
+            }, configIO)
+        self.appConfig = fileIndexer.loadApplicationConfiguration(configPath)
+        self.parallel = parallel
+
+        if parallel:
+            # The in-memory database can not be shared by threads : the
+            # schemas files are attached to each connection
+            self.dbEngine = sqlalchemy.create_engine(
+                'sqlite:///%s' % os.path.join(self.dbPath, 'main.db'),
+                poolclass=NullPool,
+                connect_args={'check_same_thread': False, 'timeout': 30}
+            )
+            schemas = set(map(lambda module: module.getDatabaseSchema(), self.appConfig.getFileHandleModules()))
+
+            @event.listens_for(self.dbEngine, 'connect')
+            def attachSchemas(dbapiConnection, connectionRecord):
+                for schema in schemas:
+                    dbapiConnection.execute('''ATTACH DATABASE '%s' AS "%s"''' % (os.path.join(self.dbPath, '%s.db' % schema), schema))
+
+            os.makedirs(self.dbPath, exist_ok=True)
+            initializeDb(self.dbEngine, self.appConfig)
+        else:
+            self.dbEngine = getInitializedDb(self.appConfig)
+
+    def dispatch(self, stopAfter: int = None) -> MessageDispatcher:
+        dispatcher = MessageDispatcher(self.appConfig, appConfigLoader=fileIndexer.loadApplicationConfiguration)
+        handle = RecorderModule.handle
+        handledCount = 0
+
+        def stoppingHandle(module, fileDescriptor, dbEngine, appConfig):
+            # Stopped as by a signal, once the given number of files handled
+            nonlocal handledCount
+            handle(module, fileDescriptor, dbEngine, appConfig)
+            handledCount += 1
+            if handledCount == stopAfter:
+                dispatcher.setDone()
+
+        with mock.patch('lib.messageDispatcher.canDatabaseHandleParallelConnections', return_value=self.parallel), \
+                mock.patch.object(RecorderModule, 'handle', stoppingHandle):
+            dispatcher.dispatch(self.dbEngine, self.appConfig)
+        return dispatcher
+
+    def handledFiles(self, schema: str = 'recorder') -> list:
+        with self.dbEngine.connect() as dbConnection:
+            return sorted(map(
+                lambda row: row[0],
+                dbConnection.execute('SELECT f.filename FROM %s.handled h JOIN core.file f ON f.id = h.id_file' % schema)
+            ))
+
+    def handlingProcesses(self, schema: str = 'recorder') -> set:
+        with self.dbEngine.connect() as dbConnection:
+            return set(map(lambda row: row[0], dbConnection.execute('SELECT pid FROM %s.handled' % schema)))
+
+    def indexedFiles(self) -> list:
+        with self.dbEngine.connect() as dbConnection:
+            return sorted(map(lambda row: row[0], dbConnection.execute('SELECT filename FROM core.file')))
+
+    def touch(self, filename: str) -> None:
+        filePath = next(
+            os.path.join(directory, filename) for directory, _, filenames in os.walk(self.dataPath) if filename in filenames
+        )
+        stat = os.stat(filePath)
+        os.utime(filePath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def assertAllHandledOnce(self):
+        self.assertEqual(self.indexedFiles(), self.filenames)
+        self.assertEqual(self.handledFiles(), self.filenames)
+
+    def test_steps(self):
+        self.load(dispatchMode='steps')
+        self.dispatch()
+        self.assertAllHandledOnce()
+
+    def test_pipeline(self):
+        self.load(dispatchMode='pipeline')
+        self.dispatch()
+        self.assertAllHandledOnce()
+
+    def test_parallelSteps(self):
+        self.load(parallel=True, dispatchMode='steps')
+        self.dispatch()
+        self.assertAllHandledOnce()
+
+    def test_parallelPipeline(self):
+        self.load(parallel=True, dispatchMode='pipeline')
+        self.dispatch()
+        self.assertAllHandledOnce()
+
+    def test_parallelPipelineWithoutPrefetch(self):
+        self.load(parallel=True, dispatchMode='pipeline', prefetchWorkersCount=0, maxPendingJobs=2)
+        self.dispatch()
+        self.assertAllHandledOnce()
+
+    def test_stagePools(self):
+        for dispatchMode in ('steps', 'pipeline'):
+            with self.subTest(dispatchMode=dispatchMode):
+                self.load(parallel=True, dispatchMode=dispatchMode, databaseWorkersCount=2)
+                # stage -> threads it ran in
+                stageThreads = {}
+
+                def recordThread(stage: str, function):
+                    def recordingFunction(*args, **kwargs):
+                        stageThreads.setdefault(stage, set()).add(threading.current_thread())
+                        return function(*args, **kwargs)
+                    return recordingFunction
+
+                with mock.patch.object(CoreModule, 'handle', recordThread('database', CoreModule.handle)), \
+                        mock.patch.object(RecorderModule, 'handle', recordThread('parsing', RecorderModule.handle)), \
+                        mock.patch.object(LocalFileDescriptor, '_getFileMagicInfos', recordThread('metadata', LocalFileDescriptor._getFileMagicInfos)):
+                    dispatcher = self.dispatch()
+                self.assertAllHandledOnce()
+
+                self.assertLessEqual(stageThreads['database'], set(dispatcher.databasePool._pool))
+                self.assertLessEqual(stageThreads['parsing'], set(dispatcher.threadPool._pool))
+                # Files read before the database pool
+                self.assertFalse(stageThreads['metadata'] & set(dispatcher.databasePool._pool))
+                if dispatchMode == 'pipeline':
+                    self.assertLessEqual(stageThreads['metadata'], set(dispatcher.prefetchPool._pool))
+                self.dbEngine.dispose()
+                shutil.rmtree(self.dbPath)
+
+    def test_concurrentDataSources(self):
+        otherDataPath = os.path.join(self.directory.name, 'other')
+        makeFiles(otherDataPath)
+        self.load(parallel=True, dataSources=[self.dataPath, {'path': otherDataPath, 'maxPendingJobs': 1}], dataSourcesWorkersCount=2)
+
+        # The first file of each data source waits for the other one
+        barrier = threading.Barrier(2, timeout=10)
+        waitingDataSources = set()
+        waitingDataSourcesLock = threading.Lock()
+        handle = RecorderModule.handle
+
+        def waitingHandle(module, fileDescriptor, dbEngine, appConfig):
+            with waitingDataSourcesLock:
+                wait = fileDescriptor.dataSource not in waitingDataSources
+                waitingDataSources.add(fileDescriptor.dataSource)
+            if wait:
+                barrier.wait()
+            handle(module, fileDescriptor, dbEngine, appConfig)
+
+        with mock.patch.object(RecorderModule, 'handle', waitingHandle):
+            self.dispatch()
+        self.assertFalse(barrier.broken)
+        self.assertEqual(self.handledFiles(), sorted(self.filenames * 2))
+
+    def test_failingDataSource(self):
+        self.load(parallel=True, dataSources=[os.path.join(self.directory.name, 'missing'), self.dataPath])
+        # Raised once the other data sources are done
+        with self.assertRaises(FileNotFoundError):
+            self.dispatch()
+        self.assertAllHandledOnce()
+
+    def test_processPool(self):
+        for dispatchMode in ('steps', 'pipeline'):
+            with self.subTest(dispatchMode=dispatchMode):
+                self.load(parallel=True, dispatchMode=dispatchMode, processWorkersCount=2, fileHandleModules=[
+                    'tests.test_messageDispatcher.RecorderModule',
+                    'tests.test_messageDispatcher.ProcessRecorderModule',
+                ])
+                self.dispatch()
+                self.assertAllHandledOnce()
+                self.assertEqual(self.handledFiles('process_recorder'), self.filenames)
+                # Run by the workers, the other modules by this process
+                self.assertNotIn(os.getpid(), self.handlingProcesses('process_recorder'))
+                self.assertEqual(self.handlingProcesses(), {os.getpid()})
+                self.dbEngine.dispose()
+                shutil.rmtree(self.dbPath)
+
+    def test_processPoolWithoutLoader(self):
+        self.load(parallel=True, fileHandleModules=['tests.test_messageDispatcher.ProcessRecorderModule'])
+        # Run in the thread pool
+        with mock.patch('lib.messageDispatcher.canDatabaseHandleParallelConnections', return_value=True):
+            MessageDispatcher(self.appConfig).dispatch(self.dbEngine, self.appConfig)
+        self.assertEqual(self.handledFiles('process_recorder'), self.filenames)
+        self.assertEqual(self.handlingProcesses('process_recorder'), {os.getpid()})
+
+    def assertResumed(self, dispatchMode: str) -> None:
+        journalPath = os.path.join(self.directory.name, 'journal', 'crawl.journal')
+        self.load(dispatchMode=dispatchMode, journalDir=os.path.join(self.directory.name, 'journal'))
+        self.dispatch(stopAfter=5)
+        handledFiles = self.handledFiles()
+        self.assertEqual(len(handledFiles), 5)
+        # Kept for the next run
+        self.assertTrue(os.path.exists(journalPath))
+
+        # Only the files not handled yet, and the changed ones
+        self.touch(handledFiles[0])
+        self.dispatch()
+        self.assertEqual(self.handledFiles(), sorted(self.filenames + handledFiles[:1]))
+        self.assertEqual(self.indexedFiles(), self.filenames)
+        # Cleared once the run completed, the next run handling all the files
+        self.assertFalse(os.path.exists(journalPath))
+        self.dispatch()
+        self.assertEqual(self.handledFiles(), sorted(self.filenames * 2 + handledFiles[:1]))
+
+    def test_journalResumeSteps(self):
+        self.assertResumed('steps')
+
+    def test_journalResumePipeline(self):
+        self.assertResumed('pipeline')
+
+    def test_watch(self):
+        self.load(parallel=True, watch={'enabled': True, 'debounceDelay': 0.1})
+        dispatcher = MessageDispatcher(self.appConfig)
+        errors = []
+
+        def dispatch():
+            try:
+                dispatcher.dispatch(self.dbEngine, self.appConfig)
+            except Exception as ex:
+                errors.append(ex)
+
+        def waitForHandledFiles(count: int) -> None:
+            deadline = time.monotonic() + 10
+            while len(self.handledFiles()) < count and time.monotonic() < deadline:
+                time.sleep(0.05)
+
+        with mock.patch('lib.messageDispatcher.canDatabaseHandleParallelConnections', return_value=True):
+            dispatchThread = threading.Thread(target=dispatch)
+            dispatchThread.start()
+            try:
+                waitForHandledFiles(len(self.filenames))
+                # Changed while watching
+                with open(os.path.join(self.dataPath, 'a', 'new.txt'), 'w') as fileIO:
+                    fileIO.write('new\n')
+                self.touch(self.filenames[0])
+                waitForHandledFiles(len(self.filenames) + 2)
+            finally:
+                dispatcher.setDone()
+                dispatchThread.join(timeout=30)
+        self.assertFalse(dispatchThread.is_alive())
+        self.assertEqual(errors, [])
+        self.assertEqual(self.handledFiles(), sorted(self.filenames + ['new.txt', self.filenames[0]]))
+
+    def test_quarantine(self):
+        self.load(quarantineFile=os.path.join(self.directory.name, 'quarantine.jsonl'), handleTimeout=0.5)
+        # file name -> error raised by the recorder
+        failures = {'file-a-0.txt': ValueError('invalid content'), 'file-c-1.csv': OSError(errno.EIO, 'Input/output error')}
+        calls = []
+        handle = RecorderModule.handle
+
+        def failingHandle(module, fileDescriptor, dbEngine, appConfig):
+            calls.append(fileDescriptor.name)
+            if fileDescriptor.name in failures:
+                raise failures[fileDescriptor.name]
+            if fileDescriptor.name == 'file-root-2.html':
+                # Timed out, between the sleeps
+                for _ in range(100):
+                    time.sleep(0.05)
+            handle(module, fileDescriptor, dbEngine, appConfig)
+
+        with mock.patch.object(RecorderModule, 'handle', failingHandle):
+            self.dispatch()
+            self.assertEqual(self.handledFiles(), sorted(set(self.filenames) - set(failures) - {'file-root-2.html'}))
+
+            # Failed on the file itself (quarantined) or not (tried again)
+            calls.clear()
+            self.dispatch()
+            self.assertEqual(sorted(calls), sorted(set(self.filenames) - {'file-a-0.txt', 'file-root-2.html'}))
+
+            # Released once the file changed
+            del failures['file-a-0.txt']
+            self.touch('file-a-0.txt')
+            calls.clear()
+            self.dispatch()
+            self.assertEqual(sorted(calls), sorted(set(self.filenames) - {'file-root-2.html'}))
+        self.assertEqual(self.handledFiles().count('file-a-0.txt'), 1)
+
+    def test_drain(self):
+        self.load(parallel=True, workersCount=4, prefetchWorkersCount=0, journalDir=os.path.join(self.directory.name, 'journal'))
+        runs = []
+        handle = RecorderModule.handle
+
+        def slowHandle(module, fileDescriptor, dbEngine, appConfig):
+            runs.append('started')
+            time.sleep(0.2)
+            handle(module, fileDescriptor, dbEngine, appConfig)
+            runs.append('completed')
+
+        with mock.patch.object(RecorderModule, 'handle', slowHandle):
+            self.dispatch(stopAfter=1)
+        # The files in flight completed, and are not handled again
+        self.assertEqual(runs.count('started'), runs.count('completed'))
+        self.assertLess(len(self.handledFiles()), len(self.filenames))
+        self.dispatch()
+        self.assertAllHandledOnce()
+
+    def test_drainTimeout(self):
+        self.load(parallel=True, workersCount=4, prefetchWorkersCount=0, shutdownTimeout=0)
+        released = threading.Event()
+
+        def blockedHandle(module, fileDescriptor, dbEngine, appConfig):
+            released.wait(timeout=10)
+
+        dispatcher = MessageDispatcher(self.appConfig)
+        threading.Timer(0.5, dispatcher.setDone).start()
+        startTime = time.monotonic()
+        try:
+            with mock.patch('lib.messageDispatcher.canDatabaseHandleParallelConnections', return_value=True), \
+                    mock.patch.object(RecorderModule, 'handle', blockedHandle), \
+                    self.assertLogs('fileIndexer', 'WARNING') as logs:
+                dispatcher.dispatch(self.dbEngine, self.appConfig)
+            # Returned without waiting for the blocked modules
+            self.assertLess(time.monotonic() - startTime, 5)
+        finally:
+            released.set()
+        self.assertRegex(logs.output[0], r'Drain interrupted, \d+ jobs left \(4 module runs in progress\)')
+        self.assertEqual(len(list(filter(lambda line: 'interrupted on file' in line, logs.output))), 4)
+
+    def test_unknownMode(self):
+        self.load(dispatchMode='unknown')
+        with self.assertRaises(ConfiguratonError):
+            self.dispatch()
+        self.assertEqual(self.handledFiles(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
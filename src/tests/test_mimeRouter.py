@@ -0,0 +1,69 @@
+from fnmatch import fnmatch
+import unittest
+
+from public.mimeRouter import MimeRouter
+
+
+ROUTES = [
+    ('text/plain', 'plain'),
+    ('text/*', 'text'),
+    ('image/*', 'image'),
+    ('application/*pdf', 'pdf'),
+    ('*/x-*', 'extension'),
+    ('audio/[mo]*', 'audio'),
+    ('application/vnd.oasis.opendocument.text', 'document'),
+    ('application/msword', 'document'),
+    ('text/plain', 'image'),
+]
+
+MIMES = [
+    'text/plain', 'text/html', 'text/x-python', 'text/',
+    'image/png', 'image/x-icon',
+    'application/pdf', 'application/x-pdf', 'application/octet-stream', 'application/msword',
+    'application/vnd.oasis.opendocument.text', 'application/vnd.oasis.opendocument.textual',
+    'audio/mpeg', 'audio/ogg', 'audio/flac',
+    'inode/x-empty', 'text/plain/extra', 'plain', '',
+]
+
+
+def _expectedRoute(routes, mime):
+    # Matching each pattern, as the modules did before the router
+    targets = []
+    for _, target in routes:
+        if target not in targets and any(map(lambda route: route[1] == target and fnmatch(mime, route[0]), routes)):
+            targets.append(target)
+    return tuple(targets)
+
+
+class MimeRouterTest(unittest.TestCase):
+
+    def test_sameRoutesAsFnmatch(self):
+        router = MimeRouter(ROUTES)
+        for mime in MIMES:
+            self.assertEqual(router.route(mime), _expectedRoute(ROUTES, mime), mime)
+
+    def test_cachedRoutes(self):
+        router = MimeRouter(ROUTES)
+        for mime in MIMES:
+            self.assertEqual(router.route(mime), router.route(mime))
+
+    def test_catchAll(self):
+        routes = ROUTES + [('*', 'all')]
+        router = MimeRouter(routes)
+        self.assertTrue(router.routesAll)
+        self.assertTrue(router.isCatchAll('all'))
+        self.assertFalse(router.isCatchAll('text'))
+        for mime in MIMES:
+            self.assertEqual(router.route(mime), _expectedRoute(routes, mime), mime)
+            self.assertIn('all', router.route(mime))
+
+        self.assertFalse(MimeRouter(ROUTES).routesAll)
+
+    def test_noRoutes(self):
+        router = MimeRouter([])
+        self.assertFalse(router.routesAll)
+        self.assertEqual(router.route('text/plain'), ())
+
+
+if __name__ == '__main__':
+    unittest.main()
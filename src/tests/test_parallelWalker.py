@@ -0,0 +1,92 @@
+import threading
+import tempfile
+import os
+import unittest
+
+from public.parallelWalker import ParallelWalker
+
+from tests.tools import makeTree, makeConfig, localModule
+
+
+def _sortedWalk(rootPath: str):
+    # Sequential walk, depth first and sorted by name
+    entries = sorted(os.scandir(rootPath), key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_file(follow_symlinks=False):
+            yield entry.path
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from _sortedWalk(entry.path)
+
+
+class _Entry(object):
+
+    def __init__(self, path: str):
+        self.fullPath = path
+        self.name = os.path.basename(path)
+
+
+def _scanDirectory(path: str):
+    entries = list(os.scandir(path))
+    return (
+        list(map(lambda entry: _Entry(entry.path), filter(lambda entry: entry.is_file(), entries))),
+        list(map(lambda entry: entry.path, filter(lambda entry: entry.is_dir(), entries)))
+    )
+
+
+class ParallelWalkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.rootPath = os.path.join(self.directory.name, 'root')
+        os.mkdir(self.rootPath)
+        self.filePaths = makeTree(self.rootPath, directories=4, depth=3, files=3)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def listFiles(self, **listingConfig):
+        config = makeConfig(self.directory.name, {'listing': listingConfig})
+        return list(map(lambda fileDescriptor: fileDescriptor.fullPath, localModule(self.rootPath, config).listFiles()))
+
+    def test_sameFilesAsTheSequentialListing(self):
+        sequential = self.listFiles()
+        self.assertEqual(sorted(sequential), sorted(self.filePaths))
+
+        for directoryFds in (False, True):
+            for maxQueuedDirectories in (1, 10000):
+                listing = self.listFiles(workersCount=4, maxQueuedDirectories=maxQueuedDirectories, directoryFds=directoryFds)
+                self.assertEqual(sorted(listing), sorted(sequential))
+
+    def test_orderedListing(self):
+        expected = list(_sortedWalk(self.rootPath))
+        for directoryFds in (False, True):
+            for maxQueuedDirectories in (1, 3, 10000):
+                listing = self.listFiles(workersCount=4, ordered=True, maxQueuedDirectories=maxQueuedDirectories, directoryFds=directoryFds)
+                self.assertEqual(listing, expected)
+
+    def test_scanErrorsAreRaised(self):
+        failingPath = os.path.join(self.rootPath, 'dir2', 'dir1')
+
+        def scanDirectory(path: str):
+            if path == failingPath:
+                raise PermissionError(path)
+            return _scanDirectory(path)
+
+        for ordered in (False, True):
+            with self.assertRaises(PermissionError):
+                list(ParallelWalker(scanDirectory, workersCount=4, ordered=ordered).walk(self.rootPath))
+
+    def test_closeStopsTheWorkers(self):
+        # Threads of other tests may end meanwhile
+        threads = set(threading.enumerate())
+
+        for ordered in (False, True):
+            walk = ParallelWalker(_scanDirectory, workersCount=4, maxQueuedDirectories=2, ordered=ordered).walk(self.rootPath)
+            next(walk)
+            walk.close()
+            self.assertEqual(set(threading.enumerate()) - threads, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+from typing import Dict, Iterable
+import tempfile
+import pickle
+import os
+import unittest
+
+import sqlalchemy
+
+import lib.processWorker as processWorker
+from lib.handleWatchdog import HandleWatchdog
+from public import FileHandleModule, FileDescriptor
+from public.modules.localFileSystemModule.localFileDescriptor import LocalFileDescriptor
+
+from tests.tools import makeConfig
+
+
+class ContentReaderModule(FileHandleModule):
+    '''
+        Reads the shared content of the files, as the document module does.
+    '''
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.readSizes = []
+
+    @staticmethod
+    def handledFileMimes() -> str or Iterable[str]:
+        return '*'
+
+    def requiredModules(self) -> Iterable[str] or None:
+        return None
+
+    def getDatabaseSchema(self) -> str:
+        return 'test'
+
+    def defineTables(self, metadata: sqlalchemy.MetaData, configuration) -> None:
+        pass
+
+    def getSharedTables(self) -> Dict[str, sqlalchemy.Table]:
+        return {}
+
+    def canHandle(self, fileDescriptor: FileDescriptor) -> bool:
+        return True
+
+    def handle(self, fileDescriptor: FileDescriptor, dbEngine: sqlalchemy.engine.Engine, appConfig) -> None:
+        with fileDescriptor.openContent() as fileIO:
+            self.readSizes.append(len(fileIO.read()))
+        self.readSizes.append(FileDescriptor._contentBufferUsedSize)
+        if self.fail:
+            raise ValueError('failed')
+
+
+class RunHandleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filePath = os.path.join(self.directory.name, 'file')
+        with open(self.filePath, 'wb') as fileIO:
+            fileIO.write(b'x' * 200000)
+
+        self.module = ContentReaderModule()
+        self.appConfig = makeConfig(self.directory.name)
+        self.appConfig._fileHandleModules = [self.module]
+
+        self.savedState = (processWorker._appConfig, processWorker._dbEngine, processWorker._watchdog)
+        processWorker._appConfig = self.appConfig
+        processWorker._dbEngine = None
+        processWorker._watchdog = HandleWatchdog()
+        self.usedSize = FileDescriptor._contentBufferUsedSize
+
+    def tearDown(self):
+        processWorker._appConfig, processWorker._dbEngine, processWorker._watchdog = self.savedState
+        self.directory.cleanup()
+
+    def pickledFile(self) -> FileDescriptor:
+        # As sent to the process pool workers
+        return pickle.loads(pickle.dumps(LocalFileDescriptor(self.filePath)))
+
+    def test_contentReleased(self):
+        for _ in range(3):
+            processWorker.runHandle('ContentReaderModule', self.pickledFile())
+            self.assertEqual(FileDescriptor._contentBufferUsedSize, self.usedSize)
+
+        # Read from the shared buffer on each run
+        self.assertEqual(self.module.readSizes, [200000, self.usedSize + 200000] * 3)
+
+    def test_contentReleasedOnError(self):
+        self.module.fail = True
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                processWorker.runHandle('ContentReaderModule', self.pickledFile())
+            self.assertEqual(FileDescriptor._contentBufferUsedSize, self.usedSize)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import tempfile
+import errno
+import os
+import unittest
+
+from sqlalchemy.exc import OperationalError
+
+from lib.quarantine import Quarantine
+from public import ConfiguratonError, HandleTimeoutError
+
+
+MODULE = 'modules.documentFileModule.DocumentFileModule'
+
+
+class QuarantineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.quarantinePath = os.path.join(self.directory.name, 'quarantine', 'quarantine.jsonl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_persistedEntries(self):
+        quarantine = Quarantine(self.quarantinePath)
+        quarantine.add(MODULE, '/data/a.pdf', 10, 1000.0, 'timed out')
+        quarantine.add(MODULE, '/data/b.pdf', 20, 2000.0, 'PdfReadError()')
+        self.assertTrue(quarantine.isQuarantined(MODULE, '/data/a.pdf', 10, 1000.0))
+        self.assertFalse(quarantine.isQuarantined('modules.hashFileModule.HashFileModule', '/data/a.pdf', 10, 1000.0))
+        quarantine.close()
+
+        quarantine = Quarantine(self.quarantinePath)
+        self.assertEqual(len(quarantine), 2)
+        self.assertTrue(quarantine.isQuarantined(MODULE, '/data/b.pdf', 20, 2000.0))
+        quarantine.close()
+
+    def test_changedFilesAreReleased(self):
+        quarantine = Quarantine(self.quarantinePath)
+        quarantine.add(MODULE, '/data/a.pdf', 10, 1000.0, 'timed out')
+        quarantine.add(MODULE, '/data/b.pdf', 20, 2000.0, 'timed out')
+        self.assertFalse(quarantine.isQuarantined(MODULE, '/data/a.pdf', 11, 1000.0))
+        self.assertFalse(quarantine.isQuarantined(MODULE, '/data/a.pdf', 10, 1000.0))
+        quarantine.close()
+
+        # Compacted on close
+        with open(self.quarantinePath, 'r', encoding='utf-8') as quarantineIO:
+            self.assertEqual(len(quarantineIO.readlines()), 1)
+        quarantine = Quarantine(self.quarantinePath)
+        self.assertFalse(quarantine.isQuarantined(MODULE, '/data/a.pdf', 10, 1000.0))
+        self.assertTrue(quarantine.isQuarantined(MODULE, '/data/b.pdf', 20, 2000.0))
+        quarantine.close()
+
+    def test_invalidLinesAreIgnored(self):
+        os.makedirs(os.path.dirname(self.quarantinePath))
+        with open(self.quarantinePath, 'w', encoding='utf-8') as quarantineIO:
+            quarantineIO.write('["%s", "/data/a.pdf", 10, 1000.0, "timed out"]\n{invalid\n["too", "short"]\n' % MODULE)
+        quarantine = Quarantine(self.quarantinePath)
+        self.assertEqual(len(quarantine), 1)
+        quarantine.close()
+
+    def test_isFileError(self):
+        self.assertTrue(Quarantine.isFileError(HandleTimeoutError()))
+        self.assertTrue(Quarantine.isFileError(ValueError('invalid header')))
+        self.assertTrue(Quarantine.isFileError(OSError('cannot identify image file')))
+        self.assertFalse(Quarantine.isFileError(OSError(errno.EIO, 'Input/output error')))
+        self.assertFalse(Quarantine.isFileError(PermissionError(errno.EACCES, 'Permission denied')))
+        self.assertFalse(Quarantine.isFileError(ConfiguratonError('unknown algorithm')))
+        self.assertFalse(Quarantine.isFileError(OperationalError('INSERT', {}, Exception('database is locked'))))
+        self.assertFalse(Quarantine.isFileError(MemoryError()))
+
+
+if __name__ == '__main__':
+    unittest.main()
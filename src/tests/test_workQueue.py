@@ -0,0 +1,116 @@
+from multiprocessing.pool import ThreadPool
+from threading import Event
+import unittest
+
+from lib.workQueue import WorkQueue
+
+
+def _fail():
+    raise ValueError('failed')
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ThreadPool(4)
+
+    def tearDown(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def test_slotsBoundTheWork(self):
+        workQueue = WorkQueue(2)
+        self.assertTrue(workQueue.acquireSlot(timeout=0.1))
+        self.assertTrue(workQueue.acquireSlot(timeout=0.1))
+        self.assertFalse(workQueue.acquireSlot(timeout=0.1))
+
+        workQueue.releaseSlot()
+        self.assertTrue(workQueue.acquireSlot(timeout=0.1))
+
+    def test_noLimit(self):
+        workQueue = WorkQueue(None)
+        for _ in range(100):
+            self.assertTrue(workQueue.acquireSlot(timeout=0.1))
+
+    def test_parentLimitIsShared(self):
+        parent = WorkQueue(1)
+        first = WorkQueue(1, parent=parent)
+        second = WorkQueue(1, parent=parent)
+
+        self.assertTrue(first.acquireSlot(timeout=0.1))
+        self.assertFalse(second.acquireSlot(timeout=0.1))
+
+        # The slot of the child is given back when the parent has none left
+        first.releaseSlot()
+        self.assertTrue(second.acquireSlot(timeout=0.1))
+
+    def test_jobsAreCountedUntilDone(self):
+        workQueue = WorkQueue(4)
+        release = Event()
+        results = []
+        doneCount = []
+
+        for value in range(4):
+            self.assertTrue(workQueue.acquireSlot(timeout=1))
+            workQueue.submit(
+                self.pool,
+                lambda value: release.wait(5) and value,
+                args=(value,),
+                onDone=lambda: (doneCount.append(1), workQueue.releaseSlot()),
+                callback=results.append
+            )
+
+        self.assertEqual(len(workQueue), 4)
+        self.assertFalse(workQueue.acquireSlot(timeout=0.1))
+        self.assertFalse(workQueue.wait(timeout=0.1))
+
+        release.set()
+        self.assertTrue(workQueue.wait(timeout=5))
+        self.assertEqual(len(workQueue), 0)
+        self.assertEqual(sorted(results), [0, 1, 2, 3])
+        self.assertEqual(len(doneCount), 4)
+        self.assertTrue(workQueue.acquireSlot(timeout=0.1))
+
+    def test_parentCountsTheChildrenJobs(self):
+        parent = WorkQueue()
+        child = WorkQueue(parent=parent)
+        release = Event()
+
+        child.submit(self.pool, release.wait, args=(5,))
+        self.assertEqual(len(child), 1)
+        self.assertEqual(len(parent), 1)
+
+        release.set()
+        self.assertTrue(parent.wait(timeout=5))
+        self.assertEqual(len(child), 0)
+
+    def test_failedJob(self):
+        workQueue = WorkQueue(1)
+        errors = []
+        results = []
+
+        self.assertTrue(workQueue.acquireSlot(timeout=1))
+        workQueue.submit(self.pool, _fail, onDone=workQueue.releaseSlot, callback=results.append, errorCallback=errors.append)
+
+        self.assertTrue(workQueue.wait(timeout=5))
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], ValueError)
+        self.assertTrue(workQueue.acquireSlot(timeout=0.1))
+
+    def test_jobRefusedByThePool(self):
+        workQueue = WorkQueue(1)
+        doneCount = []
+        self.pool.close()
+
+        self.assertTrue(workQueue.acquireSlot(timeout=1))
+        with self.assertRaises(ValueError):
+            workQueue.submit(self.pool, len, args=((),), onDone=lambda: (doneCount.append(1), workQueue.releaseSlot()))
+
+        self.assertEqual(len(workQueue), 0)
+        self.assertEqual(len(doneCount), 1)
+        self.assertTrue(workQueue.acquireSlot(timeout=0.1))
+
+
+if __name__ == '__main__':
+    unittest.main()
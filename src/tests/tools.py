@@ -0,0 +1,76 @@
+from typing import Dict, List
+from urllib.parse import urlparse
+import os
+
+import yaml
+
+from public.configHandler import ConfigHandler
+from public.modules.localFileSystemModule.module import LocalFileSystemModule
+
+
+def makeTree(rootPath: str, directories: int = 4, depth: int = 3, files: int = 3) -> List[str]:
+    '''
+        Creates a directory tree.
+
+        :param rootPath: The tree root (existing) directory.
+        :type rootPath: str
+        :param directories: The number of subdirectories of each directory.
+        :type directories: int
+        :param depth: The tree depth.
+        :type depth: int
+        :param files: The number of files of each directory.
+        :type files: int
+
+        :returns: The created files paths.
+        :rtype: List[str]
+    '''
+    filePaths = []
+    for fileIndex in range(files):
+        filePath = os.path.join(rootPath, 'file%d.txt' % fileIndex)
+        with open(filePath, 'w') as fileIO:
+            fileIO.write('%s\n' % filePath * (fileIndex + 1))
+        filePaths.append(filePath)
+
+    if depth > 0:
+        for directoryIndex in range(directories):
+            directoryPath = os.path.join(rootPath, 'dir%d' % directoryIndex)
+            os.mkdir(directoryPath)
+            filePaths.extend(makeTree(directoryPath, directories=directories, depth=depth - 1, files=files))
+    return filePaths
+
+
+def makeConfig(directory: str, globalConfig: Dict = None) -> ConfigHandler:
+    '''
+        Get a configuration with the given ``global`` section.
+
+        :param directory: The directory the configuration is written to.
+        :type directory: str
+        :param globalConfig: The ``global`` section.
+        :type globalConfig: Dict
+
+        :returns: The configuration.
+        :rtype: :class:`public.configHandler.ConfigHandler`
+    '''
+    configPath = os.path.join(directory, 'config.yaml')
+    with open(configPath, 'w') as configIO:
+        yaml.dump({'global': globalConfig or {}}, configIO)
+    return ConfigHandler(configPath)
+
+
+def localModule(path: str, config: ConfigHandler, moduleClass: type = LocalFileSystemModule) -> LocalFileSystemModule:
+    '''
+        Get a local file system module connected to a directory.
+
+        :param path: The directory path.
+        :type path: str
+        :param config: The configuration.
+        :type config: :class:`public.configHandler.ConfigHandler`
+        :param moduleClass: The module class.
+        :type moduleClass: type
+
+        :returns: The connected module.
+        :rtype: :class:`public.modules.localFileSystemModule.module.LocalFileSystemModule`
+    '''
+    fileSystemModule = moduleClass()
+    fileSystemModule.connect(urlparse('file://%s' % path), config)
+    return fileSystemModule